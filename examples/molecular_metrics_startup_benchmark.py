@@ -0,0 +1,51 @@
+"""
+Compares the startup times of jaqpotpy.models.generative.molecular_metrics with the pickled
+NP and SA score models and with the memory mapped ScoreTables of `use_compact_models`.
+
+Every case runs in a new interpreter, like a DataLoader worker or a process of a pool would:
+the import of the module, the first SA and NP scores (which load the models) and the scores
+of 1000 molecules are timed separately.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+case = """
+import time
+start = time.perf_counter()
+import jaqpotpy.models.generative.molecular_metrics as mm
+imported = time.perf_counter()
+from rdkit import Chem
+mols = [Chem.MolFromSmiles(s) for s in ['CCOc1cccc(NC(=O)NCc2ccc(N3CCSCC3)cc2)c1'
+                                        , 'O=C(Cc1cccc(F)c1F)Nc1cccc(Br)n1'
+                                        , 'CCN1CCC(=NNC(=O)c2ccccc2)CC1'
+                                        , 'c1ccc2nc(NCCCc3nc4ccccc4[nH]3)cnc2c1'] * 250]
+first = time.perf_counter()
+mm.synthetic_accessibility_score_scores(mols[:1])
+mm.natural_products_score(mols[:1])
+loaded = time.perf_counter()
+mm.synthetic_accessibility_score_scores(mols)
+mm.natural_products_score(mols)
+scored = time.perf_counter()
+import resource
+print('import %7.1f ms, first scores %7.1f ms, scores of 1000 molecules %7.1f ms, max rss %5.0f MB'
+      % ((imported - start) * 1000, (loaded - first) * 1000, (scored - loaded) * 1000
+         , resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+"""
+
+
+def run(title, env):
+    out = subprocess.run([sys.executable, '-c', case], env=env, capture_output=True, text=True, check=True)
+    print('%-32s %s' % (title, out.stdout.strip()))
+
+
+if __name__ == '__main__':
+    env = dict(os.environ)
+    env.pop('JAQPOTPY_SCORE_MODELS', None)
+    run('pickled models', env)
+    with tempfile.TemporaryDirectory() as directory:
+        env['JAQPOTPY_SCORE_MODELS'] = directory
+        run('score tables, first build', env)
+        run('score tables, memory mapped', env)
+        run('score tables, memory mapped', env)
@@ -0,0 +1,74 @@
+"""
+Compares the native sklearn predict path of a MolecularModel with the ONNX Runtime one.
+
+The prediction timings run on a precomputed float32 descriptor matrix so that they are
+not hidden behind the featurization, which is timed separately as the end to end call.
+"""
+import os
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from jaqpotpy.datasets import SmilesDataset
+from jaqpotpy.descriptors.molecular import TopologicalFingerprint
+from jaqpotpy.models import MolecularSKLearn
+from jaqpotpy.models.base_classes import create_inference_session
+
+
+smiles = ['O=C1CCCN1Cc1cccc(C(=O)N2CCC(C3CCNC3)CC2)c1'
+    , 'O=C1CCc2cc(C(=O)N3CCC(C4CCNC4)CC3)ccc2N1'
+    , 'CCC(=O)Nc1ccc(N(Cc2ccccc2)C(=O)n2nnc3ccccc32)cc1'
+    , 'COc1ccc2c(N)nn(C(=O)Cc3cccc(Cl)c3)c2c1'
+    , 'Cc1nn(C)c2[nH]nc(NC(=O)Cc3cccc(Cl)c3)c12'
+    , 'O=C(Cc1cncc2ccccc12)N(CCC1CCCCC1)c1cccc(Cl)c1'
+    , 'COc1ccc(N(Cc2ccccc2)C(=O)Cc2c[nH]c3ccccc23)cc1'
+    , 'CC(C)(C)c1ccc(N(C(=O)c2ccco2)[C@H](C(=O)NCCc2cccc(F)c2)c2cccnc2)cc1'
+    , 'Cc1ccncc1NC(=O)Cc1cc(Cl)cc(-c2cnn(C)c2C(F)F)c1'
+    , 'Cc1cc(C(F)(F)F)nc2c1c(N)nn2C(=O)Cc1cccc(Cl)c1'
+    , 'O=C(c1cc(=O)[nH]c2ccccc12)N1CCN(c2cccc(Cl)c2)C(=O)C1'
+    , 'O=C1NC2(CCOc3ccc(Cl)cc32)C(=O)N1c1cncc2ccccc12'
+    , 'COCCNC(=O)[C@@H](c1ccccc1)N1Cc2ccccc2C1=O'
+    , 'CNCC1CCCN(C(=O)[C@@H](c2ccccc2)N2Cc3ccccc3C2=O)C1'
+    , 'COc1ccc2c(NC(=O)C3CCOc4ccc(Cl)cc43)[nH]nc2c1'
+    , 'O=C(NC1N=Nc2ccccc21)C1CCOc2ccc(Cl)cc21'
+    , 'COc1ccccc1OC1CCN(C(=O)c2cc(=O)[nH]c3ccccc23)C1'
+    , 'O=C(Cc1cc(Cl)cc(Cc2ccn[nH]2)c1)Nc1cncc2ccccc12'
+    , 'CN(C)c1ccc(N(Cc2ccsc2)C(=O)Cc2cncc3ccccc23)cc1'
+    , 'C[C@H]1COc2ccc(Cl)cc2[C@@H]1C(=O)Nc1cncc2ccccc12']
+ys = [0, 1, 1, 1, 1, 0, 0, 0, 1, 1, 0, 0, 0, 1, 0, 0, 0, 0, 1, 1]
+
+
+def timeit(fn, repeats=10):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+featurizer = TopologicalFingerprint()
+dataset = SmilesDataset(smiles=smiles, y=ys, task='classification', featurizer=featurizer)
+model = MolecularSKLearn(dataset=dataset, doa=None
+                         , model=RandomForestClassifier(n_estimators=100, random_state=42)).fit()
+estimator = model.model
+
+for n in [1, 100, 10000]:
+    batch = [smiles[i % len(smiles)] for i in range(n)]
+    X = featurizer.featurize_dataframe(batch, dtype=np.float32)[model.X].to_numpy()
+    sess = create_inference_session(model.inference_model)
+    input_name = sess.get_inputs()[0].name
+    native = timeit(lambda: (estimator.predict(X), estimator.predict_proba(X)))
+    onnx = timeit(lambda: sess.run(None, {input_name: X}))
+    assert np.array_equal(sess.run(None, {input_name: X})[0], estimator.predict(X))
+    print("%6d molecules: sklearn %.2f ms, onnxruntime %.2f ms (%.1fx)"
+          % (n, native * 1000, onnx * 1000, native / onnx))
+
+for threads in sorted({1, 2, os.cpu_count() or 1}):
+    sess = create_inference_session(model.inference_model, intra_op_num_threads=threads)
+    print("onnxruntime with %d intra op threads: %.2f ms"
+          % (threads, timeit(lambda: sess.run(None, {input_name: X})) * 1000))
+
+batch = [smiles[i % len(smiles)] for i in range(1000)]
+for use_onnx in [False, True]:
+    model.use_onnx = use_onnx
+    print("end to end call on %d molecules, use_onnx=%s: %.2f ms"
+          % (len(batch), use_onnx, timeit(lambda: model(batch), repeats=3) * 1000))
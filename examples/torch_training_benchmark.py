@@ -0,0 +1,87 @@
+"""
+Compares the training and inference times of MolecularTorch in fp32 eager mode, with bfloat16
+autocast (amp), with torch.compile and with both, for the torch_models of jaqpotpy.
+
+The first epoch of a compiled model includes the compilation of its graphs, so it is timed
+separately from the next ones.
+"""
+import os
+import time
+import numpy as np
+import torch
+from jaqpotpy.datasets import SmilesDataset
+from jaqpotpy.descriptors.molecular import TopologicalFingerprint, OneHotSequence
+from jaqpotpy.models import MolecularTorch, Evaluator
+from jaqpotpy.models.torch_models.torch import Feedforward_V1, LSTM_V1, RNN_V1
+
+
+smiles = ['O=C1CCCN1Cc1cccc(C(=O)N2CCC(C3CCNC3)CC2)c1'
+    , 'O=C1CCc2cc(C(=O)N3CCC(C4CCNC4)CC3)ccc2N1'
+    , 'CCC(=O)Nc1ccc(N(Cc2ccccc2)C(=O)n2nnc3ccccc32)cc1'
+    , 'COc1ccc2c(N)nn(C(=O)Cc3cccc(Cl)c3)c2c1'
+    , 'Cc1nn(C)c2[nH]nc(NC(=O)Cc3cccc(Cl)c3)c12'
+    , 'O=C(Cc1cncc2ccccc12)N(CCC1CCCCC1)c1cccc(Cl)c1'
+    , 'COc1ccc(N(Cc2ccccc2)C(=O)Cc2c[nH]c3ccccc23)cc1'
+    , 'CC(C)(C)c1ccc(N(C(=O)c2ccco2)[C@H](C(=O)NCCc2cccc(F)c2)c2cccnc2)cc1'
+    , 'Cc1ccncc1NC(=O)Cc1cc(Cl)cc(-c2cnn(C)c2C(F)F)c1'
+    , 'Cc1cc(C(F)(F)F)nc2c1c(N)nn2C(=O)Cc1cccc(Cl)c1'
+    , 'O=C(c1cc(=O)[nH]c2ccccc12)N1CCN(c2cccc(Cl)c2)C(=O)C1'
+    , 'O=C1NC2(CCOc3ccc(Cl)cc32)C(=O)N1c1cncc2ccccc12'
+    , 'COCCNC(=O)[C@@H](c1ccccc1)N1Cc2ccccc2C1=O'
+    , 'CNCC1CCCN(C(=O)[C@@H](c2ccccc2)N2Cc3ccccc3C2=O)C1'
+    , 'COc1ccc2c(NC(=O)C3CCOc4ccc(Cl)cc43)[nH]nc2c1'
+    , 'O=C(NC1N=Nc2ccccc21)C1CCOc2ccc(Cl)cc21'
+    , 'COc1ccccc1OC1CCN(C(=O)c2cc(=O)[nH]c3ccccc23)C1'
+    , 'O=C(Cc1cc(Cl)cc(Cc2ccn[nH]2)c1)Nc1cncc2ccccc12'
+    , 'CN(C)c1ccc(N(Cc2ccsc2)C(=O)Cc2cncc3ccccc23)cc1'
+    , 'C[C@H]1COc2ccc(Cl)cc2[C@@H]1C(=O)Nc1cncc2ccccc12']
+ys = [0, 1, 1, 1, 1, 0, 0, 0, 1, 1, 0, 0, 0, 1, 0, 0, 0, 0, 1, 1]
+
+n_copies = 25
+epochs = 6
+batch = 32
+
+models = {
+    'Feedforward_V1': (TopologicalFingerprint(), lambda: Feedforward_V1(2048, 2, 512, 2)),
+    'LSTM_V1': (TopologicalFingerprint(), lambda: LSTM_V1(2048, 256, 2)),
+    'RNN_V1': (OneHotSequence(max_length=80), lambda: RNN_V1(input_size=35, num_layers=128, hidden_layers=2, out_size=2)),
+}
+modes = [('fp32 eager', False, False), ('bf16 amp', True, False)
+    , ('compiled', False, True), ('compiled + amp', True, True)]
+
+
+class EpochTimer(MolecularTorch):
+    """Records the time of every training epoch."""
+
+    def train(self):
+        start = time.perf_counter()
+        super().train()
+        self.epoch_times.append(time.perf_counter() - start)
+
+
+for name, (featurizer, build) in models.items():
+    dataset = SmilesDataset(smiles=smiles * n_copies, y=ys * n_copies, task='classification', featurizer=featurizer)
+    dataset.create()
+    X = np.stack(featurizer.featurize(dataset.smiles)).astype(np.float32)
+    val = Evaluator()
+    val.dataset = dataset
+    for mode, amp, compile_model in modes:
+        model_nn = build()
+        trainer = EpochTimer(dataset=dataset, model_nn=model_nn, eval=val
+                             , train_batch=batch, test_batch=batch, epochs=epochs
+                             , optimizer=torch.optim.Adam(model_nn.parameters(), lr=0.001)
+                             , criterion=torch.nn.CrossEntropyLoss(), log_steps=epochs
+                             , amp=amp, compile_model=compile_model)
+        trainer.epoch_times = []
+        trainer.fit()
+        mol_model = trainer.create_molecular_model()
+        os.remove(trainer.path)
+        # The inference runs on the precomputed features, so that it is not hidden behind the featurization
+        mol_model._infer_torch(X)
+        start = time.perf_counter()
+        for _ in range(5):
+            mol_model._infer_torch(X)
+        inference = (time.perf_counter() - start) / 5
+        print("%-15s %-15s first epoch %8.1f ms, next epochs %7.1f ms, inference on %d molecules %6.1f ms"
+              % (name, mode, trainer.epoch_times[0] * 1000, np.mean(trainer.epoch_times[1:]) * 1000
+                 , len(dataset), inference * 1000))
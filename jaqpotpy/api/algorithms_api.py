@@ -3,26 +3,26 @@
 #import getpass
 #import urllib.parse
 from jaqpotpy.mappers import decode
-import requests
+from jaqpotpy.api.session import get_session
 
 algos_path = "algorithm"
 
 
-def get_allgorithms_sync(baseurl, api_key, start=None, max=None):
+def get_allgorithms_sync(baseurl, api_key, start=None, max=None, session=None):
     uri = baseurl + algos_path
     h = {'Content-Type': 'application/x-www-form-urlencoded',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
-    r = requests.get(uri, headers=h, verify=False)
+    r = get_session(session).get(uri, headers=h, verify=False)
     return r.json()
 
 
-def get_allgorithms_classes(base_url, api_key, start, max):
+def get_allgorithms_classes(base_url, api_key, start, max, session=None):
     uri = base_url + algos_path
     h = {'Content-Type': 'application/x-www-form-urlencoded',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
-    r = requests.get(uri, headers=h, verify=False)
+    r = get_session(session).get(uri, headers=h, verify=False)
     algos = decode.decode_algorithms_to_class(r.json())
     return algos
 
@@ -1,13 +1,13 @@
 # from tornado import gen, httpclient
 # from tornado.httputil import HTTPHeaders
 # from jaqpotpy.mappers import decode
-import requests
+from jaqpotpy.api.session import get_session
 import json
 
 
 chempot_path = "chempot"
 
-def predict(baseurl, api_key, modelid, smiles, descriptors, doa, logger):
+def predict(baseurl, api_key, modelid, smiles, descriptors, doa, logger, session=None):
     
     uri = baseurl + chempot_path + "/" 
 
@@ -23,7 +23,7 @@ def predict(baseurl, api_key, modelid, smiles, descriptors, doa, logger):
     }
     
     try:
-        r = requests.post(uri, data=json.dumps(data), headers=h)
+        r = get_session(session).post(uri, data=json.dumps(data), headers=h)
         if r.status_code < 300:
             return r.json()
         else:
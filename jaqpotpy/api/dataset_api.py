@@ -1,17 +1,17 @@
 from jaqpotpy.mappers import decode
-import requests
+from jaqpotpy.api.session import get_session
 
 
 dataset_path = "dataset"
 
 
-def create_dataset_sync(baseurl, api_key, json_dataset, logger):
+def create_dataset_sync(baseurl, api_key, json_dataset, logger, session=None):
     uri = baseurl + dataset_path
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
     try:
-        r = requests.post(uri, headers=h, data=json_dataset)
+        r = get_session(session).post(uri, headers=h, data=json_dataset)
         if r.status_code < 300:
             return r.json()
         else:
@@ -21,7 +21,7 @@ def create_dataset_sync(baseurl, api_key, json_dataset, logger):
         logger.error("Error http: " + str(e))
 
 
-def get_dataset(baseurl, api_key, datasetid, logger):
+def get_dataset(baseurl, api_key, datasetid, logger, session=None):
     uri = baseurl + dataset_path + "/" + datasetid
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
@@ -32,7 +32,7 @@ def get_dataset(baseurl, api_key, datasetid, logger):
         'rowMax': '1000'
     }
     try:
-        r = requests.get(uri, headers=h, params=params)
+        r = get_session(session).get(uri, headers=h, params=params)
         if r.status_code < 300:
             return r.json()
         else:
@@ -1,32 +1,32 @@
 # from tornado import gen, httpclient
 # from tornado.httputil import HTTPHeaders
 from jaqpotpy.mappers import decode
-import requests
+from jaqpotpy.api.session import get_session
 
 feat_path = "feature"
 
 
-def create_feature_sync(baseurl, api_key, json_feat):
+def create_feature_sync(baseurl, api_key, json_feat, session=None):
     uri = baseurl + feat_path
     token = "Bearer " + api_key
     h = {"Content-type": "application/json",
          "Accept": "application/json",
          'Authorization': token}
     try:
-        r = requests.post(uri, data=json_feat, headers=h)
+        r = get_session(session).post(uri, data=json_feat, headers=h)
         return r.json()
     except Exception as e:
         print("Error 1: " + str(e))
 
 
-def get_feature(baseurl, api_key, featid):
+def get_feature(baseurl, api_key, featid, session=None):
     uri = baseurl + feat_path + "/" + featid
     token = "Bearer " + api_key
     h = {"Content-type": "application/json",
          "Accept": "application/json",
          'Authorization': token}
     try:
-        r = requests.get(uri, headers=h)
+        r = get_session(session).get(uri, headers=h)
         return r.json()
     except Exception as e:
         print("Error 1: " + str(e))
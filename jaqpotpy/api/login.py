@@ -4,12 +4,12 @@ import getpass
 import urllib.parse
 from jaqpotpy.mappers import decode
 import http.client
-import requests
+from jaqpotpy.api.session import get_session
 
 login_path = "aa/login"
 
 
-def authenticate_sync(baseurl, username, password):
+def authenticate_sync(baseurl, username, password, session=None):
     uri = baseurl + login_path
     data = {
         'username': username,
@@ -19,19 +19,19 @@ def authenticate_sync(baseurl, username, password):
     h = {"Content-type": "application/x-www-form-urlencoded",
          "Accept": "application/json"}
     try:
-        r = requests.post(uri, data=body, headers=h)
+        r = get_session(session).post(uri, data=body, headers=h)
         # resp = decode.decode_auth(r.text)
         return r.json()
     except Exception as e:
         print("Error 1: " + str(e))
 
 
-def validate_api_key(baseurl, api_key):
+def validate_api_key(baseurl, api_key, session=None):
     uri = baseurl + "aa/validate/accesstoken"
     data = api_key
     h = {"Content-type": "*/*", "Accept": "application/json"}
     try:
-        r = requests.post(uri, data=data, headers=h)
+        r = get_session(session).post(uri, data=data, headers=h)
         # resp = decode.decode_auth(r.text)
         return r.json()
     except Exception as e:
@@ -1,20 +1,20 @@
 # from tornado import gen, httpclient
 # from tornado.httputil import HTTPHeaders
 from jaqpotpy.mappers import decode
-import requests
+from jaqpotpy.api.session import get_session
 import urllib.parse
 
 
 model_path = "model"
 
 
-def post_model_part(baseurl, api_key, modelid, json_request, logger):
+def post_model_part(baseurl, api_key, modelid, json_request, logger, session=None):
     uri = baseurl + model_path + "/" + modelid + "/" + "part"
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
     try:
-        r = requests.post(uri, headers=h, data=json_request)
+        r = get_session(session).post(uri, headers=h, data=json_request)
         if r.status_code < 300:
             return r
         else:
@@ -23,13 +23,13 @@ def post_model_part(baseurl, api_key, modelid, json_request, logger):
         logger.error("Error http: " + str(e))
 
 
-def post_pretrained_model(baseurl, api_key, json_request, logger):
+def post_pretrained_model(baseurl, api_key, json_request, logger, session=None):
     uri = baseurl + model_path
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
     try:
-        r = requests.post(uri, headers=h, data=json_request)
+        r = get_session(session).post(uri, headers=h, data=json_request)
         if r.status_code < 300:
             return r
         else:
@@ -38,13 +38,13 @@ def post_pretrained_model(baseurl, api_key, json_request, logger):
         logger.error("Error http: " + str(e))
 
 
-def get_model(baseurl, api_key, modelid, logger):
+def get_model(baseurl, api_key, modelid, logger, session=None):
     uri = baseurl + model_path + "/" + modelid
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
     try:
-        r = requests.get(uri, headers=h)
+        r = get_session(session).get(uri, headers=h)
         if r.status_code < 300:
             return r.json()
         else:
@@ -53,13 +53,13 @@ def get_model(baseurl, api_key, modelid, logger):
         logger.error("Error http: " + str(e))
 
 
-def get_raw_model(baseurl, api_key, modelid, logger):
+def get_raw_model(baseurl, api_key, modelid, logger, session=None):
     uri = baseurl + model_path + "/" + modelid + "/raw"
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
     try:
-        r = requests.get(uri, headers=h)
+        r = get_session(session).get(uri, headers=h)
         if r.status_code < 300:
             return r.json()
         else:
@@ -68,7 +68,7 @@ def get_raw_model(baseurl, api_key, modelid, logger):
         logger.error("Error http: " + str(e))
 
 
-def get_my_models(baseurl, api_key, minimum, maximum, logger):
+def get_my_models(baseurl, api_key, minimum, maximum, logger, session=None):
     uri = baseurl + model_path
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
@@ -77,7 +77,7 @@ def get_my_models(baseurl, api_key, minimum, maximum, logger):
     d = {'min' : minimum,
          'max' : maximum}
     try:
-        r = requests.get(uri, headers=h, params=d)
+        r = get_session(session).get(uri, headers=h, params=d)
         if r.status_code < 200:
             retJson = {}
             retJson["total"] = int(r.headers["total"])
@@ -99,7 +99,7 @@ def get_my_models(baseurl, api_key, minimum, maximum, logger):
     return retJson
 
 
-def get_orgs_models(baseurl, api_key, orgId, minimum, maximum, logger):
+def get_orgs_models(baseurl, api_key, orgId, minimum, maximum, logger, session=None):
     uri = baseurl + model_path
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
@@ -109,7 +109,7 @@ def get_orgs_models(baseurl, api_key, orgId, minimum, maximum, logger):
          'min' : minimum,
          'max' : maximum}
     try:
-        r = requests.get(uri, headers=h, params=d)
+        r = get_session(session).get(uri, headers=h, params=d)
         if r.status_code < 300:
             retJson = {}
             r = r.json()
@@ -128,7 +128,7 @@ def get_orgs_models(baseurl, api_key, orgId, minimum, maximum, logger):
     
     return retJson
 
-def get_models_by_tag(baseurl, api_key, tag, minimum, maximum, logger):
+def get_models_by_tag(baseurl, api_key, tag, minimum, maximum, logger, session=None):
     uri = baseurl + model_path
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
@@ -138,7 +138,7 @@ def get_models_by_tag(baseurl, api_key, tag, minimum, maximum, logger):
          'min' : minimum,
          'max' : maximum}
     try:
-        r = requests.get(uri, headers=h, params=d)
+        r = get_session(session).get(uri, headers=h, params=d)
         if r.status_code < 300:
             retJson = {}
             r = r.json()
@@ -157,7 +157,7 @@ def get_models_by_tag(baseurl, api_key, tag, minimum, maximum, logger):
     
     return retJson
 
-def get_models_by_tag_and_org(baseurl, api_key, organization, tag, minimum, maximum, logger):
+def get_models_by_tag_and_org(baseurl, api_key, organization, tag, minimum, maximum, logger, session=None):
     uri = baseurl + model_path
     h = {'Content-Type': 'application/json',
          'Accept': 'application/json',
@@ -168,7 +168,7 @@ def get_models_by_tag_and_org(baseurl, api_key, organization, tag, minimum, maxi
          'min' : minimum,
          'max' : maximum}
     try:
-        r = requests.get(uri, headers=h, params=d)
+        r = get_session(session).get(uri, headers=h, params=d)
         if r.status_code < 300:
             retJson = {}
             r = r.json()
@@ -188,7 +188,7 @@ def get_models_by_tag_and_org(baseurl, api_key, organization, tag, minimum, maxi
     return retJson
 
 
-def predict(baseurl, api_key, modelid, dataseturi, logger):
+def predict(baseurl, api_key, modelid, dataseturi, logger, session=None):
     uri = baseurl + model_path + "/" + modelid
     h = {"Content-type": "application/x-www-form-urlencoded",
          "Accept": "application/json",
@@ -198,7 +198,7 @@ def predict(baseurl, api_key, modelid, dataseturi, logger):
     }
     body = urllib.parse.urlencode(data)
     try:
-        r = requests.post(uri, data=body, headers=h)
+        r = get_session(session).post(uri, data=body, headers=h)
         if r.status_code < 300:
             return r.json()
         else:
@@ -0,0 +1,79 @@
+"""
+Pooled, retrying HTTP session of the Jaqpot client
+"""
+import gzip
+from typing import Callable, Iterable
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class JaqpotSession(requests.Session):
+    """
+    requests.Session through which the api modules send their calls.
+
+    Connections are kept alive in a pool of `pool_maxsize` per host and reused by the next
+    calls, instead of a TCP (and TLS) connection being opened for every call.
+
+    Connection errors are retried `retries` times with an exponential backoff of
+    `backoff_factor` seconds. Read errors and the responses with a status in
+    `retry_statuses` are retried only for the `retry_methods`, by default the idempotent
+    ones, so that a POST that reached the server is not sent twice.
+
+    Calls without a timeout get `timeout`, a (connect, read) tuple in seconds. With
+    `gzip_requests`, request bodies of at least `gzip_min_size` bytes are sent gzip compressed.
+
+    Every response is passed to the `latency_hooks` as
+    `hook(method, url, status_code, seconds)`, the seconds being the time until the response
+    headers arrived.
+
+    Examples
+    --------
+    >>> latencies = []
+    >>> session = JaqpotSession(retries=5, latency_hooks=[lambda *call: latencies.append(call)])
+    >>> jaqpot = Jaqpot(session=session)
+    """
+
+    def __init__(self, retries: int = 3, backoff_factor: float = 0.5, timeout=(10, 300)
+                 , pool_maxsize: int = 10, retry_statuses: Iterable[int] = (429, 502, 503, 504)
+                 , retry_methods: Iterable[str] = Retry.DEFAULT_ALLOWED_METHODS
+                 , gzip_requests: bool = False, gzip_min_size: int = 1024
+                 , latency_hooks: Iterable[Callable] = ()):
+        super().__init__()
+        self.timeout = timeout
+        self.gzip_requests = gzip_requests
+        self.gzip_min_size = gzip_min_size
+        self.latency_hooks = list(latency_hooks)
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries
+                      , backoff_factor=backoff_factor, status_forcelist=tuple(retry_statuses)
+                      , allowed_methods=frozenset(retry_methods), raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_maxsize)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        self.hooks['response'].append(self._report_latency)
+
+    def request(self, method, url, data=None, headers=None, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.timeout
+        if self.gzip_requests and isinstance(data, (str, bytes)) and len(data) >= self.gzip_min_size:
+            data = gzip.compress(data.encode('utf-8') if isinstance(data, str) else data)
+            headers = dict(headers or {})
+            headers['Content-Encoding'] = 'gzip'
+        return super().request(method, url, data=data, headers=headers, timeout=timeout, **kwargs)
+
+    def _report_latency(self, response, *args, **kwargs):
+        for hook in self.latency_hooks:
+            hook(response.request.method, response.url, response.status_code, response.elapsed.total_seconds())
+
+
+_default_session = None
+
+
+def get_session(session: JaqpotSession = None) -> JaqpotSession:
+    """The given session, or the session shared by the calls that are not given one."""
+    global _default_session
+    if session is not None:
+        return session
+    if _default_session is None:
+        _default_session = JaqpotSession()
+    return _default_session
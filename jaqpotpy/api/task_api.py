@@ -1,12 +1,97 @@
-import requests
+import asyncio
+import random
+import time
+from jaqpotpy.api.session import get_session
 
 task_path = "task"
 
+# Statuses of the tasks that ended without completing
+FAILED_STATUSES = ('ERROR', 'CANCELLED', 'REJECTED')
 
-def get_task(baseurl, api_key, taskid):
+
+def get_task(baseurl, api_key, taskid, session=None):
     uri = baseurl + task_path + "/" + taskid
     h = {'Content-Type': 'application/x-www-form-urlencoded',
          'Accept': 'application/json',
          'Authorization': "Bearer " + api_key}
-    r = requests.get(uri, headers=h)
+    r = get_session(session).get(uri, headers=h)
     return r.json()
+
+
+def cancel_task(baseurl, api_key, taskid, session=None):
+    uri = baseurl + task_path + "/" + taskid
+    h = {'Accept': 'application/json',
+         'Authorization': "Bearer " + api_key}
+    r = get_session(session).delete(uri, headers=h)
+    return r.status_code
+
+
+def _delays(initial_delay, max_delay, factor, jitter):
+    """Exponentially growing delays up to `max_delay`, each one spread by +-`jitter` of itself."""
+    delay = initial_delay
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, max_delay)
+
+
+def _completed(task, logger=None):
+    status = task.get('status')
+    if status in FAILED_STATUSES:
+        raise RuntimeError("Task %s ended with status %s: %s" % (task.get('_id'), status, task.get('errorReport')))
+    percentage = task.get('percentageCompleted', 0)
+    if logger is not None:
+        logger.info("completed " + str(percentage))
+    return percentage >= 100
+
+
+def _timed_out(baseurl, api_key, taskid, timeout, session, logger):
+    if logger is not None:
+        logger.error("Task " + taskid + " did not complete in " + str(timeout) + " seconds, cancelling it")
+    try:
+        cancel_task(baseurl, api_key, taskid, session=session)
+    except Exception as e:
+        if logger is not None:
+            logger.error("Error http: " + str(e))
+    return TimeoutError("Task %s did not complete in %s seconds" % (taskid, timeout))
+
+
+def wait_task(baseurl, api_key, taskid, timeout=None, initial_delay=0.1, max_delay=5.0, factor=2.0, jitter=0.2
+              , logger=None, session=None):
+    """
+    Polls a task until it completes and returns it.
+
+    The polls are spaced by delays that start at `initial_delay` seconds and grow by `factor`
+    up to `max_delay`, with a random `jitter` so that many waiting clients do not poll in
+    step. Small tasks return soon after they complete and long ones are polled rarely.
+
+    A RuntimeError is raised if the task fails. If it does not complete in `timeout`
+    seconds, it is cancelled and a TimeoutError is raised.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for delay in _delays(initial_delay, max_delay, factor, jitter):
+        if deadline is not None:
+            delay = min(delay, max(deadline - time.monotonic(), 0))
+        time.sleep(delay)
+        task = get_task(baseurl, api_key, taskid, session=session)
+        if _completed(task, logger):
+            return task
+        if deadline is not None and time.monotonic() >= deadline:
+            raise _timed_out(baseurl, api_key, taskid, timeout, session, logger)
+
+
+async def await_task(baseurl, api_key, taskid, timeout=None, initial_delay=0.1, max_delay=5.0, factor=2.0
+                     , jitter=0.2, logger=None, session=None):
+    """
+    Coroutine version of `wait_task`. The polls run in worker threads and the event loop
+    is free between them, so many tasks can be awaited at once.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for delay in _delays(initial_delay, max_delay, factor, jitter):
+        if deadline is not None:
+            delay = min(delay, max(deadline - time.monotonic(), 0))
+        await asyncio.sleep(delay)
+        task = await asyncio.to_thread(get_task, baseurl, api_key, taskid, session=session)
+        if _completed(task, logger):
+            return task
+        if deadline is not None and time.monotonic() >= deadline:
+            raise await asyncio.to_thread(_timed_out, baseurl, api_key, taskid, timeout, session, logger)
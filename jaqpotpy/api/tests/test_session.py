@@ -0,0 +1,87 @@
+import gzip
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import jaqpotpy.api.task_api as task_api
+import jaqpotpy.api.feature_api as feature_api
+from jaqpotpy.api.session import JaqpotSession
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # One handler per connection, the requests of a kept alive connection share it
+        self.server.connections += 1
+        super().setup()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.server.failures > 0:
+            self.server.failures -= 1
+            return self.reply(503, {})
+        self.reply(200, {'_id': self.path.split('/')[-1], 'percentageCompleted': 100})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.decompress(body)
+        self.reply(200, {'_id': 'feature', 'size': len(body), 'encoding': self.headers.get('Content-Encoding')})
+
+
+class TestSession(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self.server.connections = 0
+        self.server.failures = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for i in range(20):
+            requests.get(self.base_url + 'task/' + str(i)).json()
+        unpooled = self.server.connections
+        self.server.connections = 0
+        session = JaqpotSession()
+        for i in range(20):
+            assert task_api.get_task(self.base_url, 'key', str(i), session=session)['_id'] == str(i)
+        assert unpooled == 20
+        assert self.server.connections == 1
+
+    def test_retries(self):
+        self.server.failures = 2
+        session = JaqpotSession(retries=3, backoff_factor=0)
+        assert task_api.get_task(self.base_url, 'key', 'task', session=session)['_id'] == 'task'
+        self.server.failures = 2
+        session = JaqpotSession(retries=1, backoff_factor=0)
+        # The last failed response is returned once the retries are used up
+        assert task_api.get_task(self.base_url, 'key', 'task', session=session) == {}
+        assert self.server.failures == 0
+
+    def test_gzip_and_latency_hooks(self):
+        calls = []
+        session = JaqpotSession(gzip_requests=True, gzip_min_size=100
+                                , latency_hooks=[lambda *call: calls.append(call)])
+        small = feature_api.create_feature_sync(self.base_url, 'key', json.dumps({'a': 1}), session=session)
+        large = feature_api.create_feature_sync(self.base_url, 'key', json.dumps({'a': 'x' * 1000}), session=session)
+        assert small['encoding'] is None
+        assert large['encoding'] == 'gzip' and large['size'] == len(json.dumps({'a': 'x' * 1000}))
+        assert [(method, status) for method, url, status, seconds in calls] == [('POST', 200), ('POST', 200)]
+        assert all(seconds >= 0 for _, _, _, seconds in calls)
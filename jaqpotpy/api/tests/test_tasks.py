@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import pandas as pd
+import jaqpotpy.api.task_api as task_api
+from jaqpotpy import Jaqpot
+from jaqpotpy.api.session import JaqpotSession
+
+
+class TaskStub(BaseHTTPRequestHandler):
+    """Tasks complete `task_seconds` after they are created, or never if it is None."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def new_task(self):
+        with self.server.lock:
+            taskid = 'task%d' % len(self.server.tasks)
+            self.server.tasks[taskid] = time.monotonic()
+        return taskid
+
+    def do_GET(self):
+        path = urlparse(self.path).path.split('/')
+        if path[1] == 'task':
+            self.server.polls += 1
+            created = self.server.tasks[path[2]]
+            if self.server.task_seconds is None or time.monotonic() - created < self.server.task_seconds:
+                return self.reply(200, {'_id': path[2], 'status': 'RUNNING', 'percentageCompleted': 50})
+            return self.reply(200, {'_id': path[2], 'status': 'COMPLETED', 'percentageCompleted': 100
+                                    , 'resultUri': 'http://jaqpot/dataset/predicted_' + path[2]})
+        if path[1] == 'model':
+            return self.reply(200, {'_id': path[2], 'additionalInfo': {'independentFeatures': {'uri_x': 'x'}}})
+        if path[1] == 'dataset':
+            features = [{'name': 'x', 'key': 0}, {'name': 'y', 'key': 1, 'category': 'PREDICTED'}]
+            entries = [{'entryId': {'name': str(i)}, 'values': [float(i), 2.0 * i]} for i in range(3)]
+            return self.reply(200, {'_id': path[2], 'features': features, 'dataEntry': entries})
+        self.reply(404, {})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        if self.path.endswith('/dataset'):
+            return self.reply(200, {'_id': 'dataset'})
+        if self.path.startswith('/model/'):
+            return self.reply(200, {'_id': self.new_task()})
+        self.reply(404, {})
+
+    def do_DELETE(self):
+        self.server.cancelled.append(self.path.split('/')[-1])
+        self.reply(200, {})
+
+
+class TestTasks(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), TaskStub)
+        self.server.lock = threading.Lock()
+        self.server.tasks = {}
+        self.server.cancelled = []
+        self.server.polls = 0
+        self.server.task_seconds = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = 'http://127.0.0.1:%d/' % self.server.server_address[1]
+        self.session = JaqpotSession()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fast_task(self):
+        self.server.tasks['task'] = time.monotonic()
+        start = time.monotonic()
+        task = task_api.wait_task(self.base_url, 'key', 'task', timeout=10, session=self.session)
+        assert task['percentageCompleted'] == 100
+        assert time.monotonic() - start < 0.5
+
+    def test_backoff(self):
+        self.server.task_seconds = 1.5
+        self.server.tasks['task'] = time.monotonic()
+        task_api.wait_task(self.base_url, 'key', 'task', initial_delay=0.05, max_delay=0.4, session=self.session)
+        # 0.05, 0.1, 0.2 and then every 0.4 seconds, instead of every 0.05 seconds
+        assert self.server.polls <= 8
+
+    def test_timeout_cancels(self):
+        self.server.task_seconds = None
+        self.server.tasks['task'] = time.monotonic()
+        start = time.monotonic()
+        with self.assertRaises(TimeoutError):
+            task_api.wait_task(self.base_url, 'key', 'task', timeout=0.5, max_delay=0.2, session=self.session)
+        assert time.monotonic() - start < 1.5
+        assert self.server.cancelled == ['task']
+
+    def test_failed_task(self):
+        self.server.task_seconds = None
+        self.server.tasks['task'] = time.monotonic()
+        self.server.RequestHandlerClass = type('FailingStub', (TaskStub,), {
+            'do_GET': lambda handler: handler.reply(200, {'_id': 'task', 'status': 'ERROR'})})
+        with self.assertRaises(RuntimeError):
+            task_api.wait_task(self.base_url, 'key', 'task', timeout=5, session=self.session)
+
+    def test_predict(self):
+        jaqpot = Jaqpot(self.base_url, session=self.session)
+        jaqpot.api_key = 'key'
+        df, predicts = jaqpot.predict(pd.DataFrame({'x': [0.0, 1.0, 2.0]}), 'model', timeout=5)
+        assert predicts == ['y']
+        assert list(df['y']) == [0.0, 2.0, 4.0]
+
+    def test_apredict_gather(self):
+        self.server.task_seconds = 0.5
+        jaqpot = Jaqpot(self.base_url, session=self.session)
+        jaqpot.api_key = 'key'
+
+        async def predict_all():
+            df = pd.DataFrame({'x': [0.0, 1.0, 2.0]})
+            return await asyncio.gather(*[jaqpot.apredict(df, 'model', timeout=5) for _ in range(8)])
+
+        start = time.monotonic()
+        results = asyncio.run(predict_all())
+        # The eight tasks are awaited together rather than one after the other
+        assert time.monotonic() - start < 3
+        assert len(self.server.tasks) == 8
+        assert all(predicts == ['y'] for _, predicts in results)
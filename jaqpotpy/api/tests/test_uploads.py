@@ -0,0 +1,83 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+from jaqpotpy import Jaqpot
+from jaqpotpy.jaqpot import ModelUploadError
+
+
+class JaqpotStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            if self.path.endswith('/feature'):
+                title = body['meta']['titles'][0]
+                return self.reply(200, {'_id': 'f_' + title, 'meta': body['meta']})
+            if self.path.endswith('/dataset'):
+                self.server.datasets.append(body)
+                return self.reply(200, {'_id': 'dataset'})
+            if self.path.endswith('/part'):
+                if body['partNumber'] in self.server.failing:
+                    self.server.failing.remove(body['partNumber'])
+                    return self.reply(500, {'message': 'failed'})
+                self.server.parts.append(body)
+                return self.reply(200, {})
+        self.reply(404, {})
+
+
+class TestUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), JaqpotStub)
+        self.server.lock = threading.Lock()
+        self.server.datasets = []
+        self.server.parts = []
+        self.server.failing = set()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.jaqpot = Jaqpot('http://127.0.0.1:%d/' % self.server.server_address[1])
+        self.jaqpot.api_key = 'key'
+
+    def tearDown(self):
+        self.jaqpot.session.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_upload_dataset_features(self):
+        columns = ['c%d' % i for i in range(30)]
+        df = pd.DataFrame([[float(i) for i in range(30)]] * 3, columns=columns)
+        assert self.jaqpot.upload_dataset(df, title='title', description='description', workers=4) == 'dataset'
+        features = self.server.datasets[0]['features']
+        assert [f['name'] for f in features] == columns
+        assert [f['key'] for f in features] == list(range(30))
+        assert [f['uri'].split('/')[-1] for f in features] == ['f_' + c for c in columns]
+
+    def test_upload_model_parts_resume(self):
+        raw_model = ''.join(chr(65 + i % 26) for i in range(1050))
+        self.server.failing = {3, 7}
+        progress = []
+        with self.assertRaises(ModelUploadError) as error:
+            self.jaqpot.upload_model_parts('model', raw_model, part_size=100, workers=3
+                                           , progress=lambda done, total: progress.append((done, total)))
+        assert error.exception.uploaded == set(range(11)) - {3, 7}
+        assert progress[-1] == (9, 11)
+        uploaded = self.jaqpot.upload_model_parts('model', raw_model, part_size=100
+                                                  , uploaded=error.exception.uploaded)
+        assert uploaded == set(range(11))
+        parts = sorted(self.server.parts, key=lambda part: part['partNumber'])
+        assert [part['partNumber'] for part in parts] == list(range(11))
+        assert all(part['totalParts'] == 11 and part['modelId'] == 'model' for part in parts)
+        assert ''.join(part['part'] for part in parts) == raw_model
@@ -5,6 +5,7 @@ from typing import Any
 import inspect
 from typing import Iterable
 import pickle
+import numpy as np
 
 
 class BaseDataset(object):
@@ -106,6 +107,10 @@ class BaseDataset(object):
 
 
 class MolecularDataset(BaseDataset):
+    _X_array = None
+    _y_array = None
+    _array_columns = None
+
     def __init__(self, path=None, smiles_col=None, x_cols=None, y_cols=None, smiles=None) -> None:
         self.smiles = smiles
         self._smiles_strings = None
@@ -120,6 +125,57 @@ class MolecularDataset(BaseDataset):
     def smiles_strings(self, value):
         self._smiles_strings = value
 
+    @property
+    def tensor_storage(self) -> bool:
+        """Whether items are sliced from the arrays materialized by `create`."""
+        return self._X_array is not None and self._array_columns == self.X
+
+    def _materialize(self, X=None, y=None):
+        """
+        Keeps X and y of the created dataset as contiguous arrays, so that items and
+        batches are row slices instead of Dataframe lookups. Numeric features are stored
+        as float32, array valued ones (sequences, images) keep their dtype. Datasets
+        whose columns can not be stacked are left to the Dataframe.
+        """
+        self._X_array = self._y_array = self._array_columns = None
+        if X is None:
+            if self.df is None or self.X is None or not isinstance(self.y, list):
+                return
+            try:
+                if self.X in (['Sequence'], ['OneHotSequence'], ['SmilesImage']):
+                    X = np.stack(self.df[self.X[0]].to_list())
+                    if self.X == ['SmilesImage']:
+                        X = np.ascontiguousarray(X.transpose(0, 3, 1, 2))
+                else:
+                    X = self.df[self.X].to_numpy(dtype=np.float32)
+                y = self.df[self.y].to_numpy()
+            except (ValueError, TypeError):
+                return
+        self._X_array = X
+        self._y_array = y
+        self._array_columns = list(self.X)
+
+    def __getitems__(self, indices):
+        """Returns the items of `indices`, sliced from the arrays at once when possible."""
+        if not self.tensor_storage:
+            return [self[i] for i in indices]
+        indices = np.asarray(indices)
+        return list(zip(self._X_array[indices], self._y_array[indices]))
+
+    def batch_sampler(self, batch_size: int, shuffle: bool = False, drop_last: bool = False, generator=None):
+        """
+        Sampler of whole minibatches. Passed as the `sampler` of a DataLoader with
+        `batch_size=None`, every batch is read from the dataset with a single slice:
+
+        >>> DataLoader(dataset, sampler=dataset.batch_sampler(64, shuffle=True), batch_size=None)
+        """
+        from torch.utils.data import BatchSampler, RandomSampler, SequentialSampler
+        if shuffle:
+            sampler = RandomSampler(range(len(self)), generator=generator)
+        else:
+            sampler = SequentialSampler(range(len(self)))
+        return BatchSampler(sampler, batch_size, drop_last)
+
     def save(self):
         if self._dataset_name:
             with open(self._dataset_name + ".jdata", 'wb') as f:
@@ -1,5 +1,7 @@
 from jaqpotpy.datasets.dataset_base import MolecularDataset
+from jaqpotpy.datasets.storage import MemmapStore
 from jaqpotpy.descriptors.base_classes import MolecularFeaturizer
+from jaqpotpy.descriptors.graph.graph_data import PackedGraphData
 try:
     from jaqpotpy.descriptors.molecular import MolGraphConvFeaturizer, TorchMolGraphConvFeaturizer
 except ImportError:
@@ -76,6 +78,7 @@ class MolecularTabularDataset(MolecularDataset):
                         self._x = list(descriptors)
                 else:
                     self._x = list(descriptors)
+            self._materialize()
         return self
 
     def __get_X__(self):
@@ -88,6 +91,8 @@ class MolecularTabularDataset(MolecularDataset):
         return self.df
 
     def __getitem__(self, idx):
+        if self.tensor_storage:
+            return self._X_array[idx], self._y_array[idx]
         # print(self.df[self.X].iloc[idx].values)
         # print(type(self.df[self.X].iloc[idx].values))
         X = self.df[self.X].iloc[idx].values
@@ -115,9 +120,14 @@ class MolecularTabularDataset(MolecularDataset):
 class TorchGraphDataset(MolecularDataset, Dataset):
     """
     Init with smiles and y array
+
+    With `streaming`, the molecules are not featurized on `create` but every time they
+    are loaded, see `stream`. `cache` keeps the graphs featurized in the first epoch for
+    the next ones and `ordered` yields the streamed batches in the sampling order.
     """
     def __init__(self, smiles=Iterable[str]
-                 , y: Iterable[Any] = Iterable[Any], featurizer: MolecularFeaturizer = MolGraphConvFeaturizer(), task=str, streaming: bool = False) -> None:
+                 , y: Iterable[Any] = Iterable[Any], featurizer: MolecularFeaturizer = MolGraphConvFeaturizer(), task=str, streaming: bool = False
+                 , cache: bool = False, ordered: bool = True) -> None:
         super(TorchGraphDataset, self).__init__()
         self._y = y
         self._dataset_name = None
@@ -130,68 +140,98 @@ class TorchGraphDataset(MolecularDataset, Dataset):
         self.featurizer: MolecularFeaturizer = featurizer
         self.indices: [] = None
         self.streaming = streaming
+        self.cache = cache
+        self.ordered = ordered
+        self._y_tensor = None
         # self.create()
 
     def create(self):
+        if self._task not in ('regression', 'classification'):
+            raise Exception("Please set task (classification / regression).")
         if self.streaming is False:
-            import torch
-            from torch_geometric.data import Data
             descriptors = self.featurizer.featurize(datapoints = self.smiles)
-            for i, g in enumerate(descriptors):
-                if self._task == 'regression':
-                    dato = Data(x=torch.FloatTensor(g.node_features)
-                                , edge_index=torch.LongTensor(g.edge_index)
-                                , edge_attr= torch.LongTensor(g.edge_features) if g.edge_features is not None else g.edge_features
-                                , num_nodes=g.num_nodes, y=torch.Tensor([self.y[i]]))
-                    self._df.append(dato)
-                elif self._task == 'classification':
-                    dato = Data(x=torch.FloatTensor(g.node_features)
-                                , edge_index=torch.LongTensor(g.edge_index)
-                                , edge_attr=torch.LongTensor(g.edge_features) if g.edge_features is not None else g.edge_features
-                                , num_nodes=g.num_nodes, y=torch.LongTensor([self.y[i]]))
-                    self._df.append(dato)
-                else:
-                    raise Exception("Please set task (classification / regression).")
+            # Node features as float32 and edge features as int64, as the Data objects of the graphs
+            self.df = PackedGraphData.from_graphs(list(descriptors), node_dtype=np.float32, edge_dtype=np.int64)
             self._smiles_strings = self.smiles
-            self.X = ['TorchMolGraph']
-            self.y = ['Y']
-            return self
         else:
-            ys = pd.DataFrame(self.ys, columns=['Y'])
-            self.df = pd.concat([self.smiles, ys], axis=1)
-            return self
+            # Only the smiles and endpoints are kept, the graphs are featurized when loaded
+            self._smiles_strings = list(self.smiles)
+            self.df = pd.DataFrame({'SMILES': self._smiles_strings, 'Y': list(self.ys)})
+        self._y_tensor = self._endpoints(self.ys)
+        self.X = ['TorchMolGraph']
+        self.y = ['Y']
+        return self
+
+    def _endpoints(self, y):
+        import torch
+        if self._task == 'regression':
+            return torch.tensor(np.asarray(y, dtype=np.float32).reshape(-1))
+        return torch.tensor(np.asarray(y, dtype=np.int64).reshape(-1))
+
+    def stream(self, batch_size: int, shuffle: bool = False, drop_last: bool = False, num_workers: int = 0
+               , prefetch: int = None, cache: bool = None, ordered: bool = None, generator=None):
+        """
+        Batches of a streaming dataset, featurized by `num_workers` background processes with
+        at most `prefetch` batches in flight. `cache` and `ordered` default to the ones of the
+        dataset. See `StreamingGraphLoader`.
+        """
+        from jaqpotpy.datasets.streaming import StreamingGraphLoader
+        return StreamingGraphLoader(self, batch_size, shuffle=shuffle, drop_last=drop_last, num_workers=num_workers
+                                    , prefetch=prefetch, cache=self.cache if cache is None else cache
+                                    , ordered=self.ordered if ordered is None else ordered, generator=generator)
+
+    @property
+    def packed(self) -> PackedGraphData:
+        """The packed graphs of the created dataset, None while streaming."""
+        return self.df if isinstance(self.df, PackedGraphData) else None
+
+    def _graph(self, i):
+        import torch
+        from torch_geometric.data import Data
+        g = self.df.batch_arrays([i])
+        return Data(x=torch.from_numpy(g['node_features'])
+                    , edge_index=torch.from_numpy(g['edge_index'])
+                    , edge_attr=torch.from_numpy(g['edge_features']) if g['edge_features'] is not None else None
+                    , num_nodes=len(g['node_features']), y=self._y_tensor[i:i + 1])
+
+    def _batch(self, indices):
+        import torch
+        indices = np.asarray(indices, dtype=np.int64)
+        return self._collate(self.df, indices, self._y_tensor[torch.from_numpy(indices)])
+
+    @staticmethod
+    def _collate(packed: PackedGraphData, indices, y):
+        """A torch geometric Batch of the graphs at `indices` of `packed`, with endpoints `y`."""
+        import torch
+        from torch_geometric.data import Batch
+        g = packed.batch_arrays(np.asarray(indices, dtype=np.int64))
+        return Batch(x=torch.from_numpy(g['node_features'])
+                     , edge_index=torch.from_numpy(g['edge_index'])
+                     , edge_attr=torch.from_numpy(g['edge_features']) if g['edge_features'] is not None else None
+                     , y=y
+                     , batch=torch.from_numpy(g['graph_index'])
+                     , ptr=torch.from_numpy(g['node_offsets']))
 
     def __get__(self):
         return self.df
 
     def __getitem__(self, idx):
         if self.streaming is False:
-            return self.df[idx]
+            if np.ndim(idx) > 0:
+                # A list of indices is collated into a single batch
+                return self._batch(idx)
+            return self._graph(idx)
         else:
-            tempdf = []
             import torch
             from torch_geometric.data import Data
-            smile = self.smiles[idx]
-            descriptors = self.featurizer.featurize(smile)
-            for i, g in enumerate(descriptors):
-                if self._task == 'regression':
-                    dato = Data(x=torch.FloatTensor(g.node_features)
-                                , edge_index=torch.LongTensor(g.edge_index)
-                                , edge_attr= torch.LongTensor(g.edge_features) if g.edge_features is not None else g.edge_features
-                                , num_nodes=g.num_nodes, y=torch.Tensor([self.y[i]]))
-                    tempdf.append(dato)
-                elif self._task == 'classification':
-                    dato = Data(x=torch.FloatTensor(g.node_features)
-                                , edge_index=torch.LongTensor(g.edge_index)
-                                , edge_attr=torch.LongTensor(g.edge_features) if g.edge_features is not None else g.edge_features
-                                , num_nodes=g.num_nodes, y=torch.LongTensor([self.y[i]]))
-                    tempdf.append(dato)
-                else:
-                    raise Exception("Please set task (classification / regression).")
-            self._smiles_strings = self.smiles
-            self.X = ['TorchMolGraph']
-            self.y = ['Y']
-            return tempdf[idx]
+            from jaqpotpy.datasets.streaming import _featurize_graphs
+            g = _featurize_graphs(self.featurizer, [self._smiles_strings[idx]])[0]
+            if g is None:
+                raise ValueError("Could not featurize molecule %d, %s" % (idx, self._smiles_strings[idx]))
+            return Data(x=torch.from_numpy(g.node_features.astype(np.float32))
+                        , edge_index=torch.from_numpy(g.edge_index.astype(np.int64))
+                        , edge_attr=torch.from_numpy(g.edge_features.astype(np.int64)) if g.edge_features is not None else None
+                        , num_nodes=g.num_nodes, y=self._y_tensor[idx:idx + 1])
 
     def __len__(self):
         return len(self.df)
@@ -212,10 +252,24 @@ class TorchGraphDataset(MolecularDataset, Dataset):
 class SmilesDataset(MolecularDataset):
     """
     Init with smiles and y array
+
+    If `store` is given, the smiles are featurized once, `chunk_size` at a time, into
+    memory mapped `.npy` files in the `store` directory instead of a Dataframe. Items
+    are then read as views on the files, so the dataset does not need to fit in memory.
+    The store is reused by later datasets with the same featurizer and size.
+
+    With `streaming`, the molecules are featurized every time an item is read, the same
+    way the store featurizes them. A dataset with a `store` reads its items from the
+    store and ignores `streaming`.
     """
+    # Datasets pickled before the store existed are in memory
+    _store = None
+    chunk_size = 10000
+
     def __init__(self, x_cols=None, smiles=Iterable[str]
                  , y: Iterable[Any] = Iterable[Any], X: Iterable[Any] = None,
-                 featurizer: MolecularFeaturizer = None, task: str = 'regression', streaming: bool = False) -> None:
+                 featurizer: MolecularFeaturizer = None, task: str = 'regression', streaming: bool = False
+                 , store: str = None, chunk_size: int = 10000) -> None:
         super(SmilesDataset, self).__init__(x_cols=x_cols)
         self._y = y
         self._x = X
@@ -230,10 +284,31 @@ class SmilesDataset(MolecularDataset):
         self.indices: [] = None
         self._task = task
         self.streaming = streaming
+        self.chunk_size = chunk_size
+        self._store = MemmapStore(store) if store is not None else None
 
         # self.create()
 
+    @property
+    def store(self) -> MemmapStore:
+        return self._store
+
     def create(self):
+        if self._store is not None:
+            ys = self.ys if self._task != "generation" else None
+            if self._store.is_built(self.featurizer, self.smiles, ys):
+                self._store.open()
+            else:
+                self._store.build(self.featurizer, self.smiles, ys, chunk_size=self.chunk_size)
+            self._smiles_strings = self.smiles
+            self.X = list(self._store.columns)
+            if self._task != "generation":
+                self.y = ['Y']
+                X = self._store.X
+                if self.X == ['SmilesImage']:
+                    X = X.transpose(0, 3, 1, 2)
+                self._materialize(X, self._store.y)
+            return self
         if self.streaming is False:
             descriptors = self.featurizer.featurize_dataframe(self.smiles)
             if self._task != "generation":
@@ -242,6 +317,7 @@ class SmilesDataset(MolecularDataset):
                 self._smiles_strings = self.smiles
                 self.X = list(descriptors)
                 self.y = ['Y']
+                self._materialize()
             else:
                 self.df = pd.concat([descriptors], axis=1)
                 self._smiles_strings = self.smiles
@@ -249,7 +325,8 @@ class SmilesDataset(MolecularDataset):
             return self
         else:
             ys = pd.DataFrame(self.ys, columns=['Y'])
-            self.df = pd.concat([self.smiles, ys], axis=1)
+            self.df = pd.concat([pd.DataFrame({'Smiles': list(self.smiles)}), ys], axis=1)
+            self._smiles_strings = self.smiles
             return self
 
     def save(self):
@@ -266,15 +343,32 @@ class SmilesDataset(MolecularDataset):
             return pickle.load(f)
 
     def __get_X__(self):
+        if self._store is not None:
+            return self._store.X
         return self.df[self.X].to_numpy()
 
     def __get_Y__(self):
+        if self._store is not None:
+            return self._store.y
         return self.df[self.y].to_numpy()
 
     def __get__(self):
         return self.df
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._store is not None:
+            # The arrays are views on the store files and are mapped again after loading
+            state.pop('_X_array', None)
+            state.pop('_y_array', None)
+            state.pop('_array_columns', None)
+        return state
+
     def __getitem__(self, idx):
+        if self._store is not None and not self.tensor_storage:
+            self.create()
+        if self.tensor_storage:
+            return self._X_array[idx], self._y_array[idx]
         if self.streaming is False:
             if self._task != "generation":
                 if self.X == ['Sequence']:
@@ -299,30 +393,25 @@ class SmilesDataset(MolecularDataset):
                     print(str(e))
                 return X, idx, (torch.Tensor(node_features), torch.Tensor(adjacency_matrix))
         elif self.streaming is True:
-            smiles = self.smiles[idx]
-            descriptors = self.featurizer.featurize_dataframe(smiles)
             if self._task != "generation":
-                y = self.ys[idx]
-                ys = pd.DataFrame([y], columns=['Y'])
-                temp_df = pd.concat([descriptors, ys], axis=1)
+                try:
+                    # Featurized like a chunk of the store, so streamed items match the stored ones
+                    rows, columns, _ = MemmapStore._featurize_chunk(self.featurizer, [self.smiles[idx]], np.float32)
+                    X = rows[0]
+                except ValueError:
+                    # Graphs and the other features the store can not hold are returned as they are
+                    descriptors = self.featurizer.featurize_dataframe(self.smiles[idx])
+                    columns, X = list(descriptors), descriptors.iloc[0].values
                 self._smiles_strings = self.smiles
-                self.X = list(descriptors)
+                self.X = columns
                 self.y = ['Y']
+                if self.X == ['SmilesImage']:
+                    X = np.ascontiguousarray(X.transpose(2, 0, 1))
+                return X, np.array([self.ys[idx]])
             else:
+                descriptors = self.featurizer.featurize_dataframe(self.smiles[idx])
                 temp_df = pd.concat([descriptors], axis=1)
                 self.X = list(descriptors)
-            if self._task != "generation":
-                if self.X == ['Sequence']:
-                    X = temp_df[self.X].iloc[0].values[0]
-                elif self.X == ['OneHotSequence']:
-                    X = temp_df[self.X].iloc[0].values[0]
-                elif self.X == ['SmilesImage']:
-                    X = temp_df[self.X].iloc[0].values[0].transpose(2, 0, 1)
-                else:
-                    X = temp_df[self.X].iloc[0].values
-                y = temp_df[self.y].iloc[0].to_numpy()
-                return X, y
-            else:
                 try:
                     node_features = temp_df[self.X].iloc[0].values[0].node_features
                     adjacency_matrix = temp_df[self.X].iloc[0].values[0].adjacency_matrix
@@ -336,6 +425,8 @@ class SmilesDataset(MolecularDataset):
 
 
     def __len__(self):
+        if self._store is not None:
+            return len(self.smiles)
         if self.df is None:
             self.create()
         return len(self.df)
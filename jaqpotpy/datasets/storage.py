@@ -0,0 +1,152 @@
+"""
+Memory mapped storage of featurized datasets
+"""
+import hashlib
+import json
+import os
+from typing import Iterable, Any
+import numpy as np
+from rdkit import Chem
+from jaqpotpy.descriptors.base_classes import MolecularFeaturizer
+
+
+class MemmapStore(object):
+    """
+    Row indexed store of featurized molecules kept on disk as `.npy` files.
+
+    The molecules are featurized once, `chunk_size` at a time, and written into a
+    memory mapped array so that datasets larger than the available memory can be
+    used. Row `i` of `X` and `y` belongs to the `i`-th SMILES. Reading a row or a
+    slice returns a view on the mapped file, without copying.
+
+    The store is reused as long as it was built with the same featurizer, SMILES and
+    endpoints, otherwise it is featurized again.
+
+    Files
+    -----
+    X.npy: the features, (n_rows, n_columns) or (n_rows, *feature_shape).
+    y.npy: the endpoints, (n_rows, 1).
+    failed.npy: True for the molecules that could not be featurized (NaN rows in X).
+    meta.json: the featurizer signature, the hash of the SMILES and endpoints, the
+      columns and the shape. Written last, so a store whose build was interrupted
+      is featurized again.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.X = None
+        self.y = None
+        self.failed = None
+        self.meta = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # Only the path is pickled, the arrays are mapped again on open
+        state['X'] = state['y'] = state['failed'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.meta is not None and os.path.exists(self._file('meta.json')):
+            self.open()
+
+    def __len__(self):
+        return 0 if self.X is None else self.X.shape[0]
+
+    @property
+    def columns(self) -> Iterable[str]:
+        return self.meta['columns']
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @staticmethod
+    def content_hash(smiles: Iterable[str], y: Iterable[Any] = None) -> str:
+        """The sha1 of the smiles and the endpoints `build` stores."""
+        digest = hashlib.sha1('\n'.join(s if isinstance(s, str) else Chem.MolToSmiles(s)
+                                         for s in smiles).encode())
+        if y is not None:
+            ys = np.asarray(y)
+            digest.update(repr(ys.tolist()).encode() if ys.dtype == object else ys.tobytes())
+        return digest.hexdigest()
+
+    def is_built(self, featurizer: MolecularFeaturizer, smiles: Iterable[str], y: Iterable[Any] = None) -> bool:
+        """Whether the store on disk holds the `smiles` and `y` featurized by `featurizer`."""
+        try:
+            with open(self._file('meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        smiles = list(smiles)
+        return meta.get('signature') == featurizer._signature() and meta.get('rows') == len(smiles) \
+            and meta.get('content') == self.content_hash(smiles, y)
+
+    def open(self):
+        with open(self._file('meta.json')) as f:
+            self.meta = json.load(f)
+        # Copy on write mappings are writable, so torch does not warn when wrapping them
+        self.X = np.load(self._file('X.npy'), mmap_mode='c')
+        self.y = np.load(self._file('y.npy'), mmap_mode='c')
+        self.failed = np.load(self._file('failed.npy'), mmap_mode='r')
+        return self
+
+    def build(self, featurizer: MolecularFeaturizer, smiles: Iterable[str], y: Iterable[Any] = None
+              , chunk_size: int = 10000, dtype=np.float32, **kwargs):
+        """
+        Featurizes the smiles in chunks of `chunk_size` straight into the memory mapped store.
+        Extra keyword arguments, e.g. `n_jobs`, are passed to `featurize_dataframe`.
+        """
+        smiles = list(smiles)
+        n_rows = len(smiles)
+        os.makedirs(self.path, exist_ok=True)
+        if os.path.exists(self._file('meta.json')):
+            os.remove(self._file('meta.json'))
+        X = None
+        columns = None
+        failed = np.zeros(n_rows, dtype=bool)
+        for start in range(0, n_rows, chunk_size):
+            chunk = smiles[start:start + chunk_size]
+            rows, columns, chunk_failed = self._featurize_chunk(featurizer, chunk, dtype, **kwargs)
+            if X is None:
+                X = np.lib.format.open_memmap(self._file('X.npy'), mode='w+', dtype=dtype
+                                              , shape=(n_rows,) + rows.shape[1:])
+            X[start:start + len(chunk)] = rows
+            failed[start:start + len(chunk)] = chunk_failed
+        if X is None:
+            X = np.lib.format.open_memmap(self._file('X.npy'), mode='w+', dtype=dtype, shape=(0, 0))
+            columns = []
+        X.flush()
+        del X
+        ys = np.empty((n_rows, 0)) if y is None else np.asarray(y).reshape(n_rows, -1)
+        np.save(self._file('y.npy'), ys)
+        np.save(self._file('failed.npy'), failed)
+        meta = {'signature': featurizer._signature(), 'rows': n_rows, 'content': self.content_hash(smiles, y)
+                , 'columns': columns, 'dtype': np.dtype(dtype).name}
+        with open(self._file('meta.json'), 'w') as f:
+            json.dump(meta, f)
+        return self.open()
+
+    @staticmethod
+    def _featurize_chunk(featurizer: MolecularFeaturizer, chunk, dtype, **kwargs):
+        try:
+            descriptors = featurizer.featurize_dataframe(chunk, dtype=dtype, **kwargs)
+            return descriptors.to_numpy(), list(descriptors), descriptors.attrs['failed']
+        except ValueError:
+            pass
+        # Array valued featurizers (OneHotSequence, SmilesImage, ...) keep their shape per row
+        descriptors = featurizer.featurize_dataframe(chunk, **kwargs)
+        columns = list(descriptors)
+        values = descriptors[columns[0]].to_list()
+        if not all(isinstance(v, np.ndarray) for v in values):
+            raise ValueError("%s does not produce arrays and can not be stored in a memory mapped array"
+                             % featurizer.__class__.__name__)
+        failed = np.array([v.size == 0 for v in values])
+        shapes = {v.shape for v in values if v.size > 0}
+        if len(shapes) > 1:
+            raise ValueError("%s produces arrays of different shapes and can not be stored in a "
+                             "memory mapped array" % featurizer.__class__.__name__)
+        rows = np.full((len(values),) + (shapes.pop() if shapes else (0,)), np.nan, dtype=dtype)
+        for i, v in enumerate(values):
+            if not failed[i]:
+                rows[i] = v
+        return rows, columns, failed
@@ -0,0 +1,185 @@
+"""
+Background featurization of streaming graph datasets
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import numpy as np
+from jaqpotpy.descriptors.base_classes import MolecularFeaturizer
+from jaqpotpy.descriptors.graph.graph_data import GraphData, PackedGraphData
+
+logger = logging.getLogger(__name__)
+
+
+def _featurize_graphs(featurizer: MolecularFeaturizer, smiles: list) -> list:
+    """Featurize a batch of smiles inside a worker process, None for the failed molecules."""
+    return [g if isinstance(g, GraphData) else None
+            for g in featurizer._iter_featurize(smiles, '_featurize')]
+
+
+class StreamingGraphLoader(object):
+    """
+    Iterates over the batches of a streaming TorchGraphDataset.
+
+    The molecules of the next batches are featurized by `num_workers` background processes
+    while the current one is trained on. At most `prefetch` batches are in flight, so the
+    memory used does not grow with the dataset. With `num_workers=0` the molecules are
+    featurized in the main process, when the batch is requested.
+
+    Batches come in the order of the sampler if `ordered`, otherwise as soon as they are
+    featurized. With `cache`, the graphs featurized in the first epoch are kept and the
+    next epochs cut their batches from them, without featurizing again. The molecules the
+    first epoch did not visit, like the ones dropped with `drop_last`, are featurized when
+    it ends.
+
+    Molecules that fail to be featurized are left out of their batch, and batches whose
+    molecules all fail are skipped.
+
+    Examples
+    --------
+    >>> dataset = TorchGraphDataset(smiles=smiles, y=ys, task='regression', streaming=True).create()
+    >>> for batch in dataset.stream(64, shuffle=True, num_workers=4, cache=True):
+    ...     out = model(batch.x, batch.edge_index, batch.batch)
+    """
+
+    def __init__(self, dataset, batch_size: int, shuffle: bool = False, drop_last: bool = False
+                 , num_workers: int = 0, prefetch: int = None, cache: bool = False, ordered: bool = True
+                 , generator=None):
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.prefetch = prefetch if prefetch is not None else 2 * max(num_workers, 1)
+        self.cache = cache
+        self.ordered = ordered
+        self.sampler = dataset.batch_sampler(batch_size, shuffle=shuffle, drop_last=drop_last, generator=generator)
+        self._graphs = [None] * len(dataset) if cache else None
+        self._seen = np.zeros(len(dataset), dtype=bool) if cache else None
+        self._packed = None
+        self._positions = None
+        self._ok = None
+        self._executor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        return state
+
+    def __len__(self):
+        return len(self.sampler)
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def cached(self) -> bool:
+        """Whether all the graphs are cached and batches are cut without featurizing."""
+        return self._packed is not None
+
+    def close(self):
+        """Shut the worker processes down."""
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __iter__(self):
+        if self._packed is not None:
+            for indices in self.sampler:
+                indices = np.asarray(indices, dtype=np.int64)
+                indices = indices[self._ok[indices]]
+                if len(indices) == 0:
+                    continue
+                yield self.dataset._collate(self._packed, self._positions[indices], self.dataset._y_tensor[indices])
+            return
+        if self.num_workers == 0:
+            for indices in self.sampler:
+                todo = self._todo(indices)
+                batch = self._batch(indices, todo, _featurize_graphs(self.dataset.featurizer, self._smiles(todo)))
+                if batch is not None:
+                    yield batch
+        else:
+            yield from self._prefetch()
+        if self.cache:
+            self._fill()
+            self._pack()
+
+    def _todo(self, indices):
+        """The indices of the batch that are not cached yet."""
+        indices = np.asarray(indices, dtype=np.int64)
+        return indices if not self.cache else indices[~self._seen[indices]]
+
+    def _smiles(self, indices):
+        smiles = self.dataset.smiles_strings
+        return [smiles[i] for i in indices]
+
+    def _prefetch(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.num_workers)
+        batches = iter(self.sampler)
+        pending = deque()
+
+        def submit():
+            for indices in batches:
+                todo = self._todo(indices)
+                future = self._executor.submit(_featurize_graphs, self.dataset.featurizer, self._smiles(todo))
+                pending.append((indices, todo, future))
+                return True
+            return False
+
+        while len(pending) < self.prefetch and submit():
+            pass
+        while pending:
+            if self.ordered:
+                item = pending.popleft()
+            else:
+                wait([future for _, _, future in pending], return_when=FIRST_COMPLETED)
+                k = next(k for k, (_, _, future) in enumerate(pending) if future.done())
+                item = pending[k]
+                del pending[k]
+            indices, todo, future = item
+            graphs = future.result()
+            submit()
+            batch = self._batch(indices, todo, graphs)
+            if batch is not None:
+                yield batch
+
+    def _batch(self, indices, todo, graphs):
+        """Collate the featurized graphs of a batch, None if all of them failed."""
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.cache:
+            for i, g in zip(todo, graphs):
+                self._graphs[i] = g
+            self._seen[todo] = True
+            graphs = [self._graphs[i] for i in indices]
+        ok = np.array([g is not None for g in graphs], dtype=bool)
+        if not ok.all():
+            logger.warning("Leaving %d molecules that failed to featurize out of the batch", (~ok).sum())
+        if not ok.any():
+            return None
+        graphs = [g for g in graphs if g is not None]
+        packed = PackedGraphData.from_graphs(graphs, node_dtype=np.float32, edge_dtype=np.int64)
+        return self.dataset._collate(packed, np.arange(len(graphs)), self.dataset._y_tensor[indices[ok]])
+
+    def _fill(self):
+        """Featurize the molecules that are not cached yet, one batch at a time."""
+        todo = np.flatnonzero(~self._seen)
+        chunks = [todo[k:k + self.batch_size] for k in range(0, len(todo), self.batch_size)]
+        if self._executor is not None:
+            results = self._executor.map(_featurize_graphs, [self.dataset.featurizer] * len(chunks)
+                                         , [self._smiles(chunk) for chunk in chunks])
+        else:
+            results = (_featurize_graphs(self.dataset.featurizer, self._smiles(chunk)) for chunk in chunks)
+        for chunk, graphs in zip(chunks, results):
+            for i, g in zip(chunk, graphs):
+                self._graphs[i] = g
+        self._seen[todo] = True
+
+    def _pack(self):
+        """Pack the cached graphs, the failed molecules are left out of the next epochs."""
+        ok = np.array([g is not None for g in self._graphs], dtype=bool)
+        self._packed = PackedGraphData.from_graphs([g for g in self._graphs if g is not None]
+                                                   , node_dtype=np.float32, edge_dtype=np.int64)
+        # Positions in the packed graphs of every molecule of the dataset
+        self._positions = np.cumsum(ok) - 1
+        self._ok = ok
+        self._graphs = None
+        self.close()
@@ -138,6 +138,95 @@ class TestMolDatasets(unittest.TestCase):
                    0] == 'O=C1CCCN1Cc1cccc(C(=O)N2CCC(C3CCNC3)CC2)c1'
         assert len(dataset.df) == 23
 
+    def test_smiles_torch_dataset_batches(self):
+        import torch
+        dataset = TorchGraphDataset(smiles=self.mols, y=self.ys_regr, task='regression'
+                                    , featurizer=MolGraphConvFeaturizer(use_edges=True))
+        dataset.create()
+        assert len(dataset) == 23
+        per_graph = list(DataLoader(dataset, batch_size=5, shuffle=False))
+        batched = list(dl(dataset, sampler=dataset.batch_sampler(5), batch_size=None))
+        assert len(per_graph) == len(batched) == 5
+        for expected, batch in zip(per_graph, batched):
+            assert torch.equal(expected.x, batch.x)
+            assert torch.equal(expected.edge_index, batch.edge_index)
+            assert torch.equal(expected.edge_attr, batch.edge_attr)
+            assert torch.equal(expected.batch, batch.batch)
+            assert torch.equal(expected.y, batch.y)
+            assert batch.num_graphs == expected.num_graphs
+
+        shuffled = dataset[[7, 2, 11]]
+        expected = next(iter(DataLoader([dataset[7], dataset[2], dataset[11]], batch_size=3)))
+        assert torch.equal(expected.x, shuffled.x)
+        assert torch.equal(expected.edge_index, shuffled.edge_index)
+
+    def test_streaming_torch_dataset_batches(self):
+        import torch
+        featurizer = MolGraphConvFeaturizer(use_edges=True)
+        dataset = TorchGraphDataset(smiles=self.mols, y=self.ys_regr, task='regression', featurizer=featurizer)
+        dataset.create()
+        streaming = TorchGraphDataset(smiles=self.mols, y=self.ys_regr, task='regression', featurizer=featurizer
+                                      , streaming=True, cache=True)
+        streaming.create()
+        assert len(streaming) == 23
+        assert torch.equal(streaming[10].x, dataset[10].x)
+        assert torch.equal(streaming[10].y, dataset[10].y)
+        expected = list(dl(dataset, sampler=dataset.batch_sampler(5), batch_size=None))
+        for num_workers in [0, 2]:
+            loader = streaming.stream(5, num_workers=num_workers)
+            for epoch in range(2):
+                batches = list(loader)
+                assert len(batches) == len(expected)
+                for e, batch in zip(expected, batches):
+                    assert torch.equal(e.x, batch.x)
+                    assert torch.equal(e.edge_index, batch.edge_index)
+                    assert torch.equal(e.edge_attr, batch.edge_attr)
+                    assert torch.equal(e.batch, batch.batch)
+                    assert torch.equal(e.y, batch.y)
+                # The graphs of the first epoch are cached for the next ones
+                assert loader.cached
+            loader.close()
+
+    def test_streaming_failed_batches(self):
+        import torch
+        featurizer = MolGraphConvFeaturizer(use_edges=True)
+        smiles = self.mols[:3] + ['axa', 'xyz', 'inv'] + self.mols[3:5]
+        streaming = TorchGraphDataset(smiles=smiles, y=self.ys_regr[:8], task='regression', featurizer=featurizer
+                                      , streaming=True, cache=True)
+        streaming.create()
+        for num_workers in [0, 2]:
+            loader = streaming.stream(3, num_workers=num_workers)
+            for epoch in range(2):
+                # The batch of the three invalid molecules is skipped
+                batches = list(loader)
+                assert [batch.num_graphs for batch in batches] == [3, 2]
+                assert torch.equal(batches[1].y, torch.tensor(self.ys_regr[6:8], dtype=batches[1].y.dtype))
+            assert loader.cached
+            loader.close()
+
+    def test_streaming_drop_last_cache(self):
+        import torch
+        featurizer = MolGraphConvFeaturizer(use_edges=True)
+        dataset = TorchGraphDataset(smiles=self.mols, y=self.ys_regr, task='regression', featurizer=featurizer)
+        dataset.create()
+        streaming = TorchGraphDataset(smiles=self.mols, y=self.ys_regr, task='regression', featurizer=featurizer
+                                      , streaming=True, cache=True)
+        streaming.create()
+        expected = list(dl(dataset, sampler=dataset.batch_sampler(5, drop_last=True), batch_size=None))
+        assert len(expected) == 4
+        for num_workers in [0, 2]:
+            loader = streaming.stream(5, drop_last=True, num_workers=num_workers)
+            for epoch in range(2):
+                batches = list(loader)
+                assert len(batches) == len(expected)
+                for e, batch in zip(expected, batches):
+                    assert torch.equal(e.x, batch.x)
+                    assert torch.equal(e.edge_index, batch.edge_index)
+                    assert torch.equal(e.y, batch.y)
+                # The three molecules dropped in the first epoch are featurized when it ends
+                assert loader.cached
+            loader.close()
+
     def test_smiles_torch_tab_dataset(self):
         dataset = SmilesDataset(smiles=self.mols, y=self.ys, featurizer=MordredDescriptors(ignore_3D=True),  task='classification')
         dataset.create()
@@ -190,6 +279,105 @@ class TestMolDatasets(unittest.TestCase):
             from torch import Tensor
             assert type(data[0]) == Tensor
 
+    def test_smiles_dataset_store(self):
+        import tempfile
+        import numpy as np
+        from unittest import mock
+        from torch import Tensor
+        from jaqpotpy.datasets.storage import MemmapStore
+        in_memory = SmilesDataset(smiles=self.mols, y=self.ys, featurizer=TopologicalFingerprint()).create()
+        with tempfile.TemporaryDirectory() as store:
+            dataset = SmilesDataset(smiles=self.mols, y=self.ys, featurizer=TopologicalFingerprint()
+                                    , store=store, chunk_size=5)
+            dataset.create()
+            assert len(dataset) == 23
+            assert dataset.X == in_memory.X
+            assert np.array_equal(dataset.__get_X__(), in_memory.__get_X__())
+            X, y = dataset[10]
+            assert np.array_equal(X, in_memory[10][0])
+            assert np.array_equal(y, in_memory[10][1])
+            assert np.shares_memory(dataset[10][0], dataset.store.X)
+
+            for data in dl(dataset, batch_size=4, shuffle=True, num_workers=0):
+                assert type(data[0]) == Tensor
+                assert data[0].shape[1] == 2048
+
+            # A dataset with the same featurizer and size reuses the store
+            reopened = SmilesDataset(smiles=self.mols, y=self.ys, featurizer=TopologicalFingerprint(), store=store)
+            with mock.patch.object(TopologicalFingerprint, 'featurize_dataframe') as featurize:
+                reopened.create()
+            featurize.assert_not_called()
+            assert np.array_equal(reopened[3][0], in_memory[3][0])
+
+            # Other molecules or endpoints of the same size are featurized again
+            relabeled = SmilesDataset(smiles=self.mols, y=[1 - y for y in self.ys], featurizer=TopologicalFingerprint()
+                                      , store=store)
+            relabeled.create()
+            assert np.array_equal(relabeled[3][1], 1 - in_memory[3][1])
+            others = self.mols[1:] + self.mols[:1]
+            shifted = SmilesDataset(smiles=others, y=self.ys, featurizer=TopologicalFingerprint(), store=store)
+            with mock.patch.object(MemmapStore, 'build', autospec=True, side_effect=MemmapStore.build) as build:
+                shifted.create()
+            build.assert_called_once()
+            assert np.array_equal(shifted[0][0], in_memory[1][0])
+
+    def test_streaming_store_items(self):
+        import tempfile
+        import numpy as np
+        cid = create_char_to_idx(self.mols)
+        for featurizer in [TopologicalFingerprint(), SmilesToSeq(char_to_idx=cid)]:
+            streaming = SmilesDataset(smiles=self.mols, y=self.ys_regr, featurizer=featurizer, streaming=True)
+            assert len(streaming) == 23
+            with tempfile.TemporaryDirectory() as store:
+                # The store takes over from streaming
+                stored = SmilesDataset(smiles=self.mols, y=self.ys_regr, featurizer=featurizer, streaming=True
+                                       , store=store)
+                stored.create()
+                for idx in [0, 10]:
+                    X, y = streaming[idx]
+                    assert np.shares_memory(stored[idx][0], stored.store.X)
+                    assert X.dtype == stored[idx][0].dtype
+                    assert np.array_equal(X, stored[idx][0])
+                    assert np.array_equal(y, stored[idx][1])
+                assert streaming.X == stored.X
+
+    def test_smiles_dataset_batches(self):
+        import numpy as np
+        import torch
+        dataset = SmilesDataset(smiles=self.mols, y=self.ys, featurizer=TopologicalFingerprint(), task='classification')
+        dataset.create()
+        assert dataset.tensor_storage
+        X, y = dataset[[0, 5, 7]]
+        assert X.shape == (3, 2048) and X.dtype == np.float32
+        assert np.array_equal(y, dataset.df[['Y']].to_numpy()[[0, 5, 7]])
+
+        items = dataset.__getitems__([2, 3])
+        assert np.array_equal(items[1][0], dataset[3][0])
+
+        batched = list(dl(dataset, sampler=dataset.batch_sampler(4), batch_size=None))
+        per_item = list(dl(dataset, batch_size=4))
+        assert len(batched) == len(per_item) == 6
+        for (X_b, y_b), (X_i, y_i) in zip(batched, per_item):
+            assert torch.equal(X_b, X_i)
+            assert torch.equal(y_b, y_i)
+
+        # Selecting other columns falls back to the Dataframe
+        dataset.X = dataset.X[:10]
+        assert not dataset.tensor_storage
+        assert dataset[0][0].shape == (10,)
+
+    def test_seq_dataset_store(self):
+        import tempfile
+        import numpy as np
+        cid = create_char_to_idx(self.mols)
+        in_memory = SmilesDataset(smiles=self.mols, y=self.ys_regr, featurizer=SmilesToSeq(char_to_idx=cid)).create()
+        with tempfile.TemporaryDirectory() as store:
+            dataset = SmilesDataset(smiles=self.mols, y=self.ys_regr, featurizer=SmilesToSeq(char_to_idx=cid)
+                                    , store=store, chunk_size=10)
+            dataset.create()
+            assert np.array_equal(dataset[4][0], in_memory[4][0])
+            assert np.allclose(dataset[4][1], in_memory[4][1])
+
     def test_generative_datasets(self):
         feat = MolGanFeaturizer(max_atom_count=60)
         dataset = SmilesDataset(smiles=self.mols, task="generation", featurizer=feat)
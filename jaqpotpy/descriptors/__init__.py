@@ -12,3 +12,4 @@
 # from jaqpotpy.descriptors.molecular.smles_to_image import SmilesToImage
 # from jaqpotpy.descriptors.molecular.molgan import MolGanFeaturizer
 from jaqpotpy.descriptors.base_classes import ComplexFeaturizer
+from jaqpotpy.descriptors.cache import DescriptorCache
@@ -10,6 +10,10 @@ from jaqpotpy.cfg import config
 logger = logging.getLogger(__name__)
 _print_threshold = 10
 
+# Featurizers whose single column holds a whole object (sequence, image, graph) per molecule
+_OBJECT_COLUMNS = [['Sequence'], ['OneHotSequence'], ['SmilesImage'], ['MACCSFingerprint'],
+                   ['MolGanGraphs']]
+
 
 class Featurizer(object):
   """Abstract class for calculating a set of features for a datapoint.
@@ -158,6 +162,23 @@ class Featurizer(object):
           override_args_info += '_' + arg_name + '_' + str(arg_value)
     return self.__class__.__name__ + override_args_info
 
+  def _signature(self) -> str:
+    """Identify the features of the featurizer for caching.
+    Unlike `__str__`, which leaves out lists and paths, every constructor
+    argument is included, so featurizers that differ in any of them get
+    different signatures.
+    """
+    args_spec = inspect.getfullargspec(self.__init__)  # type: ignore
+    args = {arg: self.__dict__[arg] for arg in args_spec.args if arg != 'self' and arg in self.__dict__}
+    for arg_name, value in args.items():
+      if isinstance(value, np.ndarray):
+        # The repr of large arrays is truncated
+        args[arg_name] = value.tolist()
+      elif isinstance(value, (set, frozenset)):
+        args[arg_name] = sorted(value, key=repr)
+    return self.__class__.__name__ + repr(sorted(args.items()))
+
+
 class ComplexFeaturizer(Featurizer):
   """"
   Abstract class for calculating features for mol/protein complexes.
@@ -385,8 +406,21 @@ class MolecularFeaturizer(Featurizer):
   Note
   ----
   The subclasses of this class require RDKit to be installed.
+  A `DescriptorCache` can be assigned to the `cache` attribute of a
+  featurizer, or of this class to share it across all featurizers, so that
+  molecules featurized before are read from the cache. RDKit Mols keep their
+  own atom order and are always featurized.
   """
-  def featurize(self, datapoints, log_every_n=1000, **kwargs) -> np.ndarray:
+  cache = None
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    # The cache belongs to the host that featurizes, not to pickled models or workers
+    state.pop('cache', None)
+    return state
+
+  def featurize(self, datapoints, log_every_n=1000, n_jobs=1, chunk_size=None,
+                executor=None, **kwargs) -> np.ndarray:
     """Calculate features for molecules.
     Parameters
     ----------
@@ -395,63 +429,28 @@ class MolecularFeaturizer(Featurizer):
       strings.
     log_every_n: int, default 1000
       Logging messages reported every `log_every_n` samples.
+    n_jobs: int, default 1
+      Number of worker processes used to featurize the datapoints. If 1 the
+      molecules are featurized serially, if -1 all the available cpus are used.
+    chunk_size: int, optional (default None)
+      Number of datapoints sent to a worker at once. If None, it is computed
+      from the number of datapoints and workers.
+    executor: concurrent.futures.Executor, optional (default None)
+      An already running executor to dispatch the chunks to. If given,
+      `n_jobs` only sizes the chunks and the executor is not shut down.
     Returns
     -------
     features: np.ndarray
       A numpy array containing a featurized representation of `datapoints`.
     """
-    try:
-      from rdkit import Chem
-      from rdkit.Chem import rdmolfiles
-      from rdkit.Chem import rdmolops
-      from rdkit.Chem.rdchem import Mol
-    except ModuleNotFoundError:
-      raise ImportError("This class requires RDKit to be installed.")
-
-    if 'molecules' in kwargs:
-      datapoints = kwargs.get("molecules")
-      raise DeprecationWarning(
-          'Molecules is being phased out as a parameter, please pass "datapoints" instead.'
-      )
-
-    # Special case handling of single molecule
-    if isinstance(datapoints, str) or isinstance(datapoints, Mol):
-      datapoints = [datapoints]
-    else:
-      # Convert iterables to list
-      datapoints = list(datapoints)
-
-    features: list = []
-    if config.verbose is False:
-      disable_tq = True
-    else:
-      disable_tq = False
-    for i, mol in enumerate(tqdm(datapoints, desc='Creating descriptors', disable=disable_tq)):
-      if i % log_every_n == 0:
-        logger.info("Featurizing datapoint %i" % i)
-
-      try:
-        if isinstance(mol, str):
-          # mol must be a RDKit Mol object, so parse a SMILES
-          mol = Chem.MolFromSmiles(mol)
-          # SMILES is unique, so set a canonical order of atoms
-          new_order = rdmolfiles.CanonicalRankAtoms(mol)
-          mol = rdmolops.RenumberAtoms(mol, new_order)
-
-        features.append(self._featurize(mol, **kwargs))
-      except Exception as e:
-        if isinstance(mol, Chem.rdchem.Mol):
-          mol = Chem.MolToSmiles(mol)
-        if config.verbose is True:
-          logger.warning(
-              "Failed to featurize datapoint %d, %s. Appending empty array", i,
-              mol)
-          logger.warning("Exception message: {}".format(e))
-        features.append(np.array([]))
-
+    datapoints = self._prepare_datapoints(datapoints, **kwargs)
+    features = self._featurize_molecules(datapoints, '_featurize', log_every_n=log_every_n,
+                                         n_jobs=n_jobs, chunk_size=chunk_size,
+                                         executor=executor, **kwargs)
     return np.asarray(features)
 
-  def featurize_dataframe(self, datapoints, log_every_n=1000, **kwargs) -> Any:
+  def featurize_dataframe(self, datapoints, log_every_n=1000, n_jobs=1, chunk_size=None,
+                          executor=None, dtype=None, **kwargs) -> Any:
     """Calculate features for molecules.
     Parameters
     ----------
@@ -460,15 +459,67 @@ class MolecularFeaturizer(Featurizer):
       strings.
     log_every_n: int, default 1000
       Logging messages reported every `log_every_n` samples.
+    n_jobs: int, default 1
+      Number of worker processes used to featurize the datapoints. If 1 the
+      molecules are featurized serially, if -1 all the available cpus are used.
+    chunk_size: int, optional (default None)
+      Number of datapoints sent to a worker at once. If None, it is computed
+      from the number of datapoints and workers.
+    executor: concurrent.futures.Executor, optional (default None)
+      An already running executor to dispatch the chunks to. If given,
+      `n_jobs` only sizes the chunks and the executor is not shut down.
+    dtype: np.dtype, optional (default None)
+      If given, the features are written in place into a preallocated
+      (n_datapoints, n_columns) matrix of this dtype that backs the returned
+      Dataframe. Rows of molecules that failed are NaN and are flagged in the
+      boolean array `df.attrs['failed']`.
     Returns
     -------
     features: pd.Dataframe()
       A pandas Dataframe containing a featurized representation of `datapoints`.
     """
+    datapoints = self._prepare_datapoints(datapoints, **kwargs)
+    columns = self._column_names()
+    if dtype is not None:
+      return self._featurize_columnar(datapoints, columns, dtype, log_every_n=log_every_n,
+                                      n_jobs=n_jobs, chunk_size=chunk_size,
+                                      executor=executor, **kwargs)
+    features = self._featurize_molecules(datapoints, '_featurize_dataframe', log_every_n=log_every_n,
+                                         n_jobs=n_jobs, chunk_size=chunk_size,
+                                         executor=executor, **kwargs)
+    # features = np.array(features)
+    if columns in _OBJECT_COLUMNS:
+      df = pd.DataFrame({columns[0]: features})
+    else:
+      df = pd.DataFrame(features, columns=columns)
+    return df
+
+  def _featurize_columnar(self, datapoints: list, columns: list, dtype, **kwargs) -> pd.DataFrame:
+    """Featurize the molecules straight into a preallocated matrix and wrap it
+    in a Dataframe without copying.
+    """
+    if columns in _OBJECT_COLUMNS:
+      raise ValueError("%s does not produce numeric features and can not be featurized with a dtype"
+                       % self.__class__.__name__)
+    matrix = np.full((len(datapoints), len(columns)), np.nan, dtype=dtype)
+    failed = np.zeros(len(datapoints), dtype=bool)
+
+    def write(start: int, features: list):
+      for i, feature in enumerate(features, start):
+        feature = np.asarray(feature)
+        if feature.size != len(columns):
+          failed[i] = True
+          continue
+        matrix[i] = feature.reshape(-1)
+
+    self._featurize_molecules(datapoints, '_featurize_dataframe', sink=write, **kwargs)
+    df = pd.DataFrame(matrix, columns=columns, copy=False)
+    df.attrs['failed'] = failed
+    return df
+
+  def _prepare_datapoints(self, datapoints, **kwargs) -> list:
+    """Turn the datapoints passed to `featurize` into a list of molecules."""
     try:
-      from rdkit import Chem
-      from rdkit.Chem import rdmolfiles
-      from rdkit.Chem import rdmolops
       from rdkit.Chem.rdchem import Mol
     except ModuleNotFoundError:
       raise ImportError("This class requires RDKit to be installed.")
@@ -481,17 +532,129 @@ class MolecularFeaturizer(Featurizer):
 
     # Special case handling of single molecule
     if isinstance(datapoints, str) or isinstance(datapoints, Mol):
-      datapoints = [datapoints]
-    else:
-      # Convert iterables to list
-      datapoints = list(datapoints)
+      return [datapoints]
+    # Convert iterables to list
+    return list(datapoints)
+
+  def _featurize_molecules(self, datapoints: list, method: str, sink=None, **kwargs) -> Optional[list]:
+    """Featurize a list of molecules with `method`, either serially or by
+    sharding the molecules across a pool of worker processes.
+    The features are returned in the order of `datapoints`. Failed molecules
+    get an empty array, as in the serial path. If `sink` is given, it is called
+    as `sink(start, features)` with consecutive runs of features as soon as they
+    are ready and nothing is returned.
+    """
+    features = None
+    if sink is None:
+      features = [None] * len(datapoints)
 
-    features: list = []
-    if config.verbose is False:
-      disable_tq = True
+      def sink(start: int, chunk: list):
+        features[start:start + len(chunk)] = chunk
+
+    if self.cache is not None:
+      self._featurize_cached(datapoints, method, sink, **kwargs)
     else:
-      disable_tq = False
-    for i, mol in enumerate(tqdm(datapoints, desc='Creating descriptors', disable=disable_tq)):
+      self._featurize_uncached(datapoints, method, sink, **kwargs)
+    return features
+
+  def _featurize_cached(self, datapoints: list, method: str, sink, **kwargs):
+    """Featurize only the molecules missing from `self.cache` and store them."""
+    from jaqpotpy.descriptors.cache import canonical_smiles
+
+    signature = self._signature() + ':' + method
+    # SMILES are featurized in canonical atom order, Mols in their own one, so only SMILES are cached
+    keys = [canonical_smiles(mol) if isinstance(mol, str) else None for mol in datapoints]
+    found = self.cache.get_many(signature, [key for key in keys if key is not None])
+    pending = []
+    for i, key in enumerate(keys):
+      if key in found:
+        sink(i, [found[key]])
+      else:
+        pending.append(i)
+
+    new = {}
+
+    def store(start: int, chunk: list):
+      for j, feature in enumerate(chunk, start):
+        i = pending[j]
+        sink(i, [feature])
+        # Failed molecules are featurized again next time
+        if keys[i] is not None and not (isinstance(feature, np.ndarray) and feature.size == 0):
+          new[keys[i]] = feature
+
+    self._featurize_uncached([datapoints[i] for i in pending], method, store, **kwargs)
+    self.cache.set_many(signature, new)
+
+  def _column_names(self) -> list:
+    """Return `_get_column_names`, read from `self.cache` when possible."""
+    if self.cache is None:
+      return self._get_column_names()
+    signature = self._signature()
+    columns = self.cache.get_columns(signature)
+    if columns is None:
+      columns = self._get_column_names()
+      self.cache.set_columns(signature, columns)
+    return columns
+
+  def _featurize_uncached(self, datapoints: list, method: str, sink, log_every_n=1000, n_jobs=1,
+                          chunk_size=None, executor=None, **kwargs):
+    """Featurize the molecules with `method`, serially or in the process pool."""
+    if n_jobs is not None and n_jobs < 0:
+      n_jobs = os.cpu_count() or 1
+    if executor is None and (n_jobs is None or n_jobs <= 1 or len(datapoints) <= 1):
+      for i, feature in enumerate(self._iter_featurize(datapoints, method, log_every_n=log_every_n,
+                                                       progress=True, **kwargs)):
+        sink(i, [feature])
+      return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    if chunk_size is None:
+      # A few chunks per worker keeps the pool busy when molecules differ in cost
+      chunk_size = int(np.ceil(len(datapoints) / (max(n_jobs or 1, 1) * 4)))
+    chunk_size = max(1, min(chunk_size, len(datapoints)))
+
+    own_executor = executor is None
+    if own_executor:
+      executor = ProcessPoolExecutor(max_workers=n_jobs)
+    try:
+      futures = {}
+      for offset in range(0, len(datapoints), chunk_size):
+        future = executor.submit(_featurize_shard, self, datapoints[offset:offset + chunk_size],
+                                 method, offset, kwargs)
+        futures[future] = offset
+      with tqdm(total=len(datapoints), desc='Creating descriptors',
+                disable=config.verbose is False) as progress:
+        for future in as_completed(futures):
+          offset = futures.pop(future)
+          size = min(chunk_size, len(datapoints) - offset)
+          try:
+            chunk = future.result()
+          except Exception as e:
+            logger.warning("Failed to featurize datapoints %d to %d. Appending empty arrays",
+                           offset, offset + size - 1)
+            logger.warning("Exception message: {}".format(e))
+            chunk = [np.array([]) for _ in range(size)]
+          sink(offset, chunk)
+          progress.update(size)
+    finally:
+      if own_executor:
+        executor.shutdown()
+
+  def _iter_featurize(self, datapoints: list, method: str, offset=0, log_every_n=1000,
+                      progress=False, **kwargs):
+    """Featurize a list of molecules serially with `method`, yielding the
+    features one molecule at a time.
+    """
+    from rdkit import Chem
+    from rdkit.Chem import rdmolfiles
+    from rdkit.Chem import rdmolops
+
+    featurize = getattr(self, method)
+    disable_tq = progress is False or config.verbose is False
+    for i, mol in enumerate(tqdm(datapoints, desc='Creating descriptors', disable=disable_tq), offset):
+      if i % log_every_n == 0:
+        logger.info("Featurizing datapoint %i" % i)
 
       try:
         if isinstance(mol, str):
@@ -500,10 +663,8 @@ class MolecularFeaturizer(Featurizer):
           # SMILES is unique, so set a canonical order of atoms
           new_order = rdmolfiles.CanonicalRankAtoms(mol)
           mol = rdmolops.RenumberAtoms(mol, new_order)
-          ar = self._featurize_dataframe(mol, **kwargs)
-        else:
-          ar = self._featurize_dataframe(mol, **kwargs)
-        features.append(ar)
+
+        yield featurize(mol, **kwargs)
       except Exception as e:
         if isinstance(mol, Chem.rdchem.Mol):
           mol = Chem.MolToSmiles(mol)
@@ -512,23 +673,13 @@ class MolecularFeaturizer(Featurizer):
               "Failed to featurize datapoint %d, %s. Appending empty array", i,
               mol)
           logger.warning("Exception message: {}".format(e))
-        features.append(np.array([]))
-        # features.append(self._featurize_dataframe(mol, **kwargs))
-    columns = self._get_column_names()
-    # features = np.array(features)
-    if columns == ['Sequence']:
-      df = pd.DataFrame({'Sequence': features})
-    elif columns == ['OneHotSequence']:
-      df = pd.DataFrame({'OneHotSequence': features})
-    elif columns == ['SmilesImage']:
-      df = pd.DataFrame({'SmilesImage': features})
-    elif columns == ['MACCSFingerprint']:
-      df = pd.DataFrame({'MACCSFingerprint': features})
-    elif columns == ['MolGanGraphs']:
-      df = pd.DataFrame({'MolGanGraphs': features})
-    else:
-      df = pd.DataFrame(features, columns=columns)
-    return df
+        yield np.array([])
+
+
+def _featurize_shard(featurizer: MolecularFeaturizer, datapoints: list, method: str,
+                     offset: int, kwargs: dict) -> list:
+  """Featurize a shard of molecules inside a worker process."""
+  return list(featurizer._iter_featurize(datapoints, method, offset=offset, **kwargs))
 
 
 class ParserFeaturizer(Featurizer):
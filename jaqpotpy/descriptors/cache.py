@@ -0,0 +1,246 @@
+"""
+Content addressed cache for molecular descriptors.
+"""
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_smiles(datapoint: Any) -> Optional[str]:
+  """Return the canonical SMILES of a SMILES string or RDKit Mol.
+  Parameters
+  ----------
+  datapoint: str / rdkit.Chem.rdchem.Mol
+    The molecule to canonicalize.
+  Returns
+  -------
+  str or None
+    The canonical SMILES, or None if the molecule could not be parsed.
+  """
+  from rdkit import Chem
+  if isinstance(datapoint, str):
+    mol = Chem.MolFromSmiles(datapoint)
+  else:
+    mol = datapoint
+  if mol is None:
+    return None
+  try:
+    return Chem.MolToSmiles(mol)
+  except Exception:
+    return None
+
+
+class DescriptorCache(object):
+  """Two tier cache of featurized molecules.
+  Features are keyed by the canonical SMILES of the molecule and the
+  signature of the featurizer that produced them (its `_signature`, which
+  encodes all of its parameters). Only SMILES inputs are cached: they are
+  featurized in canonical atom order, while RDKit Mols keep their own order
+  and are featurized every time. Recently used features are kept
+  in an in memory LRU, while all of them are persisted in a sqlite
+  database so that they survive between sessions.
+  Attach the cache to a featurizer to use it:
+  >>> from jaqpotpy.descriptors import RDKitDescriptors, DescriptorCache
+  >>> featurizer = RDKitDescriptors()
+  >>> featurizer.cache = DescriptorCache('descriptors.db')
+  >>> features = featurizer.featurize_dataframe(['CCO', 'c1ccccc1'])
+  or set it on `MolecularFeaturizer` to share it across all the featurizers.
+  Attributes
+  ----------
+  hits: int
+    Number of lookups served from memory or disk.
+  misses: int
+    Number of lookups that had to be featurized.
+  """
+
+  def __init__(self, path: Optional[str] = None, max_memory_items: int = 10000,
+               max_disk_bytes: Optional[int] = None):
+    """
+    Parameters
+    ----------
+    path: str, optional (default None)
+      The sqlite file of the on disk tier. If None only the memory tier is used.
+    max_memory_items: int, optional (default 10000)
+      Number of features kept in memory before the least recently used are dropped.
+    max_disk_bytes: int, optional (default None)
+      Size of the stored features above which the least recently used rows are
+      deleted from disk. If None the disk tier is not bounded.
+    """
+    self.path = path
+    self.max_memory_items = max_memory_items
+    self.max_disk_bytes = max_disk_bytes
+    self.hits = 0
+    self.misses = 0
+    self.memory_hits = 0
+    self.disk_hits = 0
+    self._memory: OrderedDict = OrderedDict()
+    self._columns: Dict[str, list] = {}
+    self._lock = threading.RLock()
+    self._conn = None
+    if path is not None:
+      self._connect()
+
+  def _connect(self):
+    directory = os.path.dirname(os.path.abspath(self.path))
+    os.makedirs(directory, exist_ok=True)
+    self._conn = sqlite3.connect(self.path, check_same_thread=False)
+    self._conn.execute("PRAGMA journal_mode=WAL")
+    self._conn.execute("CREATE TABLE IF NOT EXISTS features ("
+                       "signature TEXT NOT NULL, smiles TEXT NOT NULL, value BLOB NOT NULL, "
+                       "size INTEGER NOT NULL, accessed REAL NOT NULL, "
+                       "PRIMARY KEY (signature, smiles))")
+    self._conn.execute("CREATE INDEX IF NOT EXISTS features_accessed ON features (accessed)")
+    self._conn.execute("CREATE TABLE IF NOT EXISTS columns ("
+                       "signature TEXT PRIMARY KEY, value BLOB NOT NULL)")
+    self._conn.commit()
+
+  def __len__(self) -> int:
+    if self._conn is not None:
+      with self._lock:
+        return self._conn.execute("SELECT COUNT(*) FROM features").fetchone()[0]
+    return len(self._memory)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_memory'] = OrderedDict()
+    state['_columns'] = {}
+    state['_lock'] = None
+    state['_conn'] = None
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._lock = threading.RLock()
+    if self.path is not None:
+      self._connect()
+
+  def get_many(self, signature: str, keys: Iterable[str]) -> Dict[str, Any]:
+    """Look up the features of `keys` computed by the featurizer `signature`.
+    Returns
+    -------
+    dict
+      The cached features of the keys that were found.
+    """
+    found: Dict[str, Any] = {}
+    missing: List[str] = []
+    with self._lock:
+      for key in dict.fromkeys(keys):
+        item = (signature, key)
+        if item in self._memory:
+          self._memory.move_to_end(item)
+          found[key] = self._memory[item]
+          self.memory_hits += 1
+        else:
+          missing.append(key)
+      if missing and self._conn is not None:
+        from_disk = self._select(signature, missing)
+        for key, value in from_disk.items():
+          self._remember((signature, key), value)
+          found[key] = value
+        self.disk_hits += len(from_disk)
+      self.hits += len(found)
+      self.misses += sum(1 for key in missing if key not in found)
+    return found
+
+  def _select(self, signature: str, keys: List[str]) -> Dict[str, Any]:
+    found = {}
+    # Keep below the sqlite limit of host parameters
+    for start in range(0, len(keys), 500):
+      chunk = keys[start:start + 500]
+      marks = ','.join('?' * len(chunk))
+      rows = self._conn.execute(
+        "SELECT smiles, value FROM features WHERE signature = ? AND smiles IN (%s)" % marks,
+        [signature] + chunk).fetchall()
+      for smiles, value in rows:
+        found[smiles] = pickle.loads(value)
+    if found:
+      now = time.time()
+      self._conn.executemany("UPDATE features SET accessed = ? WHERE signature = ? AND smiles = ?",
+                             [(now, signature, smiles) for smiles in found])
+      self._conn.commit()
+    return found
+
+  def _remember(self, item, value):
+    self._memory[item] = value
+    self._memory.move_to_end(item)
+    while len(self._memory) > self.max_memory_items:
+      self._memory.popitem(last=False)
+
+  def set_many(self, signature: str, features: Dict[str, Any]):
+    """Store the features computed by the featurizer `signature`."""
+    with self._lock:
+      for key, value in features.items():
+        self._remember((signature, key), value)
+      if self._conn is not None and features:
+        now = time.time()
+        rows = []
+        for key, value in features.items():
+          blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+          rows.append((signature, key, sqlite3.Binary(blob), len(blob), now))
+        self._conn.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?)", rows)
+        self._conn.commit()
+        self._evict()
+
+  def _evict(self):
+    if self.max_disk_bytes is None:
+      return
+    size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM features").fetchone()[0]
+    if size <= self.max_disk_bytes:
+      return
+    rows = self._conn.execute("SELECT rowid, size FROM features ORDER BY accessed").fetchall()
+    evict = []
+    for rowid, row_size in rows:
+      if size <= self.max_disk_bytes:
+        break
+      evict.append((rowid,))
+      size -= row_size
+    self._conn.executemany("DELETE FROM features WHERE rowid = ?", evict)
+    self._conn.commit()
+    logger.info("Evicted %d descriptors from the cache" % len(evict))
+
+  def get_columns(self, signature: str) -> Optional[list]:
+    """Return the column names stored for the featurizer `signature`."""
+    with self._lock:
+      if signature in self._columns:
+        return self._columns[signature]
+      if self._conn is not None:
+        row = self._conn.execute("SELECT value FROM columns WHERE signature = ?", (signature,)).fetchone()
+        if row is not None:
+          columns = pickle.loads(row[0])
+          self._columns[signature] = columns
+          return columns
+    return None
+
+  def set_columns(self, signature: str, columns: list):
+    """Store the column names of the featurizer `signature`."""
+    with self._lock:
+      self._columns[signature] = columns
+      if self._conn is not None:
+        self._conn.execute("INSERT OR REPLACE INTO columns VALUES (?, ?)",
+                           (signature, sqlite3.Binary(pickle.dumps(columns))))
+        self._conn.commit()
+
+  def clear(self):
+    """Remove every cached feature from memory and disk and reset the counters."""
+    with self._lock:
+      self._memory.clear()
+      self._columns.clear()
+      if self._conn is not None:
+        self._conn.execute("DELETE FROM features")
+        self._conn.execute("DELETE FROM columns")
+        self._conn.commit()
+      self.hits = self.misses = self.memory_hits = self.disk_hits = 0
+
+  def close(self):
+    """Close the connection to the on disk tier."""
+    with self._lock:
+      if self._conn is not None:
+        self._conn.close()
+        self._conn = None
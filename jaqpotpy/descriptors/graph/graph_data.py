@@ -227,18 +227,15 @@ class BatchGraphData(GraphData):
         else:
             batch_node_pos_features = None
 
-        # create new edge index
-        num_nodes_list = [graph.num_nodes for graph in graph_list]
-        batch_edge_index = np.hstack([
-            graph.edge_index + prev_num_node
-            for prev_num_node, graph in zip([0] + num_nodes_list[:-1], graph_list)
-        ])
+        # create new edge index, shifting every edge by the nodes of the previous graphs
+        num_nodes_list = np.array([graph.num_nodes for graph in graph_list])
+        num_edges_list = np.array([graph.num_edges for graph in graph_list])
+        node_offsets = np.cumsum(num_nodes_list) - num_nodes_list
+        batch_edge_index = np.hstack([graph.edge_index for graph in graph_list]) \
+            + np.repeat(node_offsets, num_edges_list)
 
         # graph_index indicates which nodes belong to which graph
-        graph_index = []
-        for i, num_nodes in enumerate(num_nodes_list):
-            graph_index.extend([i] * num_nodes)
-        self.graph_index = np.array(graph_index)
+        self.graph_index = np.repeat(np.arange(len(graph_list)), num_nodes_list)
 
         super().__init__(
             node_features=batch_node_features,
@@ -246,3 +243,174 @@ class BatchGraphData(GraphData):
             edge_features=batch_edge_features,
             node_pos_features=batch_node_pos_features,
         )
+
+    @classmethod
+    def from_arrays(cls, node_features: np.ndarray, edge_index: np.ndarray, graph_index: np.ndarray,
+                    edge_features: Optional[np.ndarray] = None,
+                    node_pos_features: Optional[np.ndarray] = None) -> 'BatchGraphData':
+        """Create a batch from already concatenated arrays.
+    Parameters
+    ----------
+    node_features: np.ndarray
+      Concatenated node feature matrix with shape [num_nodes, num_node_features]
+    edge_index: np.ndarray, dtype int
+      Concatenated graph connectivity, numbered over the nodes of the batch
+    graph_index: np.ndarray, dtype int
+      The graph each node belongs to, with shape [num_nodes,]
+    edge_features: np.ndarray, optional (default None)
+      Concatenated edge feature matrix with shape [num_edges, num_edge_features]
+    node_pos_features: np.ndarray, optional (default None)
+      Concatenated node position matrix with shape [num_nodes, num_dimensions]
+    """
+        batch = cls.__new__(cls)
+        batch.graph_index = graph_index
+        GraphData.__init__(batch, node_features=node_features, edge_index=edge_index,
+                           edge_features=edge_features, node_pos_features=node_pos_features)
+        return batch
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of `np.arange(start, start + length)` for every start and length."""
+    total = lengths.sum()
+    shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(total) + shift
+
+
+class PackedGraphData:
+    """Packed GraphData class
+  All the graphs of a dataset stored in a few contiguous arrays. The nodes and
+  the edges of graph `i` are the rows `node_offsets[i]:node_offsets[i + 1]` and
+  `edge_offsets[i]:edge_offsets[i + 1]` of the packed arrays, and `edge_index`
+  numbers the nodes within each graph. Batches are cut from the packed arrays
+  with offset arithmetic instead of stacking per graph arrays.
+  Attributes
+  ----------
+  node_features: np.ndarray
+    Packed node feature matrix with shape [total_num_nodes, num_node_features]
+  edge_index: np.ndarray, dtype int
+    Packed graph connectivity with shape [2, total_num_edges]
+  edge_features: np.ndarray, optional (default None)
+    Packed edge feature matrix with shape [total_num_edges, num_edge_features]
+  node_pos_features: np.ndarray, optional (default None)
+    Packed node position matrix with shape [total_num_nodes, num_dimensions]
+  node_offsets: np.ndarray, dtype int
+    Start of the nodes of every graph, with shape [num_graphs + 1,]
+  edge_offsets: np.ndarray, dtype int
+    Start of the edges of every graph, with shape [num_graphs + 1,]
+  Examples
+  --------
+  >>> import numpy as np
+  >>> node_features_list = np.random.rand(2, 5, 10)
+  >>> edge_index_list = np.array([
+  ...    [[0, 1, 2, 3, 4], [1, 2, 3, 4, 0]],
+  ...    [[0, 1, 2, 3, 4], [1, 2, 3, 4, 0]],
+  ... ], dtype=int)
+  >>> graph_list = [GraphData(node_features, edge_index) for node_features, edge_index
+  ...           in zip(node_features_list, edge_index_list)]
+  >>> packed = PackedGraphData.from_graphs(graph_list)
+  >>> batch = packed.batch([1, 0])
+  """
+
+    def __init__(self, node_features: np.ndarray, edge_index: np.ndarray, node_offsets: np.ndarray,
+                 edge_offsets: np.ndarray, edge_features: Optional[np.ndarray] = None,
+                 node_pos_features: Optional[np.ndarray] = None):
+        self.node_features = node_features
+        self.edge_index = edge_index
+        self.edge_features = edge_features
+        self.node_pos_features = node_pos_features
+        self.node_offsets = node_offsets
+        self.edge_offsets = edge_offsets
+
+    @classmethod
+    def from_graphs(cls, graph_list: Sequence[GraphData], node_dtype=None,
+                    edge_dtype=None) -> 'PackedGraphData':
+        """Pack a list of GraphData.
+    Parameters
+    ----------
+    graph_list: Sequence[GraphData]
+      List of GraphData
+    node_dtype: np.dtype, optional (default None)
+      dtype of the packed node and node position features. If None it is kept.
+    edge_dtype: np.dtype, optional (default None)
+      dtype of the packed edge features. If None it is kept.
+    """
+        num_nodes = np.array([graph.num_nodes for graph in graph_list], dtype=np.int64)
+        num_edges = np.array([graph.num_edges for graph in graph_list], dtype=np.int64)
+        node_offsets = np.concatenate([[0], np.cumsum(num_nodes)])
+        edge_offsets = np.concatenate([[0], np.cumsum(num_edges)])
+
+        def pack(arrays, dtype):
+            # No graphs pack into zero rows, of unknown width
+            packed = np.concatenate(arrays) if len(arrays) else np.zeros((0, 0))
+            return packed if dtype is None else packed.astype(dtype, copy=False)
+
+        node_features = pack([graph.node_features for graph in graph_list], node_dtype)
+        edge_index = np.zeros((2, 0), dtype=np.int64)
+        if len(graph_list):
+            edge_index = np.hstack([graph.edge_index for graph in graph_list]).astype(np.int64, copy=False)
+        edge_features = None
+        if len(graph_list) and graph_list[0].edge_features is not None:
+            edge_features = pack([graph.edge_features for graph in graph_list], edge_dtype)
+        node_pos_features = None
+        if len(graph_list) and graph_list[0].node_pos_features is not None:
+            node_pos_features = pack([graph.node_pos_features for graph in graph_list], node_dtype)
+        return cls(node_features, edge_index, node_offsets, edge_offsets,
+                   edge_features=edge_features, node_pos_features=node_pos_features)
+
+    def __len__(self):
+        return len(self.node_offsets) - 1
+
+    def __getitem__(self, i: int) -> GraphData:
+        nodes = slice(self.node_offsets[i], self.node_offsets[i + 1])
+        edges = slice(self.edge_offsets[i], self.edge_offsets[i + 1])
+        return GraphData(
+            node_features=self.node_features[nodes],
+            edge_index=self.edge_index[:, edges],
+            edge_features=None if self.edge_features is None else self.edge_features[edges],
+            node_pos_features=None if self.node_pos_features is None else self.node_pos_features[nodes])
+
+    def batch_arrays(self, indices: Sequence[int]) -> dict:
+        """Cut the arrays of a batch of graphs.
+    Parameters
+    ----------
+    indices: Sequence[int]
+      The graphs of the batch, in order.
+    Returns
+    -------
+    dict
+      `node_features`, `edge_index` (numbered over the nodes of the batch),
+      `edge_features`, `node_pos_features`, `graph_index` and `node_offsets`
+      (the start of every graph in the batch, with shape [batch_size + 1,]).
+      Consecutive indices are sliced without copying the node and edge features.
+    """
+        indices = np.asarray(indices, dtype=np.int64)
+        num_nodes = self.node_offsets[indices + 1] - self.node_offsets[indices]
+        num_edges = self.edge_offsets[indices + 1] - self.edge_offsets[indices]
+        batch_offsets = np.concatenate([[0], np.cumsum(num_nodes)])
+
+        if len(indices) and np.all(np.diff(indices) == 1):
+            nodes = slice(self.node_offsets[indices[0]], self.node_offsets[indices[-1] + 1])
+            edges = slice(self.edge_offsets[indices[0]], self.edge_offsets[indices[-1] + 1])
+        else:
+            nodes = _ranges(self.node_offsets[indices], num_nodes)
+            edges = _ranges(self.edge_offsets[indices], num_edges)
+
+        edge_index = self.edge_index[:, edges] + np.repeat(batch_offsets[:-1], num_edges)
+        return {
+            'node_features': self.node_features[nodes],
+            'edge_index': edge_index,
+            'edge_features': None if self.edge_features is None else self.edge_features[edges],
+            'node_pos_features': None if self.node_pos_features is None else self.node_pos_features[nodes],
+            'graph_index': np.repeat(np.arange(len(indices)), num_nodes),
+            'node_offsets': batch_offsets,
+        }
+
+    def batch(self, indices: Sequence[int]) -> BatchGraphData:
+        """Return the graphs of `indices` as a BatchGraphData."""
+        arrays = self.batch_arrays(indices)
+        return BatchGraphData.from_arrays(
+            node_features=arrays['node_features'],
+            edge_index=arrays['edge_index'],
+            graph_index=arrays['graph_index'],
+            edge_features=arrays['edge_features'],
+            node_pos_features=arrays['node_pos_features'])
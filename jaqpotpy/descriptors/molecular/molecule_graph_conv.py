@@ -30,6 +30,8 @@ from jaqpotpy.utils.molecule_feature_utils import get_atom_explicit_valence_one_
 from jaqpotpy.utils.molecule_feature_utils import get_atom_is_chiral_center
 from jaqpotpy.utils.rdkit_utils import compute_all_pairs_shortest_path
 from jaqpotpy.utils.rdkit_utils import compute_pairwise_ring_info
+from jaqpotpy.utils.molecule_feature_utils import DEFAULT_ATOM_TYPE_SET, DEFAULT_HYBRIDIZATION_SET\
+  , DEFAULT_TOTAL_DEGREE_SET, DEFAULT_TOTAL_NUM_Hs_SET, DEFAULT_BOND_TYPE_SET, DEFAULT_BOND_STEREO_SET
 
 
 def _construct_atom_feature(
@@ -94,6 +96,154 @@ def _construct_bond_feature(bond: RDKitBond) -> np.ndarray:
     return np.concatenate([bond_type, same_ring, conjugated, stereo])
 
 
+# Column layout of the default atom and bond features, kept identical to
+# `_construct_atom_feature` and `_construct_bond_feature`.
+_ATOM_TYPE_CODES = {symbol: i for i, symbol in enumerate(DEFAULT_ATOM_TYPE_SET)}
+_HYBRIDIZATION_CODES = {name: i for i, name in enumerate(DEFAULT_HYBRIDIZATION_SET)}
+_BOND_TYPE_CODES = {name: i for i, name in enumerate(DEFAULT_BOND_TYPE_SET)}
+_BOND_STEREO_CODES = {name: i for i, name in enumerate(DEFAULT_BOND_STEREO_SET)}
+_DEGREE_CODES = {degree: i for i, degree in enumerate(DEFAULT_TOTAL_DEGREE_SET)}
+_NUM_HS_CODES = {num_hs: i for i, num_hs in enumerate(DEFAULT_TOTAL_NUM_Hs_SET)}
+_CHIRALITY_CODES = {'R': 0, 'S': 1}
+_DONOR_ACCEPTOR_CODES = {'Donor': 0, 'Acceptor': 1}
+
+_ATOM_TYPE_OFFSET = 0
+_FORMAL_CHARGE_OFFSET = _ATOM_TYPE_OFFSET + len(DEFAULT_ATOM_TYPE_SET) + 1
+_HYBRIDIZATION_OFFSET = _FORMAL_CHARGE_OFFSET + 1
+_DONOR_ACCEPTOR_OFFSET = _HYBRIDIZATION_OFFSET + len(DEFAULT_HYBRIDIZATION_SET)
+_AROMATIC_OFFSET = _DONOR_ACCEPTOR_OFFSET + 2
+_DEGREE_OFFSET = _AROMATIC_OFFSET + 1
+_NUM_HS_OFFSET = _DEGREE_OFFSET + len(DEFAULT_TOTAL_DEGREE_SET) + 1
+_NUM_ATOM_FEATURES = _NUM_HS_OFFSET + len(DEFAULT_TOTAL_NUM_Hs_SET) + 1
+
+_BOND_TYPE_OFFSET = 0
+_RING_OFFSET = _BOND_TYPE_OFFSET + len(DEFAULT_BOND_TYPE_SET)
+_CONJUGATED_OFFSET = _RING_OFFSET + 1
+_STEREO_OFFSET = _CONJUGATED_OFFSET + 1
+_NUM_BOND_FEATURES = _STEREO_OFFSET + len(DEFAULT_BOND_STEREO_SET) + 1
+
+
+def _one_hot_codes(values, codes: dict, unknown: int = -1) -> np.ndarray:
+    """Map values to their index in an allowable set, `unknown` for the rest."""
+    return np.fromiter((codes.get(v, unknown) for v in values), dtype=np.int64)
+
+
+def _construct_atom_features(
+        mol: RDKitMol, h_bond_infos: List[Tuple[int, str]], use_chirality: bool,
+        use_partial_charge: bool) -> np.ndarray:
+    """Construct the atom features of all atoms of a RDKit mol object at once.
+  The atom properties are read into small integer code arrays in a single pass
+  over the atoms, and the one-hot columns are written with one fancy indexing
+  assignment into a preallocated matrix. The result is identical to stacking
+  `_construct_atom_feature` for every atom.
+  Parameters
+  ----------
+  mol: rdkit.Chem.rdchem.Mol
+    RDKit mol object
+  h_bond_infos: List[Tuple[int, str]]
+    The return value of `construct_hydrogen_bonding_info`.
+  use_chirality: bool
+    Whether to use chirality information or not.
+  use_partial_charge: bool
+    Whether to use partial charge data or not.
+  Returns
+  -------
+  np.ndarray
+    A (num_atoms, num_atom_features) matrix of atom features, with no rows for a
+    molecule without atoms.
+  """
+    atoms = list(mol.GetAtoms())
+    n_atoms = len(atoms)
+    n_features = _NUM_ATOM_FEATURES + 2 * use_chirality + use_partial_charge
+    if n_atoms == 0:
+        return np.zeros((0, n_features), dtype=float)
+    props = [(a.GetSymbol(), str(a.GetHybridization()), a.GetFormalCharge(),
+              a.GetIsAromatic(), a.GetTotalDegree(), a.GetTotalNumHs())
+             for a in atoms]
+    symbols, hybridizations, charges, aromatic, degrees, num_hs = zip(*props)
+
+    columns = [
+        _ATOM_TYPE_OFFSET + _one_hot_codes(
+            symbols, _ATOM_TYPE_CODES, len(DEFAULT_ATOM_TYPE_SET)),
+        _HYBRIDIZATION_OFFSET + _one_hot_codes(hybridizations, _HYBRIDIZATION_CODES),
+        _DEGREE_OFFSET + _one_hot_codes(
+            degrees, _DEGREE_CODES, len(DEFAULT_TOTAL_DEGREE_SET)),
+        _NUM_HS_OFFSET + _one_hot_codes(
+            num_hs, _NUM_HS_CODES, len(DEFAULT_TOTAL_NUM_Hs_SET)),
+    ]
+    # codes of values outside a set without an unknown column end up below their offset
+    offsets = [_ATOM_TYPE_OFFSET, _HYBRIDIZATION_OFFSET, _DEGREE_OFFSET, _NUM_HS_OFFSET]
+    rows = np.tile(np.arange(n_atoms), len(columns))
+    cols = np.concatenate(columns)
+    valid = cols >= np.repeat(offsets, n_atoms)
+
+    if use_chirality:
+        chirality = _one_hot_codes(
+            (a.GetProp('_CIPCode') if a.HasProp('_CIPCode') else None for a in atoms),
+            _CHIRALITY_CODES)
+        rows = np.concatenate([rows, np.arange(n_atoms)])
+        cols = np.concatenate([cols, _NUM_ATOM_FEATURES + chirality])
+        valid = np.concatenate([valid, chirality >= 0])
+
+    h_bonds = [(i, _DONOR_ACCEPTOR_CODES[family]) for i, family in h_bond_infos
+               if family in _DONOR_ACCEPTOR_CODES]
+    if h_bonds:
+        h_bonds = np.asarray(h_bonds, dtype=np.int64)
+        rows = np.concatenate([rows, h_bonds[:, 0]])
+        cols = np.concatenate([cols, _DONOR_ACCEPTOR_OFFSET + h_bonds[:, 1]])
+        valid = np.concatenate([valid, np.ones(len(h_bonds), dtype=bool)])
+
+    atom_features = np.zeros((n_atoms, n_features), dtype=float)
+    atom_features[rows[valid], cols[valid]] = 1.0
+    atom_features[:, _FORMAL_CHARGE_OFFSET] = charges
+    atom_features[:, _AROMATIC_OFFSET] = aromatic
+    if use_partial_charge:
+        atom_features[:, -1] = [get_atom_partial_charge(a)[0] for a in atoms]
+    return atom_features
+
+
+def _construct_bond_features(mol: RDKitMol) -> np.ndarray:
+    """Construct the bond features of all bonds of a RDKit mol object at once.
+  Every bond appears twice, once per direction, as in the edge index of the
+  molecule graph. The result is identical to stacking `_construct_bond_feature`.
+  Parameters
+  ----------
+  mol: rdkit.Chem.rdchem.Mol
+    RDKit mol object
+  Returns
+  -------
+  np.ndarray
+    A (2 * num_bonds, num_bond_features) matrix of bond features, with no rows for a
+    molecule without bonds.
+  """
+    bonds = list(mol.GetBonds())
+    n_bonds = len(bonds)
+    if n_bonds == 0:
+        return np.zeros((0, _NUM_BOND_FEATURES), dtype=float)
+    props = [(str(b.GetBondType()), b.IsInRing(), b.GetIsConjugated(), str(b.GetStereo()))
+             for b in bonds]
+    bond_types, in_ring, conjugated, stereo = zip(*props)
+
+    bond_type = _one_hot_codes(bond_types, _BOND_TYPE_CODES)
+    stereo = _one_hot_codes(stereo, _BOND_STEREO_CODES, len(DEFAULT_BOND_STEREO_SET))
+    rows = np.tile(np.arange(n_bonds), 2)
+    cols = np.concatenate([_BOND_TYPE_OFFSET + bond_type, _STEREO_OFFSET + stereo])
+    valid = np.concatenate([bond_type >= 0, np.ones(n_bonds, dtype=bool)])
+
+    bond_features = np.zeros((n_bonds, _NUM_BOND_FEATURES), dtype=float)
+    bond_features[rows[valid], cols[valid]] = 1.0
+    bond_features[:, _RING_OFFSET] = in_ring
+    bond_features[:, _CONJUGATED_OFFSET] = conjugated
+    return np.repeat(bond_features, 2, axis=0)
+
+
+def _construct_edge_index(mol: RDKitMol) -> np.ndarray:
+    """Construct the edge index of a RDKit mol object, each bond as two directed edges."""
+    ends = np.asarray([(b.GetBeginAtomIdx(), b.GetEndAtomIdx()) for b in mol.GetBonds()]
+                      , dtype=int).reshape(-1, 2)
+    return np.stack([ends.ravel(), ends[:, ::-1].ravel()])
+
+
 class MolGraphConvFeaturizer(MolecularFeaturizer):
     """This class is a featurizer of general graph convolution networks for molecules.
       The default node(atom) and edge(bond) representations are based on
@@ -200,34 +350,20 @@ class MolGraphConvFeaturizer(MolecularFeaturizer):
 
         # construct atom (node) feature
         h_bond_infos = construct_hydrogen_bonding_info(datapoint)
-        atom_features = np.asarray(
-            [
-                _construct_atom_feature(atom, h_bond_infos, self.use_chirality,
-                                        self.use_partial_charge)
-                for atom in datapoint.GetAtoms()
-            ],
-            dtype=float,
-        )
+        atom_features = _construct_atom_features(
+            datapoint, h_bond_infos, self.use_chirality, self.use_partial_charge)
 
-        # construct edge (bond) index
-        src, dest = [], []
-        for bond in datapoint.GetBonds():
-            # add edge list considering a directed graph
-            start, end = bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()
-            src += [start, end]
-            dest += [end, start]
+        # construct edge (bond) index, considering a directed graph
+        edge_index = _construct_edge_index(datapoint)
 
         # construct edge (bond) feature
         bond_features = None  # deafult None
         if self.use_edges:
-            features = []
-            for bond in datapoint.GetBonds():
-                features += 2 * [_construct_bond_feature(bond)]
-            bond_features = np.asarray(features, dtype=float)
+            bond_features = _construct_bond_features(datapoint)
 
         return GraphData(
             node_features=atom_features,
-            edge_index=np.asarray([src, dest], dtype=int),
+            edge_index=edge_index,
             edge_features=bond_features)
 
     def _get_column_names(self, **kwargs) -> list:
@@ -269,34 +405,20 @@ class MolGraphConvFeaturizer(MolecularFeaturizer):
 
         # construct atom (node) feature
         h_bond_infos = construct_hydrogen_bonding_info(datapoint)
-        atom_features = np.asarray(
-            [
-                _construct_atom_feature(atom, h_bond_infos, self.use_chirality,
-                                        self.use_partial_charge)
-                for atom in datapoint.GetAtoms()
-            ],
-            dtype=float,
-        )
+        atom_features = _construct_atom_features(
+            datapoint, h_bond_infos, self.use_chirality, self.use_partial_charge)
 
-        # construct edge (bond) index
-        src, dest = [], []
-        for bond in datapoint.GetBonds():
-            # add edge list considering a directed graph
-            start, end = bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()
-            src += [start, end]
-            dest += [end, start]
+        # construct edge (bond) index, considering a directed graph
+        edge_index = _construct_edge_index(datapoint)
 
         # construct edge (bond) feature
         bond_features = None  # deafult None
         if self.use_edges:
-            features = []
-            for bond in datapoint.GetBonds():
-                features += 2 * [_construct_bond_feature(bond)]
-            bond_features = np.asarray(features, dtype=float)
+            bond_features = _construct_bond_features(datapoint)
 
         return GraphData(
             node_features=atom_features,
-            edge_index=np.asarray([src, dest], dtype=int),
+            edge_index=edge_index,
             edge_features=bond_features)
 
 
@@ -653,35 +775,21 @@ class TorchMolGraphConvFeaturizer(MolecularFeaturizer):
 
         # construct atom (node) feature
         h_bond_infos = construct_hydrogen_bonding_info(datapoint)
-        atom_features = np.asarray(
-            [
-                _construct_atom_feature(atom, h_bond_infos, self.use_chirality,
-                                        self.use_partial_charge)
-                for atom in datapoint.GetAtoms()
-            ],
-            dtype=float,
-        )
+        atom_features = _construct_atom_features(
+            datapoint, h_bond_infos, self.use_chirality, self.use_partial_charge)
 
-        # construct edge (bond) index
-        src, dest = [], []
-        for bond in datapoint.GetBonds():
-            # add edge list considering a directed graph
-            start, end = bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()
-            src += [start, end]
-            dest += [end, start]
+        # construct edge (bond) index, considering a directed graph
+        edge_index = _construct_edge_index(datapoint)
 
         # construct edge (bond) feature
         bond_features = None  # deafult None
         if self.use_edges:
-            features = []
-            for bond in datapoint.GetBonds():
-                features += 2 * [_construct_bond_feature(bond)]
-            bond_features = np.asarray(features, dtype=float)
+            bond_features = _construct_bond_features(datapoint)
         import torch
         from torch_geometric.data import Data
         return Data(
             node_features=torch.FloatTensor(atom_features),
-            edge_index=torch.LongTensor(np.asarray([src, dest], dtype=int)),
+            edge_index=torch.LongTensor(edge_index),
             edge_features=bond_features)
 
     def _get_column_names(self, **kwargs) -> list:
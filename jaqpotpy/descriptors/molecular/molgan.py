@@ -1,4 +1,5 @@
 import logging
+from itertools import chain
 import numpy as np
 from jaqpotpy.utils.types import RDKitBond, RDKitMol, List, OneOrMany
 from jaqpotpy.descriptors.base_classes import MolecularFeaturizer
@@ -180,37 +181,12 @@ class MolGanFeaturizer(MolecularFeaturizer):
           'Mol is being phased out as a parameter, please pass "datapoint" instead.'
       )
 
-    if self.kekulize:
-      Chem.Kekulize(datapoint)
-
-    adjacency = np.zeros((self.BOND_DIM, self.max_atom_count, self.max_atom_count), "float32")
-    features = np.zeros((self.max_atom_count, self.MAX_ATOMS), "float32")
-
-    # loop over each atom in molecule
-    for atom in datapoint.GetAtoms():
-        i = atom.GetIdx()
-        atom_type = self.atom_encoder[atom.GetAtomicNum()]
-        features[i] = np.eye(self.MAX_ATOMS)[atom_type]
-        # loop over one-hop neighbors
-        for neighbor in atom.GetNeighbors():
-            j = neighbor.GetIdx()
-            bond = datapoint.GetBondBetweenAtoms(i, j)
-            bond_type_idx = self.bond_mapping[bond.GetBondType().name]
-            adjacency[bond_type_idx, [i, j], [j, i]] = 1
-
-    # Where no bond, add 1 to last channel (indicating "non-bond")
-    # Notice: channels-first
-    adjacency[-1, np.sum(adjacency, axis=0) == 0] = 1
-
-    # Where no atom, add 1 to last column (indicating "non-atom")
-    features[np.where(np.sum(features, axis=1) == 0)[0], -1] = 1
-
-    degree = np.sum(
-        adjacency[:datapoint.GetNumAtoms(), :datapoint.GetNumAtoms()], axis=-1)
-
+    atom_types, bonds = self._graph_indices(datapoint)
+    adjacency = np.zeros((1, self.BOND_DIM, self.max_atom_count, self.max_atom_count), "float32")
+    features = np.zeros((1, self.max_atom_count, self.MAX_ATOMS), "float32")
+    self._fill_graphs(adjacency, features, [atom_types], [bonds])
 
-    graph = GraphMatrix(adjacency, features)
-    # features[np.where(np.sum(X, axis=1) == 0)[0], -1] = 1
+    graph = GraphMatrix(adjacency[0], features[0])
     return graph
     # return graph if (degree > 0).all() else None
 
@@ -245,6 +221,171 @@ class MolGanFeaturizer(MolecularFeaturizer):
     # # return graph
     # return graph if (degree > 0).all() else None
 
+  def _graph_indices(self, datapoint: RDKitMol):
+    """
+    The atom type index of every atom of a molecule, and the (begin atom, end atom, bond
+    type index) of every bond, each bond once.
+    """
+    from rdkit import Chem
+
+    if self.kekulize:
+      Chem.Kekulize(datapoint)
+    if datapoint.GetNumAtoms() > self.max_atom_count:
+      raise ValueError("The molecule has more than %d atoms" % self.max_atom_count)
+    atom_types = [self.atom_encoder[atom.GetAtomicNum()] for atom in datapoint.GetAtoms()]
+    bonds = [(bond.GetBeginAtomIdx(), bond.GetEndAtomIdx(), self.bond_mapping[bond.GetBondType().name])
+             for bond in datapoint.GetBonds()]
+    return atom_types, bonds
+
+  def _fill_graphs(self, adjacency: np.ndarray, features: np.ndarray, atom_types: list, bonds: list):
+    """
+    Fills zeroed [batch, BOND_DIM, N, N] adjacency and [batch, N, MAX_ATOMS] feature arrays
+    from the `_graph_indices` of each molecule, with one fancy indexed write per array.
+    """
+    atom_counts = np.array([len(types) for types in atom_types], dtype=np.int64)
+    rows = np.repeat(np.arange(len(atom_types)), atom_counts)
+    atoms = np.arange(len(rows)) - np.repeat(np.cumsum(atom_counts) - atom_counts, atom_counts)
+    types = np.fromiter(chain.from_iterable(atom_types), dtype=np.int64, count=len(rows))
+    features[rows, atoms, types] = 1
+
+    bond_counts = np.array([len(mol_bonds) for mol_bonds in bonds], dtype=np.int64)
+    rows = np.repeat(np.arange(len(bonds)), bond_counts)
+    begin, end, types = np.fromiter(chain.from_iterable(chain.from_iterable(bonds)), dtype=np.int64,
+                                    count=3 * len(rows)).reshape(-1, 3).T
+    adjacency[rows, types, begin, end] = 1
+    adjacency[rows, types, end, begin] = 1
+
+    # Where no bond, add 1 to last channel (indicating "non-bond")
+    adjacency[:, -1][np.sum(adjacency, axis=1) == 0] = 1
+    # Where no atom, add 1 to last column (indicating "non-atom")
+    features[:, :, -1][np.sum(features, axis=2) == 0] = 1
+
+  def featurize_batch(self, datapoints, log_every_n: int = 1000):
+    """
+    Featurizes molecules into batch arrays instead of a GraphMatrix per molecule.
+    Molecules that cannot be featurized get the graph of no atoms and are marked
+    as invalid, drop them with `adjacency[valid], features[valid]`.
+
+    Parameters
+    ----------
+    datapoints: rdkit.Chem.rdchem.Mol / SMILES string / iterable
+      RDKit Mol, or SMILES string or iterable sequence of RDKit mols/SMILES strings.
+    log_every_n: int, default 1000
+      Logging messages reported every `log_every_n` samples.
+
+    Returns
+    -------
+    adjacency: np.ndarray
+      The [batch, BOND_DIM, max_atom_count, max_atom_count] adjacency tensor.
+    features: np.ndarray
+      The [batch, max_atom_count, MAX_ATOMS] node features.
+    valid: np.ndarray
+      The [batch] mask of the molecules that were featurized.
+    """
+    from rdkit import Chem
+    from rdkit.Chem import rdmolfiles, rdmolops
+
+    datapoints = self._prepare_datapoints(datapoints)
+    atom_types, bonds = [], []
+    valid = np.ones(len(datapoints), dtype=bool)
+    for i, mol in enumerate(datapoints):
+      if i % log_every_n == 0:
+        logger.info("Featurizing datapoint %i" % i)
+      try:
+        if isinstance(mol, str):
+          # SMILES is unique, so set a canonical order of atoms, as `featurize` does
+          mol = Chem.MolFromSmiles(mol)
+          mol = rdmolops.RenumberAtoms(mol, rdmolfiles.CanonicalRankAtoms(mol))
+        mol_types, mol_bonds = self._graph_indices(mol)
+      except Exception as e:
+        if config.verbose is True:
+          logger.warning("Failed to featurize datapoint %d. Appending the graph of no atoms", i)
+          logger.warning("Exception message: {}".format(e))
+        mol_types, mol_bonds = [], []
+        valid[i] = False
+      atom_types.append(mol_types)
+      bonds.append(mol_bonds)
+
+    adjacency = np.zeros((len(datapoints), self.BOND_DIM, self.max_atom_count, self.max_atom_count), "float32")
+    features = np.zeros((len(datapoints), self.max_atom_count, self.MAX_ATOMS), "float32")
+    self._fill_graphs(adjacency, features, atom_types, bonds)
+    return adjacency, features, valid
+
+  def defeaturize_batch(self, adjacency: np.ndarray, features: np.ndarray,
+                        sanitize: bool = True, cleanup: bool = True) -> List[Optional[RDKitMol]]:
+    """
+    Recreates RDKitMols from batch arrays, like `_defeaturize` does for a GraphMatrix.
+    The atoms kept and the bonds between them are found for the whole batch at once.
+
+    Parameters
+    ----------
+    adjacency: np.ndarray
+      [batch, BOND_DIM, max_atom_count, max_atom_count] adjacency tensor.
+    features: np.ndarray
+      [batch, max_atom_count, MAX_ATOMS] node features.
+    sanitize: bool, default True
+      Should RDKit sanitization be included in the process.
+    cleanup: bool, default True
+      Splits salts and removes compounds with "*" atom types
+
+    Returns
+    -------
+    mols: List[RDKitMol]
+      The molecules, None for the ones that cannot be recreated.
+    """
+    from rdkit import Chem
+
+    adjacency = np.asarray(adjacency)
+    features = np.asarray(features)
+    n_atoms = features.shape[1]
+
+    # Remove "no atoms" & atoms with no bonds
+    node_types = np.argmax(features, axis=2)
+    keep = (node_types != len(self.atom_labels) - 1) & (np.sum(adjacency[:, :-1], axis=(1, 2)) != 0)
+    new_index = np.cumsum(keep, axis=1) - 1
+
+    # Bonds of the upper triangles, between kept atoms, in the order `_defeaturize` adds them
+    upper = np.triu(np.ones((n_atoms, n_atoms), dtype=bool), k=1)
+    bonded = (adjacency[:, :-1] == 1) & upper & keep[:, None, :, None] & keep[:, None, None, :]
+    mol_idx, bond_types, atoms_i, atoms_j = np.nonzero(bonded)
+    bounds = np.searchsorted(mol_idx, np.arange(len(features) + 1))
+
+    mols = []
+    for b in range(len(features)):
+      try:
+        mol = Chem.RWMol()
+        for atom_type_idx in node_types[b][keep[b]]:
+          mol.AddAtom(Chem.Atom(self.atom_decoder[atom_type_idx]))
+        for k in range(bounds[b], bounds[b + 1]):
+          mol.AddBond(int(new_index[b, atoms_i[k]]), int(new_index[b, atoms_j[k]]),
+                      self.bond_mapping[int(bond_types[k])])
+        mols.append(self._finish_molecule(mol, sanitize, cleanup))
+      except Exception:
+        mols.append(None)
+    return mols
+
+  def _finish_molecule(self, mol, sanitize: bool, cleanup: bool):
+    from rdkit import Chem
+
+    if sanitize:
+      try:
+        Chem.SanitizeMol(mol)
+      except Exception:
+        mol = None
+
+    if cleanup:
+      try:
+        smiles = Chem.MolToSmiles(mol)
+        smiles = max(smiles.split("."), key=len)
+        if "*" not in smiles:
+          mol = Chem.MolFromSmiles(smiles)
+        else:
+          mol = None
+      except Exception:
+        mol = None
+
+    return mol
+
   def _defeaturize(self,
                    graph_matrix: GraphMatrix,
                    sanitize: bool = True,
@@ -330,25 +471,7 @@ class MolGanFeaturizer(MolecularFeaturizer):
     #   if start > end:
     #     mol.AddBond(int(start), int(end), self.bond_decoder[edge_labels[start, end]])
 
-    if sanitize:
-      try:
-        Chem.SanitizeMol(mol)
-      except Exception:
-        mol = None
-
-
-    if cleanup:
-      try:
-        smiles = Chem.MolToSmiles(mol)
-        smiles = max(smiles.split("."), key=len)
-        if "*" not in smiles:
-          mol = Chem.MolFromSmiles(smiles)
-        else:
-          mol = None
-      except Exception:
-        mol = None
-
-    return mol
+    return self._finish_molecule(mol, sanitize, cleanup)
 
   def defeaturize(self, graphs: OneOrMany[GraphMatrix],
                   log_every_n: int = 1000) -> np.ndarray:
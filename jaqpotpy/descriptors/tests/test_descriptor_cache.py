@@ -0,0 +1,101 @@
+"""
+Test the descriptor cache.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from jaqpotpy.descriptors import DescriptorCache
+from jaqpotpy.descriptors.molecular import RDKitDescriptors, TopologicalFingerprint, MolGanFeaturizer
+
+
+class TestDescriptorCache(unittest.TestCase):
+  """
+  Test DescriptorCache.
+  """
+
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, 'descriptors.db')
+    self.smiles = ['CC(=O)OC1=CC=CC=C1C(=O)O', 'CCO', 'OCC', 'c1ccccc1O']
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def test_cached_features_match(self):
+    featurizer = RDKitDescriptors()
+    featurizer.cache = DescriptorCache(self.path)
+    first = featurizer.featurize_dataframe(self.smiles)
+    # CCO and OCC share the canonical SMILES
+    assert featurizer.cache.misses == 3
+    second = featurizer.featurize_dataframe(self.smiles)
+    assert featurizer.cache.hits == 3
+    assert np.allclose(first.values, second.values)
+    assert np.allclose(first.values, RDKitDescriptors().featurize_dataframe(self.smiles).values)
+
+  def test_disk_tier(self):
+    featurizer = TopologicalFingerprint()
+    featurizer.cache = DescriptorCache(self.path)
+    first = featurizer.featurize(self.smiles)
+    featurizer.cache.close()
+    featurizer = TopologicalFingerprint()
+    featurizer.cache = DescriptorCache(self.path)
+    second = featurizer.featurize(self.smiles)
+    assert featurizer.cache.disk_hits == 3
+    assert featurizer.cache.misses == 0
+    assert np.array_equal(first, second)
+
+  def test_signature(self):
+    cache = DescriptorCache()
+    featurizer = RDKitDescriptors(use_fragment=False)
+    featurizer.cache = cache
+    featurizer.featurize(self.smiles)
+    featurizer = RDKitDescriptors()
+    featurizer.cache = cache
+    features = featurizer.featurize(self.smiles)
+    assert cache.misses == 6
+    assert features.shape[1] == len(RDKitDescriptors()._get_column_names())
+
+  def test_signature_lists(self):
+    # __str__ leaves out list arguments, the cache signature must not
+    small = MolGanFeaturizer(atom_labels=[0, 6])
+    large = MolGanFeaturizer(atom_labels=[0, 6, 7, 8])
+    assert str(small) == str(large)
+    assert small._signature() != large._signature()
+    cache = DescriptorCache()
+    small.cache = cache
+    large.cache = cache
+    small.featurize(['CCC'])
+    features = large.featurize(['CCC', 'CCO'])
+    assert cache.misses == 3
+    assert features[1].node_features.shape[1] == 4
+    assert MolGanFeaturizer(atom_labels=[0, 6])._signature() == small._signature()
+
+  def test_mols_not_cached(self):
+    from rdkit import Chem
+    featurizer = MolGanFeaturizer()
+    featurizer.cache = DescriptorCache()
+    featurizer.featurize(['CCO'])
+    # The oxygen comes first, unlike in the canonical atom order of the cached SMILES
+    mol = Chem.MolFromSmiles('OCC')
+    features = featurizer.featurize([mol])
+    assert np.array_equal(features[0].node_features, MolGanFeaturizer().featurize([mol])[0].node_features)
+    assert not np.array_equal(features[0].node_features, featurizer.featurize(['OCC'])[0].node_features)
+    assert len(featurizer.cache) == 1
+
+  def test_failed_not_cached(self):
+    featurizer = RDKitDescriptors()
+    featurizer.cache = DescriptorCache()
+    df = featurizer.featurize_dataframe(['CCO', 'not_a_smiles'])
+    assert df.shape[0] == 2
+    assert len(featurizer.cache) == 1
+
+  def test_eviction(self):
+    cache = DescriptorCache(self.path, max_memory_items=2, max_disk_bytes=1)
+    featurizer = TopologicalFingerprint()
+    featurizer.cache = cache
+    featurizer.featurize(self.smiles)
+    assert len(cache._memory) == 2
+    assert len(cache) == 0
@@ -1,7 +1,7 @@
 import unittest
 # import pytest
 import numpy as np
-from jaqpotpy.descriptors.graph.graph_data import GraphData, BatchGraphData
+from jaqpotpy.descriptors.graph.graph_data import GraphData, BatchGraphData, PackedGraphData
 
 
 class TestGraph(unittest.TestCase):
@@ -103,4 +103,36 @@ class TestGraph(unittest.TestCase):
     assert batch.num_node_features == num_node_features
     assert batch.num_edges == sum(num_edge_list)
     assert batch.num_edge_features == num_edge_features
-    assert batch.graph_index.shape == (sum(num_nodes_list),)
\ No newline at end of file
+    assert batch.graph_index.shape == (sum(num_nodes_list),)
+
+  def test_packed_graph_data(self):
+    num_nodes_list, num_edge_list = [3, 4, 5], [2, 4, 5]
+    edge_index_list = [
+        np.array([[0, 1], [1, 2]]),
+        np.array([[0, 1, 2, 3], [1, 2, 0, 2]]),
+        np.array([[0, 1, 2, 3, 4], [1, 2, 3, 4, 0]]),
+    ]
+    graph_list = [
+        GraphData(
+            node_features=np.random.random_sample((num_nodes_list[i], 8)),
+            edge_index=edge_index_list[i],
+            edge_features=np.random.random_sample((num_edge_list[i], 4)))
+        for i in range(len(num_edge_list))
+    ]
+    packed = PackedGraphData.from_graphs(graph_list)
+    assert len(packed) == 3
+    assert np.array_equal(packed[1].node_features, graph_list[1].node_features)
+    assert np.array_equal(packed[1].edge_index, graph_list[1].edge_index)
+
+    for indices in [[0, 1, 2], [1, 2], [2, 0]]:
+      expected = BatchGraphData([graph_list[i] for i in indices])
+      batch = packed.batch(indices)
+      assert np.array_equal(batch.node_features, expected.node_features)
+      assert np.array_equal(batch.edge_index, expected.edge_index)
+      assert np.array_equal(batch.edge_features, expected.edge_features)
+      assert np.array_equal(batch.graph_index, expected.graph_index)
+
+    empty = PackedGraphData.from_graphs([], node_dtype=np.float32)
+    assert len(empty) == 0
+    assert empty.node_features.shape == (0, 0) and empty.node_features.dtype == np.float32
+    assert empty.edge_index.shape == (2, 0) and empty.edge_features is None
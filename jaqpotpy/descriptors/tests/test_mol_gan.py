@@ -43,3 +43,27 @@ class TestMolGan(unittest.TestCase):
 
         featurizer = MolGanFeaturizer(max_atom_count=20)
         valid_data = featurizer.featurize_dataframe(smiles)
+
+    def test_mol_gan_batch(self):
+        smiles = [
+            'Cc1ccccc1CO', 'CCC(N)=O', 'axa', 'Fc1cccc(F)c1', 'CC(C)F',
+            'C1COC2NCCC2C1', 'C1=NCc2ccccc21'
+        ]
+
+        featurizer = MolGanFeaturizer(max_atom_count=20)
+        adjacency, features, valid = featurizer.featurize_batch(smiles)
+        assert list(valid) == [smile != 'axa' for smile in smiles]
+        assert adjacency.shape == (7, featurizer.BOND_DIM, 20, 20)
+        assert features.shape == (7, 20, featurizer.MAX_ATOMS)
+        for i, smile in enumerate(smiles):
+            if not valid[i]:
+                # Failed molecules get the graph of no atoms
+                assert features[i, :, -1].all() and adjacency[i, -1].all()
+                continue
+            graph = featurizer.featurize(smile)[0]
+            assert np.array_equal(graph.adjacency_matrix, adjacency[i])
+            assert np.array_equal(graph.node_features, features[i])
+
+        mols = featurizer.defeaturize_batch(adjacency, features)
+        assert mols[2].GetNumAtoms() == 0
+        assert [Chem.MolToSmiles(m) for m in mols] == [s if s != 'axa' else '' for s in smiles]
@@ -83,6 +83,42 @@ class TestMolGraphConvFeaturizer(unittest.TestCase):
       mol = Chem.MolFromSmiles(smil)
       data = featurizer.featurize(smil)
 
+  def test_vectorized_features_match_per_atom_features(self):
+    from rdkit.Chem import AllChem
+    from jaqpotpy.descriptors.molecular.molecule_graph_conv import _construct_atom_feature\
+      , _construct_atom_features, _construct_bond_feature, _construct_bond_features
+    from jaqpotpy.utils.molecule_feature_utils import construct_hydrogen_bonding_info
+    smiles = ["O=C(NCc1cc(OC)c(O)cc1)CCCC/C=C/C(C)C", "C[C@H](N)C(=O)O"
+              , "[O-][N+](=O)c1ccccc1", "[Na+].[Cl-]", "B(O)(O)c1ccccc1", "C[C@@H]1CC[C@H](Br)CC1I"]
+    for smil in smiles:
+      mol = Chem.MolFromSmiles(smil)
+      Chem.AssignStereochemistry(mol, cleanIt=True, force=True)
+      AllChem.ComputeGasteigerCharges(mol)
+      h_bond_infos = construct_hydrogen_bonding_info(mol)
+      for use_chirality in [False, True]:
+        for use_partial_charge in [False, True]:
+          expected = np.asarray([_construct_atom_feature(atom, h_bond_infos, use_chirality, use_partial_charge)
+                                 for atom in mol.GetAtoms()], dtype=float)
+          np.testing.assert_array_equal(
+            _construct_atom_features(mol, h_bond_infos, use_chirality, use_partial_charge), expected)
+      expected = np.asarray([f for bond in mol.GetBonds() for f in 2 * [_construct_bond_feature(bond)]]
+                            , dtype=float).reshape(2 * mol.GetNumBonds(), 11)
+      np.testing.assert_array_equal(_construct_bond_features(mol), expected)
+
+  def test_features_without_atoms_or_bonds(self):
+    from jaqpotpy.descriptors.molecular.molecule_graph_conv import _construct_atom_feature\
+      , _construct_atom_features, _construct_bond_features
+    from jaqpotpy.utils.molecule_feature_utils import construct_hydrogen_bonding_info
+    for smil, n_atoms in [("", 0), ("C", 1), ("[Na+]", 1)]:
+      mol = Chem.MolFromSmiles(smil)
+      h_bond_infos = construct_hydrogen_bonding_info(mol)
+      for use_chirality in [False, True]:
+        atom_features = _construct_atom_features(mol, h_bond_infos, use_chirality, False)
+        assert atom_features.shape == (n_atoms, 30 + 2 * use_chirality)
+        expected = [_construct_atom_feature(atom, h_bond_infos, use_chirality, False) for atom in mol.GetAtoms()]
+        np.testing.assert_array_equal(atom_features, np.asarray(expected, dtype=float).reshape(atom_features.shape))
+      assert _construct_bond_features(mol).shape == (0, 11)
+
 
 class TestPagtnMolGraphConvFeaturizer(unittest.TestCase):
 
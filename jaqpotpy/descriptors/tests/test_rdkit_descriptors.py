@@ -1,6 +1,8 @@
 """
 Test basic molecular features.
 """
+import os
+import tempfile
 import numpy as np
 import unittest
 
@@ -20,6 +22,14 @@ class TestRDKitDescriptors(unittest.TestCase):
     smiles = 'CC(=O)OC1=CC=CC=C1C(=O)O'
     self.mol = Chem.MolFromSmiles(smiles)
     self.featurizer = RDKitDescriptors()
+    # pick() writes test.picl into the working directory
+    self.cwd = os.getcwd()
+    self.tmp = tempfile.TemporaryDirectory()
+    os.chdir(self.tmp.name)
+
+  def tearDown(self):
+    os.chdir(self.cwd)
+    self.tmp.cleanup()
 
   def test_rdkit_descriptors(self):
     """
@@ -87,3 +97,30 @@ class TestRDKitDescriptors(unittest.TestCase):
   def test_rdkiy_pickl(self):
       featurizer = RDKitDescriptors(use_fragment=False)
       featurizer.pick()
+      assert RDKitDescriptors.unpick("test.picl")._signature() == featurizer._signature()
+
+  def test_rdkit_descriptors_parallel(self):
+    """
+    Test that the process pool returns the same features as the serial path.
+    """
+    smiles = ['CC(=O)OC1=CC=CC=C1C(=O)O', 'CCO', 'c1ccccc1O', 'CCN(CC)CC'] * 5
+    serial = RDKitDescriptors().featurize_dataframe(smiles)
+    parallel = RDKitDescriptors().featurize_dataframe(smiles, n_jobs=2, chunk_size=3)
+    assert serial.equals(parallel)
+    serial = RDKitDescriptors().featurize(smiles)
+    parallel = RDKitDescriptors().featurize(smiles, n_jobs=2)
+    assert np.array_equal(serial, parallel)
+
+  def test_rdkit_descriptors_preallocated(self):
+    """
+    Test featurizing into a preallocated matrix.
+    """
+    smiles = ['CC(=O)OC1=CC=CC=C1C(=O)O', 'not_a_smiles', 'CCO']
+    featurizer = RDKitDescriptors()
+    expected = featurizer.featurize_dataframe(smiles)
+    descriptors = featurizer.featurize_dataframe(smiles, dtype=np.float64)
+    assert descriptors.equals(expected)
+    assert descriptors.attrs['failed'].tolist() == [False, True, False]
+    descriptors = featurizer.featurize_dataframe(smiles, dtype=np.float32)
+    assert descriptors.shape == expected.shape
+    assert (descriptors.dtypes == np.float32).all()
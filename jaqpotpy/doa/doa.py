@@ -2,11 +2,14 @@ from abc import ABC
 import pandas as pd
 import numpy as np
 from typing import Iterable, Any
+from collections.abc import Iterator
 import math
 from jaqpotpy.descriptors.molecular import RDKitDescriptors, MordredDescriptors
 import pickle
 # import dill
 
+_chunk_size = 10000
+
 def calculate_a(X):
     shape = X.shape
     a = (3 * (shape[1] + 1)) / shape[0]
@@ -20,6 +23,56 @@ def calculate_doa_matrix(X):
     return x_out_inv
 
 
+def _iter_chunks(X, chunk_size: int = None):
+    """
+    Yields float row blocks of X. X is either a 2D array like, which is sliced
+    in blocks of chunk_size rows, or an iterator of 2D array likes, e.g. a
+    generator reading a training set bigger than memory.
+    """
+    if chunk_size is None:
+        chunk_size = _chunk_size
+    if not isinstance(X, Iterator):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        for start in range(0, X.shape[0], chunk_size):
+            yield np.asarray(X[start:start + chunk_size], dtype=np.float64)
+    else:
+        for chunk in X:
+            chunk = np.asarray(chunk, dtype=np.float64)
+            if chunk.ndim == 1:
+                chunk = chunk.reshape(1, -1)
+            yield chunk
+
+
+def calculate_gram_matrix(X, chunk_size: int = None):
+    """
+    Accumulates X^T X over row blocks of X, so that X never has to be held in memory
+    as a whole. Returns the matrix and the number of rows seen.
+    """
+    xtx = None
+    n_samples = 0
+    for chunk in _iter_chunks(X, chunk_size):
+        if xtx is None:
+            xtx = np.zeros((chunk.shape[1], chunk.shape[1]), dtype=np.float64)
+        xtx += chunk.T @ chunk
+        n_samples += chunk.shape[0]
+    if xtx is None:
+        raise ValueError("Cannot fit the domain of applicability on empty data")
+    return xtx, n_samples
+
+
+def calculate_leverages(doa_matrix, new_data, chunk_size: int = None) -> np.ndarray:
+    """
+    Computes the leverage h = x M x^T of every row x of new_data in blocks of rows.
+    """
+    leverages = [np.einsum('ij,jk,ik->i', chunk, doa_matrix, chunk, optimize=True)
+                 for chunk in _iter_chunks(new_data, chunk_size)]
+    if not leverages:
+        return np.zeros(0, dtype=np.float64)
+    return np.concatenate(leverages)
+
+
 def calc_doa(doa_matrix, new_data):
     doaAll = []
     for nd in new_data:
@@ -59,6 +112,7 @@ class Leverage(DOA, ABC):
     """
     _doa = []
     _in = []
+    _shape = None
 
     @property
     def __name__(self):
@@ -114,45 +168,48 @@ class Leverage(DOA, ABC):
         self._a = value
 
     def calculate_threshold(self):
-        shape = self._data.shape
-        a = (3 * (shape[1] + 1)) / shape[0]
+        n_samples, n_features = self._shape
+        a = (3 * (n_features + 1)) / n_samples
         self._a = a
 
-    def calculate_matrix(self):
-        x_T = self._data.transpose()
-        # for s in self._data:
-        #     print(s)
-        #     if isinstance(s, str):
-        #         print("STRING")
-        x_out = x_T.dot(self._data)
+    def calculate_matrix(self, chunk_size: int = None):
+        x_out, n_samples = calculate_gram_matrix(self._data, chunk_size)
+        self._shape = (n_samples, x_out.shape[0])
         self._doa_matrix = np.linalg.pinv(x_out)
         # self.doa_matrix = x_out #pd.DataFrame(np.linalg.pinv(x_out.values), x_out.columns, x_out.index)
 
-    def fit(self, X: np.array):
+    def fit(self, X: np.array, chunk_size: int = None):
+        """
+        Fits the leverage on X, a 2D array or an iterator of 2D row blocks. X^T X is
+        accumulated chunk_size rows at a time, so a generator of blocks lets training
+        sets bigger than memory be used. Blocks are not kept on the instance.
+        """
         # self._scaler.fit(X)
         # self._data = self._scaler.transform(X)
         self._data = X
-        self.calculate_matrix()
+        self.calculate_matrix(chunk_size)
         self.calculate_threshold()
-
-    def predict(self, new_data: np.array) -> Iterable[Any]:
-        doaAll = []
-        self._doa = []
-        self._in = []
+        if isinstance(X, Iterator):
+            self._data = None
+
+    def calculate(self, new_data: np.array, chunk_size: int = None) -> np.ndarray:
+        """
+        Computes the leverages of new_data in blocks of chunk_size rows.
+        Returns a structured array with the fields 'DOA', 'A' and 'IN'.
+        """
+        leverages = calculate_leverages(self._doa_matrix, new_data, chunk_size)
+        doa = np.empty(leverages.shape[0], dtype=[('DOA', np.float64), ('A', np.float64), ('IN', np.bool_)])
+        doa['DOA'] = leverages
+        doa['A'] = self._a
+        doa['IN'] = leverages < self._a
+        return doa
+
+    def predict(self, new_data: np.array, chunk_size: int = None) -> Iterable[Any]:
         # new_data = self._scaler.transform(new_data)
-        for nd in new_data:
-            d1 = np.dot(nd, self.doa_matrix)
-            ndt = np.transpose(nd)
-            d2 = np.dot(d1, ndt)
-            if d2 < self._a:
-                in_ad = True
-            else:
-                in_ad = False
-            self._doa.append(d2)
-            self._in.append(in_ad)
-            doa = {'DOA': d2, 'A': self._a, 'IN': in_ad}
-            doaAll.append(doa)
-        return doaAll
+        doa = self.calculate(new_data, chunk_size)
+        self._doa = doa['DOA'].tolist()
+        self._in = doa['IN'].tolist()
+        return [{'DOA': d2, 'A': self._a, 'IN': in_ad} for d2, in_ad in zip(self._doa, self._in)]
 
 
 class MeanVar(DOA, ABC):
@@ -160,6 +217,8 @@ class MeanVar(DOA, ABC):
     Implements Mean and Variance domain of applicability .
     Initialized upon training data and holds the doa mean and the variance of the data.
     Calculates the mean and variance for a new instance of data or array of data and decides if in AD.
+    A row is in AD when every feature lies within 4 standard deviations of the training mean.
+    After predict, doa_new holds the number of features of each row outside these bounds.
     """
     _doa = []
     _in = []
@@ -214,60 +273,76 @@ class MeanVar(DOA, ABC):
     def data(self, value):
         self._data = value
 
-    def fit(self, X: np.array):
-        self._data = X
+    def fit(self, X: np.array, chunk_size: int = None):
+        """
+        Fits the mean, standard deviation and variance of every feature of X, a 2D array
+        or an iterator of 2D row blocks. The moments are merged block by block, so
+        training sets bigger than memory can be used.
+        """
         # self._scaler.fit(X)
         # self._data = self._scaler.transform(X)
-        columns = list(zip(*self._data))
-        shape = X.shape
-        list_m_var = []
-        for i in range(shape[1]):
-            list_m_var.append([np.mean(columns[i]), np.std(columns[i]), np.var(columns[i])])
-        self._data = np.array(list_m_var)
-        self._doa_matrix = np.array(list_m_var)
-        self._a = np.array(list_m_var)
-
-    def calculate(self, new_data: np.array) -> Iterable[Any]:
-        doaAll = []
-        self._doa = []
-        self._in = []
-        # new_data = self._scaler.transform(new_data)
-        in_doa = True
-        for nd in new_data:
-            for index, row in enumerate(nd):
-                bounds = self._data[index]
-                bounds_data = [bounds[0]-4*bounds[1], bounds[0]+4*bounds[1]]
-                if row >= bounds_data[0] and row <= bounds_data[1]:
-                    continue
-                else:
-                    in_doa = False
-            # if len(new_data[0]) > 100 and many > 5:
-            #     in_doa = False
-            doa = {'IN': in_doa}
-            doaAll.append(doa)
-        return doaAll
-
-    def predict(self, new_data: np.array) -> Iterable[Any]:
-        doaAll = []
-        self._doa = []
-        self._in = []
+        n_samples = 0
+        mean = m2 = None
+        for chunk in _iter_chunks(X, chunk_size):
+            n_chunk = chunk.shape[0]
+            mean_chunk = chunk.mean(axis=0)
+            m2_chunk = ((chunk - mean_chunk) ** 2).sum(axis=0)
+            if mean is None:
+                mean, m2 = mean_chunk, m2_chunk
+            else:
+                # Chan et al. pairwise update of the mean and the sum of squared deviations
+                delta = mean_chunk - mean
+                total = n_samples + n_chunk
+                mean = mean + delta * n_chunk / total
+                m2 = m2 + m2_chunk + delta ** 2 * n_samples * n_chunk / total
+            n_samples += n_chunk
+        if mean is None:
+            raise ValueError("Cannot fit the domain of applicability on empty data")
+        var = m2 / n_samples
+        list_m_var = np.column_stack([mean, np.sqrt(var), var])
+        self._data = list_m_var
+        self._doa_matrix = list_m_var
+        self._a = list_m_var
+
+    def bounds(self):
+        """
+        Returns the lower and upper bounds, mean -/+ 4 standard deviations, of every feature.
+        """
+        mean = self._data[:, 0]
+        std = self._data[:, 1]
+        return mean - 4 * std, mean + 4 * std
+
+    def out_of_bounds(self, new_data: np.array) -> np.ndarray:
+        """
+        Returns a boolean matrix that marks the features of every row of new_data
+        that fall outside the bounds. NaN values are out of bounds.
+        """
+        new_data = np.asarray(new_data, dtype=np.float64)
+        if new_data.ndim == 1:
+            new_data = new_data.reshape(1, -1)
+        lower, upper = self.bounds()
+        return ~((new_data >= lower) & (new_data <= upper))
+
+    def calculate(self, new_data: np.array, chunk_size: int = None) -> np.ndarray:
+        """
+        Checks new_data, a 2D array or an iterator of 2D row blocks, against the bounds
+        one block at a time. Returns a structured array with the fields 'IN' and
+        'VIOLATIONS', the number of features of each row outside the bounds.
+        """
+        violations = [self.out_of_bounds(chunk).sum(axis=1)
+                      for chunk in _iter_chunks(new_data, chunk_size)]
+        violations = np.concatenate(violations) if violations else np.zeros(0, dtype=np.int64)
+        doa = np.empty(violations.shape[0], dtype=[('IN', np.bool_), ('VIOLATIONS', np.int64)])
+        doa['IN'] = violations == 0
+        doa['VIOLATIONS'] = violations
+        return doa
+
+    def predict(self, new_data: np.array, chunk_size: int = None) -> Iterable[Any]:
         # new_data = self._scaler.transform(new_data)
-        in_doa = True
-        for nd in new_data:
-            for index, row in enumerate(nd):
-                bounds = self._data[index]
-                bounds_data = [bounds[0]-4*bounds[1], bounds[0]+4*bounds[1]]
-                if row >= bounds_data[0] and row <= bounds_data[1]:
-                    continue
-                else:
-                    in_doa = False
-            # if len(new_data[0]) > 100 and many > 5:
-            #     in_doa = False
-            doa = {'IN': in_doa}
-            doaAll.append(doa)
-            self._doa.append(new_data)
-            self._in.append(in_doa)
-        return doaAll
+        doa = self.calculate(new_data, chunk_size)
+        self._doa = doa['VIOLATIONS'].tolist()
+        self._in = doa['IN'].tolist()
+        return [{'IN': in_doa} for in_doa in self._in]
 
 
 class SmilesLeverage(DOA, ABC):
@@ -276,6 +351,8 @@ class SmilesLeverage(DOA, ABC):
     Descriptors and data matrix is calculated with rdkit descriptors
     Initialized upon training data and holds the doa matrix and the threshold 'A' value.
     Calculates the DOA for a new instance of data or array of data.
+    The same featurizer is used across calls. Descriptors already computed by it can be
+    passed to fit and predict, and a DescriptorCache can be shared with other featurizers.
     """
     _doa = []
     _in = []
@@ -284,7 +361,7 @@ class SmilesLeverage(DOA, ABC):
     def __name__(self):
         return 'SmilesLeverage'
 
-    def __init__(self) -> None:
+    def __init__(self, cache=None) -> None:
         # self._scaler: BaseEstimator = scaler
         self._smiles = None
         self._data: np.array = None
@@ -292,6 +369,8 @@ class SmilesLeverage(DOA, ABC):
         self._a = None
         # self.featurizer = MordredDescriptors(ignore_3D=True)
         self.featurizer = RDKitDescriptors(use_fragment=False, ipc_avg=False)
+        if cache is not None:
+            self.featurizer.cache = cache
 
     def __getitem__(self):
         return self
@@ -349,41 +428,50 @@ class SmilesLeverage(DOA, ABC):
         a = (3 * (shape[1] + 1)) / shape[0]
         self._a = a
 
-    def calculate_matrix(self):
-        x_T = self._data.transpose()
-        x_out = x_T.dot(self._data)
+    def calculate_matrix(self, chunk_size: int = None):
+        x_out, _ = calculate_gram_matrix(self._data, chunk_size)
         self._doa_matrix = np.linalg.pinv(x_out)
         # self.doa_matrix = x_out #pd.DataFrame(np.linalg.pinv(x_out.values), x_out.columns, x_out.index)
 
-    def fit(self, smiles: Iterable[str]):
+    def featurize(self, smiles: Iterable[str], descriptors: Any = None) -> np.ndarray:
+        """
+        Computes the descriptors the leverage is defined on. If descriptors are given
+        they are used instead; a DataFrame is reduced to the columns of self.featurizer.
+        """
+        if descriptors is None:
+            return self.featurizer.featurize_dataframe(smiles).to_numpy()
+        if isinstance(descriptors, pd.DataFrame):
+            descriptors = descriptors[self.featurizer._get_column_names()]
+        return np.asarray(descriptors)
+
+    def fit(self, smiles: Iterable[str], descriptors: np.array = None, chunk_size: int = None):
+        """
+        Fits the leverage on the descriptors of smiles. descriptors, if given, must hold
+        the columns of self.featurizer for the same smiles and are used instead of
+        featurizing them again.
+        """
         # self._scaler.fit(X)
         # self._data = self._scaler.transform(X)
         self._smiles = smiles
-        from jaqpotpy.descriptors.molecular import RDKitDescriptors
-        featurizer = RDKitDescriptors(use_fragment=False, ipc_avg=False)
-        self._data = featurizer.featurize(smiles)
-        self.calculate_matrix()
+        self._data = self.featurize(smiles, descriptors)
+        self.calculate_matrix(chunk_size)
         self.calculate_threshold()
 
-    def predict(self, smiles: Iterable[str]) -> Iterable[Any]:
-        doaAll = []
-        self._doa = []
-        self._in = []
+    def calculate(self, smiles: Iterable[str], descriptors: np.array = None, chunk_size: int = None) -> np.ndarray:
+        """
+        Computes the leverages of smiles in blocks of chunk_size rows.
+        Returns a structured array with the fields 'DOA', 'A' and 'IN'.
+        """
+        leverages = calculate_leverages(self._doa_matrix, self.featurize(smiles, descriptors), chunk_size)
+        doa = np.empty(leverages.shape[0], dtype=[('DOA', np.float64), ('A', np.float64), ('IN', np.bool_)])
+        doa['DOA'] = leverages
+        doa['A'] = self._a
+        doa['IN'] = leverages < self._a
+        return doa
+
+    def predict(self, smiles: Iterable[str], descriptors: np.array = None, chunk_size: int = None) -> Iterable[Any]:
         # new_data = self._scaler.transform(new_data)
-        from jaqpotpy.descriptors.molecular import RDKitDescriptors
-        featurizer = RDKitDescriptors(use_fragment=False, ipc_avg=False)
-        new_data = featurizer.featurize(smiles)
-        # new_data = self.featurizer.featurize(smiles)
-        for nd in new_data:
-            d1 = np.dot(nd, self.doa_matrix)
-            ndt = np.transpose(nd)
-            d2 = np.dot(d1, ndt)
-            if d2 < self._a:
-                in_ad = True
-            else:
-                in_ad = False
-            self._doa.append(d2)
-            self._in.append(in_ad)
-            doa = {'DOA': d2, 'A': self._a, 'IN': in_ad}
-            doaAll.append(doa)
-        return doaAll
+        doa = self.calculate(smiles, descriptors, chunk_size)
+        self._doa = doa['DOA'].tolist()
+        self._in = doa['IN'].tolist()
+        return [{'DOA': d2, 'A': self._a, 'IN': in_ad} for d2, in_ad in zip(self._doa, self._in)]
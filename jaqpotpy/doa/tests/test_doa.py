@@ -203,3 +203,73 @@ class TestDoa(unittest.TestCase):
         doa.fit(data)
         calc = doa.predict(data)
         assert len(calc) == len(data)
+
+    def test_leverage_chunks(self):
+        rng = np.random.default_rng(0)
+        data = rng.random((500, 5))
+        new_data = rng.random((50, 5))
+
+        doa = Leverage()
+        doa.fit(data)
+        doa_matrix = np.linalg.pinv(data.T.dot(data))
+        expected = [np.dot(np.dot(nd, doa_matrix), nd) for nd in new_data]
+        calc = doa.predict(new_data, chunk_size=7)
+        assert np.allclose(doa.doa_new, expected)
+        assert doa.IN == [d < doa.a for d in expected]
+        assert len(calc) == len(new_data)
+
+        streamed = Leverage()
+        streamed.fit(data[i:i + 64] for i in range(0, len(data), 64))
+        assert np.allclose(streamed.doa_matrix, doa.doa_matrix)
+        assert streamed.a == doa.a
+        batch = streamed.calculate(new_data)
+        assert np.allclose(batch['DOA'], expected)
+        assert batch['IN'].tolist() == doa.IN
+
+    def test_mean_var_vectorized(self):
+        rng = np.random.default_rng(0)
+        data = rng.normal(size=(400, 4))
+        doa = MeanVar()
+        doa.fit(data[i:i + 50] for i in range(0, len(data), 50))
+        assert np.allclose(doa.data[:, 0], data.mean(axis=0))
+        assert np.allclose(doa.data[:, 1], data.std(axis=0))
+        assert np.allclose(doa.data[:, 2], data.var(axis=0))
+
+        new_data = np.zeros((4, 4))
+        new_data[1, 0] = 100
+        new_data[1, 2] = -100
+        # Rows after an out of domain row are judged on their own
+        calc = doa.predict(new_data, chunk_size=3)
+        assert doa.IN == [True, False, True, True]
+        assert doa.doa_new == [0, 2, 0, 0]
+        assert calc == [{'IN': True}, {'IN': False}, {'IN': True}, {'IN': True}]
+        assert doa.out_of_bounds(new_data[1]).tolist() == [[True, False, True, False]]
+
+    def test_smiles_leverage_descriptors(self):
+        mols = ['O=C1CCCN1Cc1cccc(C(=O)N2CCC(C3CCNC3)CC2)c1'
+            , 'O=C1CCc2cc(C(=O)N3CCC(C4CCNC4)CC3)ccc2N1'
+            , 'CCC(=O)Nc1ccc(N(Cc2ccccc2)C(=O)n2nnc3ccccc32)cc1'
+            , 'COc1ccc2c(N)nn(C(=O)Cc3cccc(Cl)c3)c2c1'
+            , 'Cc1nn(C)c2[nH]nc(NC(=O)Cc3cccc(Cl)c3)c12'
+            , 'O=C(Cc1cncc2ccccc12)N(CCC1CCCCC1)c1cccc(Cl)c1'
+            , 'COc1ccc(N(Cc2ccccc2)C(=O)Cc2c[nH]c3ccccc23)cc1'
+            , 'COc1ccc2c(NC(=O)C3CCOc4ccc(Cl)cc43)[nH]nc2c1'
+            ]
+        mol = ['COc1ccc2c(N)nn(C(=O)Cc3cccc(Cl)c3)c2c1'
+            , 'CN(C)c1ccc(N(Cc2ccsc2)C(=O)Cc2cncc3ccccc23)cc1']
+
+        doa = SmilesLeverage()
+        doa.fit(mols)
+        featurizer = doa.featurizer
+        calc = doa.predict(mol)
+
+        featurizer_descriptors = RDKitDescriptors(use_fragment=False, ipc_avg=False)
+        descriptors = featurizer_descriptors.featurize_dataframe(mols)
+        precomputed = SmilesLeverage()
+        precomputed.fit(mols, descriptors=descriptors)
+        assert np.allclose(precomputed.doa_matrix, doa.doa_matrix)
+        precomputed.predict(mol, descriptors=featurizer_descriptors.featurize_dataframe(mol))
+        assert np.allclose(precomputed.doa_new, doa.doa_new)
+        assert precomputed.IN == doa.IN
+        assert doa.featurizer is featurizer
+        assert len(calc) == len(mol)
@@ -1,5 +1,9 @@
 from jaqpotpy.entities.feature import Feature
 import math
+import json
+import uuid
+from json.encoder import encode_basestring_ascii
+import numpy as np
 import jaqpotpy
 from jaqpotpy.cfg import config
 
@@ -54,6 +58,80 @@ def create_data_entry(df, feat_map, owner_uuid):
     return data_entry
 
 
+def _json_value(value):
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    from jaqpotpy.helpers.serializer import JaqpotSerializer
+    return json.dumps(value, cls=JaqpotSerializer)
+
+
+def _json_column(values):
+    """
+    JSON encodes the values of a column at once, as JaqpotSerializer encodes them one by one.
+    """
+    kind = values.dtype.kind
+    if kind == 'f':
+        values = np.asarray(values, dtype=np.float64)
+        encoded = list(map(float.__repr__, values.tolist()))
+        for i in np.flatnonzero(~np.isfinite(values)):
+            encoded[i] = 'NaN' if np.isnan(values[i]) else 'Infinity' if values[i] > 0 else '-Infinity'
+        return encoded
+    if kind in 'iu':
+        return list(map(int.__repr__, values.tolist()))
+    if kind == 'b':
+        return ['true' if v else 'false' for v in values.tolist()]
+    return [_json_value(v) for v in values.tolist()]
+
+
+def iter_data_entry_json(df, feat_map, owner_uuid, chunk_size: int = 1000):
+    """
+    Encodes the dataEntry of a dataset as JSON text, `chunk_size` rows at a time.
+
+    The text is the one of `json.dumps(create_data_entry(df, feat_map, owner_uuid), cls=JaqpotSerializer)`,
+    but the values are encoded column by column, without a DataEntry per row. As with `df.loc`,
+    the values of a row are cast to the common dtype of the columns of `df`.
+    """
+    # Keys and columns of the values, ordered as the dict create_data_entry fills
+    values = {}
+    for key in feat_map:
+        values[feat_map[key]] = key
+    positions = df.columns.get_indexer(list(values.values()))
+    if (positions < 0).any():
+        raise KeyError([key for key, pos in zip(values.values(), positions) if pos < 0])
+    dtype = df.iloc[:0].to_numpy().dtype
+    template = ('{"entryId": {"name": %s, "ownerUUID": ' + _json_value(owner_uuid).replace('%', '%%')
+                + ', "URI": null, "type": null}, "values": {'
+                + ', '.join(encode_basestring_ascii(str(k)).replace('%', '%%') + ': %s' for k in values)
+                + '}}')
+    yield '['
+    for start in range(0, df.shape[0], chunk_size):
+        block = df.iloc[start:start + chunk_size, positions].to_numpy(dtype=dtype)
+        names = _json_column(df.index[start:start + chunk_size])
+        columns = [_json_column(block[:, j]) for j in range(block.shape[1])]
+        rows = ', '.join([template % row for row in zip(names, *columns)])
+        yield ', ' + rows if start else rows
+    yield ']'
+
+
+def write_dataset_json(fp, dataset, df, feat_map, owner_uuid, chunk_size: int = 1000):
+    """
+    Writes the JSON of `dataset`, with the dataEntry of `df`, into the binary file `fp`.
+
+    The bytes are the ones `json.dumps(dataset, cls=JaqpotSerializer)` gives when
+    `dataset.dataEntry` holds `create_data_entry(df, feat_map, owner_uuid)`. The entries are
+    written `chunk_size` rows at a time, so only a chunk of them is in memory.
+    """
+    from jaqpotpy.helpers.serializer import JaqpotSerializer
+    marker = uuid.uuid4().hex
+    dataset.dataEntry = marker
+    head, tail = json.dumps(dataset, cls=JaqpotSerializer).split(json.dumps(marker), 1)
+    fp.write(head.encode('utf-8'))
+    for chunk in iter_data_entry_json(df, feat_map, owner_uuid, chunk_size=chunk_size):
+        fp.write(chunk.encode('utf-8'))
+    fp.write(tail.encode('utf-8'))
+    return fp
+
+
 def create_pretrain_req(model, X, y, title, description, algorithm, implementedWith, runtime, additionalInfo):
     pnb = PretrainedNeedsBuilder()
     independentFeatures = []
@@ -0,0 +1,53 @@
+import io
+import json
+import unittest
+import numpy as np
+import pandas as pd
+import jaqpotpy.helpers.helpers as help
+from jaqpotpy.helpers.serializer import JaqpotSerializer
+from jaqpotpy.entities.dataset import Dataset
+from jaqpotpy.entities.meta import MetaInfo
+
+
+def dataset_of(df):
+    dataset = Dataset()
+    meta = MetaInfo()
+    meta.creators = ['owner']
+    meta.titles = ['title']
+    dataset.meta = meta.__dict__
+    dataset.totalRows = df.shape[0]
+    dataset.totalColumns = df.shape[1]
+    dataset.existence = "UPLOADED"
+    dataset.features = [{'name': name, 'key': key} for key, name in enumerate(df)]
+    return dataset
+
+
+class TestHelpers(unittest.TestCase):
+
+    frames = [
+        pd.DataFrame({'a': [1, 2, 3], 'b': [0.1, np.inf, 1e16], 'c': ['x', 'yé', '"%s"'], 'd': [True, False, True]}
+                     , index=['m1', 'm2', 'm3']),
+        pd.DataFrame({'a': [1, 2, 3], 'b': [0.1, -np.inf, np.nan]}),
+        pd.DataFrame(np.random.default_rng(0).normal(size=(7, 5)), columns=list('vwxyz')),
+        pd.DataFrame(np.arange(12).reshape(4, 3), columns=list('abc'), index=[10, 11, 12, 13]),
+        pd.DataFrame({'a': [], 'b': []}),
+    ]
+
+    def test_data_entry_json(self):
+        for df in self.frames:
+            feat_map = {name: key for key, name in enumerate(reversed(list(df)))}
+            expected = json.dumps(help.create_data_entry(df, feat_map, 'owner'), cls=JaqpotSerializer)
+            assert ''.join(help.iter_data_entry_json(df, feat_map, 'owner', chunk_size=2)) == expected
+
+    def test_write_dataset_json(self):
+        for df in self.frames:
+            feat_map = {name: key for key, name in enumerate(df)}
+            dataset = dataset_of(df)
+            dataset.dataEntry = help.create_data_entry(df, feat_map, 'owner')
+            expected = json.dumps(dataset, cls=JaqpotSerializer).encode('utf-8')
+            written = help.write_dataset_json(io.BytesIO(), dataset_of(df), df, feat_map, 'owner', chunk_size=2)
+            assert written.getvalue() == expected
+
+    def test_data_entry_json_missing_column(self):
+        with self.assertRaises(KeyError):
+            ''.join(help.iter_data_entry_json(self.frames[0], {'missing': 0}, 'owner'))
@@ -5,11 +5,14 @@ import jaqpotpy.api.models_api as models_api
 import jaqpotpy.api.chempot_api as chempot_api
 import jaqpotpy.api.task_api as task_api
 import jaqpotpy.api.doa_api as doa_api
+from jaqpotpy.api.session import JaqpotSession
 import jaqpotpy.helpers.jwt as jwtok
 import jaqpotpy.helpers.helpers as help
 import jaqpotpy.helpers.dataset_deserializer as ds
 # from jaqpotpy.helpers.logging import ColoredFormatter
 from jaqpotpy.helpers.logging import init_logger
+import asyncio
+import io
 import json
 import jaqpotpy.api.feature_api as featapi
 from jaqpotpy.helpers.serializer import JaqpotSerializer
@@ -21,7 +24,9 @@ import pandas as pd
 import numpy as np
 import http.client as http_client
 import getpass
-import time
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable
 import jaqpotpy.doa.doa as jha
 from sys import getsizeof
 from tqdm import tqdm
@@ -34,6 +39,19 @@ ENCODING = 'utf-8'
 # import matplotlib.pyplot as plt
 
 
+class ModelUploadError(Exception):
+    """
+    Raised when some parts of a model could not be uploaded. Passing it as `resume` to the
+    deploy method uploads the remaining parts of the same model.
+    """
+
+    def __init__(self, model_id, uploaded, total):
+        super().__init__("Uploaded %d of the %d parts of model %s" % (len(uploaded), total, model_id))
+        self.model_id = model_id
+        self.uploaded = uploaded
+        self.total = total
+
+
 class Jaqpot:
     """
     Deploys sklearn models on Jaqpot.
@@ -43,10 +61,12 @@ class Jaqpot:
     Parameters
     ----------
     base_url : The url on which Jaqpot services are deployed
+    session : The JaqpotSession the calls to Jaqpot are sent through. A session with the
+        default pooling, retries and timeouts is created if none is given.
 
     """
 
-    def __init__(self, base_url=None, create_logs=False):
+    def __init__(self, base_url=None, create_logs=False, session: JaqpotSession = None):
         # logging.basicConfig(format='%(levelname)s:%(message)s', level=logging.INFO)
         self.log = init_logger(__name__, testing_mode=False, output_log_file=create_logs)
         if base_url:
@@ -56,6 +76,8 @@ class Jaqpot:
         self.api_key = None
         self.user_id = None
         self.http_client = http_client
+        # Keeps the connections to Jaqpot alive between the calls
+        self.session = session if session is not None else JaqpotSession()
 
     def login(self, username, password):
         """
@@ -68,7 +90,7 @@ class Jaqpot:
 
         """
         try:
-            au_req = jaqlogin.authenticate_sync(self.base_url, username, password)
+            au_req = jaqlogin.authenticate_sync(self.base_url, username, password, session=self.session)
             self.api_key = au_req['authToken']
             # self.user_id = jwtok.decode_jwt(self.api_key).get('sub')
         except Exception as e:
@@ -98,7 +120,7 @@ class Jaqpot:
 
         """
         try:
-            au_req = jaqlogin.authenticate_sync(self.base_url, username, password)
+            au_req = jaqlogin.authenticate_sync(self.base_url, username, password, session=self.session)
             self.api_key = au_req['authToken']
             self.log.info("api key is set")
             # self.user_id = jwtok.decode_jwt(self.api_key).get('sub')
@@ -113,7 +135,7 @@ class Jaqpot:
         try:
             username = input("Username: ")
             password = getpass.getpass("Password: ")
-            au_req = jaqlogin.authenticate_sync(self.base_url, username, password)
+            au_req = jaqlogin.authenticate_sync(self.base_url, username, password, session=self.session)
             self.api_key = au_req['authToken']
             self.log.info("api key is set")
             # self.user_id = jwtok.decode_jwt(self.api_key).get('sub')
@@ -131,7 +153,7 @@ class Jaqpot:
     def get_algorithms(self, start=None, max=None):
         self.check_key()
         try:
-            algos = alapi.get_allgorithms_sync(self.base_url, self.api_key, start, max)
+            algos = alapi.get_allgorithms_sync(self.base_url, self.api_key, start, max, session=self.session)
             return algos
         except Exception as e:
             self.log.error("Error:" + str(e))
@@ -139,12 +161,16 @@ class Jaqpot:
     def get_algorithms_classes(self, start=None, max=None):
         self.check_key()
         try:
-            algos = alapi.get_allgorithms_classes(self.base_url, self.api_key, start, max)
+            algos = alapi.get_allgorithms_classes(self.base_url, self.api_key, start, max, session=self.session)
             return algos
         except Exception as e:
             self.log.error("Error:" + str(e))
 
-    def upload_dataset(self, df=None, id=None, title=None, description=None):
+    def upload_dataset(self, df=None, id=None, title=None, description=None, workers: int = 8):
+        """
+        Uploads a dataframe as a Jaqpot dataset. The features of its columns are created
+        concurrently by `workers` threads.
+        """
         if title is None:
             raise Exception("Please submit title of the dataset")
         if description is None:
@@ -179,9 +205,11 @@ class Jaqpot:
         feat_map = {}
         featutes = []
         keyi = 0
-        for feat in feats:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            created = list(executor.map(lambda feat: featapi.create_feature_sync(self.base_url, self.api_key, feat
+                                                                                 , session=self.session), feats))
+        for f in created:
             feat_info = FeatureInfo()
-            f = featapi.create_feature_sync(self.base_url, self.api_key, feat)
             feat_uri = self.base_url + "feature/" + f["_id"]
             feat_map[f["meta"]["titles"][0]] = keyi
             feat_info.uri = feat_uri
@@ -199,15 +227,13 @@ class Jaqpot:
         dataset.totalRows = df.shape[0]
         dataset.totalColumns = df.shape[1]
         dataset.existence = "UPLOADED"
-        data_entry = help.create_data_entry(df, feat_map, self.user_id)
-        dataset.dataEntry = data_entry
         dataset.features = featutes
-        jsondataset = json.dumps(dataset, cls=JaqpotSerializer)
-        dataset_n = data_api.create_dataset_sync(self.base_url, self.api_key, jsondataset, self.log)
+        jsondataset = help.write_dataset_json(io.BytesIO(), dataset, df, feat_map, self.user_id).getvalue()
+        dataset_n = data_api.create_dataset_sync(self.base_url, self.api_key, jsondataset, self.log, session=self.session)
         self.log.info("Dataset created with id: " + dataset_n["_id"])
         return dataset_n["_id"]
 
-    def chempot_predict(self, model, smiles, descriptors = "mordred", doa = False):
+    def chempot_predict(self, model, smiles, descriptors = "mordred", doa = False, timeout=None):
         """
         Makes a prediction from a Chempot model
 
@@ -221,32 +247,62 @@ class Jaqpot:
             The descriptors of the model.
         doa : boolean
             Whether the Domain of Applicability will be taken into account
+        timeout : float
+            Seconds to wait for the prediction task. The task is cancelled and a TimeoutError
+            raised if it has not completed by then. Waits without limit if None.
         
         Returns
         -------
         tuple
             The predicted dataset (first item) and the predicted feature (second item)
         """
-        task = chempot_api.predict(self.base_url, self.api_key, model, smiles, descriptors, doa, self.log)
-        
-        percentange = 0
-        taskid = task['_id']
-        while percentange < 100:
-            time.sleep(1)
-            task = task_api.get_task(self.base_url, self.api_key, taskid)
-            try:
-                percentange = task['percentageCompleted']
-            except KeyError:
-                percentange = 0
-            self.log.info("completed " + str(percentange))
-        predictedDataset = task['resultUri']
-        dar = predictedDataset.split("/")
-        dataset = data_api.get_dataset(self.base_url, self.api_key, dar[len(dar)-1], self.log)
-        df, predicts = ds.decode_predicted(dataset)
-        return df, predicts
+        task = chempot_api.predict(self.base_url, self.api_key, model, smiles, descriptors, doa, self.log, session=self.session)
+        task = task_api.wait_task(self.base_url, self.api_key, task['_id'], timeout=timeout, logger=self.log
+                                  , session=self.session)
+        return self._prediction_result(task)
+
+
+    def predict(self, df=None, modelId=None, timeout=None):
+        """
+        Makes predictions for a dataframe with a Jaqpot model
+
+        The prediction task is polled with an exponential backoff, so small predictions return
+        soon after they complete.
 
+        Parameters
+        ----------
+        df : pandas dataframe
+            The input of the model, with a column for each of its independent features
+        modelId : string
+            The id of the model
+        timeout : float
+            Seconds to wait for the prediction task. The task is cancelled and a TimeoutError
+            raised if it has not completed by then. Waits without limit if None.
 
-    def predict(self, df=None, modelId=None):
+        Returns
+        -------
+        tuple
+            The predicted dataset (first item) and the predicted feature (second item)
+        """
+        taskid = self._submit_prediction(df, modelId)
+        task = task_api.wait_task(self.base_url, self.api_key, taskid, timeout=timeout, logger=self.log
+                                  , session=self.session)
+        return self._prediction_result(task)
+
+    async def apredict(self, df=None, modelId=None, timeout=None):
+        """
+        Coroutine version of `predict`, so that many predictions can be awaited at once
+
+        Examples
+        --------
+        >>> results = await asyncio.gather(*[jaqpot.apredict(df, model_id, timeout=60) for df in dfs])
+        """
+        taskid = await asyncio.to_thread(self._submit_prediction, df, modelId)
+        task = await task_api.await_task(self.base_url, self.api_key, taskid, timeout=timeout, logger=self.log
+                                         , session=self.session)
+        return await asyncio.to_thread(self._prediction_result, task)
+
+    def _submit_prediction(self, df, modelId):
         df_titles = list(df)
         for t in df_titles:
             type_to_c = df[t].dtypes
@@ -257,7 +313,7 @@ class Jaqpot:
         df = df.replace(np.nan, '', regex=True)
         if type(df).__name__ != 'DataFrame':
             raise Exception("Cannot form a Jaqpot Dataset. Please provide a Dataframe")
-        model = models_api.get_model(self.base_url, self.api_key, modelId, self.log)
+        model = models_api.get_model(self.base_url, self.api_key, modelId, self.log, session=self.session)
         # feats = []
         # for featUri in model['independentFeatures']:
         #     featar = featUri.split("/")
@@ -290,27 +346,18 @@ class Jaqpot:
         dataset.totalRows = df.shape[0]
         dataset.totalColumns = df.shape[1]
         # dataset.existence = "UPLOADED"
-        data_entry = help.create_data_entry(df, feat_map, self.user_id)
-        dataset.dataEntry = data_entry
         dataset.features = featutes
-        jsondataset = json.dumps(dataset, cls=JaqpotSerializer)
-        dataset_n = data_api.create_dataset_sync(self.base_url, self.api_key, jsondataset, self.log)
+        jsondataset = help.write_dataset_json(io.BytesIO(), dataset, df, feat_map, self.user_id).getvalue()
+        dataset_n = data_api.create_dataset_sync(self.base_url, self.api_key, jsondataset, self.log, session=self.session)
         datasetId = dataset_n["_id"]
         datasetUri = self.base_url + "dataset/" + datasetId
-        task = models_api.predict(self.base_url, self.api_key, dataseturi=datasetUri, modelid=modelId, logger=self.log)
-        percentange = 0
-        taskid = task['_id']
-        while percentange < 100:
-            time.sleep(1)
-            task = task_api.get_task(self.base_url, self.api_key, taskid)
-            try:
-                percentange = task['percentageCompleted']
-            except KeyError:
-                percentange = 0
-            self.log.info("completed " + str(percentange))
+        task = models_api.predict(self.base_url, self.api_key, dataseturi=datasetUri, modelid=modelId, logger=self.log, session=self.session)
+        return task['_id']
+
+    def _prediction_result(self, task):
         predictedDataset = task['resultUri']
         dar = predictedDataset.split("/")
-        dataset = data_api.get_dataset(self.base_url, self.api_key, dar[len(dar)-1], self.log)
+        dataset = data_api.get_dataset(self.base_url, self.api_key, dar[len(dar)-1], self.log, session=self.session)
         df, predicts = ds.decode_predicted(dataset)
         return df, predicts
 
@@ -383,7 +430,7 @@ class Jaqpot:
         if size < 2000000:
             j = json.dumps(pretrained, cls=JaqpotSerializer)
             if doa is None:
-                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
                 if response.status_code < 300:
                     resp = response.json()
                     self.log.info("Model with id: " + resp['modelId'] + " created. Please visit the application to proceed")
@@ -393,7 +440,7 @@ class Jaqpot:
                     self.log.error("Some error occured: " + resp['message'])
                     return
             else:
-                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
                 if response.status_code < 300:
                     resp = response.json()
                     self.log.info("Model with id: " + resp['modelId'] + " created. Storing Domain of applicability")
@@ -411,38 +458,21 @@ class Jaqpot:
                 # results = loop.run_until_complete(all_groups)
                 doa = help.create_doa(inv_m=b.values.tolist(), a=a, modelid=resp['modelId'])
                 j = json.dumps(doa, cls=JaqpotSerializer)
-                resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log)
+                resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log, session=self.session)
                 if resp == 201:
                     self.log.info("Stored Domain of applicability. Visit the application to proceed")
                     return modid
         else:
             rawModel = pretrained.rawModel[0]
-            rawModel = str(rawModel)
             n = 1000000
-            chunks = [rawModel[i:i + n] for i in range(0, len(rawModel), n)]
             del pretrained.rawModel
             j = json.dumps(pretrained, cls=JaqpotSerializer)
             if doa is None:
-                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
                 if response.status_code < 300:
                     resp = response.json()
                     model_id = resp['modelId']
-                    parts = []
-                    i = 0
-                    for c in chunks:
-                        part = {}
-                        part['modelId'] = model_id
-                        part['partNumber'] = i
-                        part['totalParts'] = len(chunks)
-                        part['part'] = c
-                        parts.append(part)
-                        i += 1
-                    for j in tqdm(range(len(chunks))):
-                        part = parts[j]
-                        json_r = json.dumps(part, cls=JaqpotSerializer)
-                        resp = models_api.post_model_part(self.base_url, self.api_key, model_id, json_r, self.log)
-                        # pass
-                    # resp = response.json()
+                    self.upload_model_parts(model_id, rawModel, part_size=n)
                     self.log.info("Model with id: " + model_id + " created. Please visit the application to proceed")
                     return model_id
                 else:
@@ -450,7 +480,7 @@ class Jaqpot:
                     self.log.error("Some error occured: " + resp['message'])
                     return
             else:
-                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
                 resp = response.json()
                 if response.status_code < 300:
                     resp = response.json()
@@ -465,20 +495,28 @@ class Jaqpot:
                 b = jha.calculate_doa_matrix(X)
                 doa = help.create_doa(inv_m=b.values.tolist(), a=a, modelid=resp['modelId'])
                 j = json.dumps(doa, cls=JaqpotSerializer)
-                resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log)
+                resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log, session=self.session)
                 if resp == 201:
                     self.log.info("Stored Domain of applicability. Visit the application to proceed")
                     return modid
             # print("Not supported")
 
-    def deploy_jaqpotpy_molecular_model(self, model, description: str, title: str = None):
+    def deploy_jaqpotpy_molecular_model(self, model, description: str, title: str = None, workers: int = 4
+                                        , progress: Callable[[int, int], None] = None, resume: ModelUploadError = None):
+        """
+        Deploys a jaqpotpy MolecularModel on Jaqpot.
+
+        Models larger than 2MB are uploaded in parts by `workers` threads, and
+        `progress(uploaded, total)` is called as each part is uploaded. If some parts fail, a
+        ModelUploadError is raised. Passing it as `resume` uploads only the missing parts.
+        """
         if model.model_title != None:
             title = model.model_title
         pretrained = help.create_molecular_req(model, title=title, description=description, type="MolecularModel")
         size = getsizeof(pretrained.rawModel[0])
         if size < 2000000:
             j = json.dumps(pretrained, cls=JaqpotSerializer)
-            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
             if response.status_code < 300:
                 resp = response.json()
                 self.log.info("Model with id: " + resp['modelId'] + " created. Please visit the application to proceed")
@@ -489,37 +527,55 @@ class Jaqpot:
                 return
         else:
             rawModel = pretrained.rawModel[0]
-            rawModel = str(rawModel)
             n = 2000000
-            chunks = [rawModel[i:i + n] for i in range(0, len(rawModel), n)]
             del pretrained.rawModel
-            j = json.dumps(pretrained, cls=JaqpotSerializer)
-            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
-            if response.status_code < 300:
-                resp = response.json()
-                model_id = resp['modelId']
-                parts = []
-                i = 0
-                for c in chunks:
-                    part = {}
-                    part['modelId'] = model_id
-                    part['partNumber'] = i
-                    part['totalParts'] = len(chunks)
-                    part['part'] = c
-                    parts.append(part)
-                    i += 1
-                for j in tqdm(range(len(chunks))):
-                    part = parts[j]
-                    json_r = json.dumps(part, cls=JaqpotSerializer)
-                    resp = models_api.post_model_part(self.base_url, self.api_key, model_id, json_r, self.log)
-                    # pass
-                # resp = response.json()
-                self.log.info("Model with id: " + model_id + " created. Please visit the application to proceed")
-                return model_id
+            if resume is not None:
+                model_id = resume.model_id
+                self.log.info("Resuming the upload of model " + model_id)
+                uploaded = resume.uploaded
             else:
-                resp = response.json()
-                self.log.error("Some error occured: " + resp['message'])
-                return
+                j = json.dumps(pretrained, cls=JaqpotSerializer)
+                response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
+                if response.status_code >= 300:
+                    resp = response.json()
+                    self.log.error("Some error occured: " + resp['message'])
+                    return
+                model_id = response.json()['modelId']
+                uploaded = ()
+            self.upload_model_parts(model_id, rawModel, part_size=n, workers=workers, uploaded=uploaded, progress=progress)
+            self.log.info("Model with id: " + model_id + " created. Please visit the application to proceed")
+            return model_id
+
+    def upload_model_parts(self, model_id, raw_model: str, part_size: int = 2000000, workers: int = 4
+                           , uploaded: Iterable[int] = (), progress: Callable[[int, int], None] = None):
+        """
+        Uploads the base64 encoded model in parts of `part_size` characters, `workers` at a time.
+
+        The parts are sliced from `raw_model` as they are posted, so only the parts being
+        uploaded are copied. The parts in `uploaded` are skipped. Returns the numbers of the
+        uploaded parts, or raises a ModelUploadError holding them if some parts failed.
+        """
+        total = math.ceil(len(raw_model) / part_size)
+        uploaded = set(uploaded)
+
+        def post(i):
+            part = {'modelId': model_id, 'partNumber': i, 'totalParts': total
+                    , 'part': raw_model[i * part_size:(i + 1) * part_size]}
+            json_r = json.dumps(part, cls=JaqpotSerializer)
+            return models_api.post_model_part(self.base_url, self.api_key, model_id, json_r, self.log
+                                              , session=self.session)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(total=total, initial=len(uploaded)) as bar:
+            futures = {executor.submit(post, i): i for i in range(total) if i not in uploaded}
+            for future in as_completed(futures):
+                if future.result() is not None:
+                    uploaded.add(futures[future])
+                    bar.update()
+                    if progress is not None:
+                        progress(len(uploaded), total)
+        if len(uploaded) < total:
+            raise ModelUploadError(model_id, uploaded, total)
+        return uploaded
 
     def deploy_sklearn_unsupervised(self, model, X, title, description, model_meta=False, doa=None):
         """
@@ -588,7 +644,7 @@ class Jaqpot:
                                               additionalInfo)
         j = json.dumps(pretrained, cls=JaqpotSerializer)
         if doa is None:
-            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
             if response.status_code < 300:
                 resp = response.json()
                 self.log.info("Model with id: " + resp['modelId'] + " created. Please visit the application to proceed")
@@ -598,7 +654,7 @@ class Jaqpot:
                 self.log.error("Some error occured: " + resp['message'])
                 return
         else:
-            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
             if response.status_code < 300:
                 resp = response.json()
                 self.log.info("Model with id: " + resp['modelId'] + " created. Storing Domain of applicability")
@@ -616,7 +672,7 @@ class Jaqpot:
             b = jha.calculate_doa_matrix(X)
             doa = help.create_doa(inv_m=b.values.tolist(), a=a, modelid=resp['modelId'])
             j = json.dumps(doa, cls=JaqpotSerializer)
-            resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log)
+            resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log, session=self.session)
             if resp == 201:
                 self.log.info("Stored Domain of applicability. Visit the application to proceed")
                 return modid
@@ -678,7 +734,7 @@ class Jaqpot:
         # j = json.dumps(pretrained)
         j = json.dumps(pretrained, cls=JaqpotSerializer)
         if doa is None:
-            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
             if response.status_code < 300:
                 resp = response.json()
                 self.log.info("Model with id: " + resp['modelId'] + " created. Please visit the application to proceed")
@@ -688,7 +744,7 @@ class Jaqpot:
                 self.log.error("Some error occured: " + resp['message'])
                 return
         else:
-            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log)
+            response = models_api.post_pretrained_model(self.base_url, self.api_key, j, self.log, session=self.session)
             if response.status_code < 300:
                 resp = response.json()
                 self.log.info("Model with id: " + resp['modelId'] + " created. Storing Domain of applicability")
@@ -707,7 +763,7 @@ class Jaqpot:
             # results = loop.run_until_complete(all_groups)
             doa = help.create_doa(inv_m=b.values.tolist(), a=a, modelid=resp['modelId'])
             j = json.dumps(doa, cls=JaqpotSerializer)
-            resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log)
+            resp = doa_api.post_models_doa(self.base_url, self.api_key, j, self.log, session=self.session)
             if resp == 201:
                 self.log.info("Stored Domain of applicability. Visit the application to proceed")
                 return modid
@@ -728,7 +784,7 @@ class Jaqpot:
             The particular model.
 
         """
-        return models_api.get_model(self.base_url, self.api_key, model, self.log)
+        return models_api.get_model(self.base_url, self.api_key, model, self.log, session=self.session)
 
     def get_raw_model_by_id(self, model):
         """
@@ -748,11 +804,11 @@ class Jaqpot:
 
         # raw_model = models_api.get_raw_model(self.base_url, self.api_key, model, self.log)
 
-        validating = jaqlogin.validate_api_key(self.base_url, self.api_key)
+        validating = jaqlogin.validate_api_key(self.base_url, self.api_key, session=self.session)
         if validating is not True:
             self.log.error(validating)
         else:
-            return models_api.get_raw_model(self.base_url, self.api_key, model, self.log)
+            return models_api.get_raw_model(self.base_url, self.api_key, model, self.log, session=self.session)
 
     def get_feature_by_id(self, feature):
         """
@@ -770,7 +826,7 @@ class Jaqpot:
             The particular feature.
 
         """
-        return featapi.get_feature(self.base_url, self.api_key, feature)
+        return featapi.get_feature(self.base_url, self.api_key, feature, session=self.session)
 
     def get_my_models(self, minimum, maximum):
         """
@@ -789,7 +845,7 @@ class Jaqpot:
             The models of the user.
 
         """
-        return models_api.get_my_models(self.base_url, self.api_key, minimum, maximum, self.log)
+        return models_api.get_my_models(self.base_url, self.api_key, minimum, maximum, self.log, session=self.session)
 
     
     def get_orgs_models(self, organization, minimum, maximum):
@@ -811,7 +867,7 @@ class Jaqpot:
             The models of the organization.
 
         """
-        return models_api.get_orgs_models(self.base_url, self.api_key, organization, minimum, maximum, self.log)
+        return models_api.get_orgs_models(self.base_url, self.api_key, organization, minimum, maximum, self.log, session=self.session)
 
 
     def get_models_by_tag(self, tag, minimum, maximum):
@@ -833,7 +889,7 @@ class Jaqpot:
             The models of the organization.
 
         """
-        return models_api.get_models_by_tag(self.base_url, self.api_key, tag, minimum, maximum, self.log)
+        return models_api.get_models_by_tag(self.base_url, self.api_key, tag, minimum, maximum, self.log, session=self.session)
 
     def get_models_by_tag_and_org(self, organization, tag, minimum, maximum):
         """
@@ -856,7 +912,7 @@ class Jaqpot:
             The models of the organization.
 
         """
-        return models_api.get_models_by_tag(self.base_url, self.api_key, organization, tag, minimum, maximum, self.log)
+        return models_api.get_models_by_tag(self.base_url, self.api_key, organization, tag, minimum, maximum, self.log, session=self.session)
 
 
     def get_dataset(self, dataset):
@@ -878,7 +934,7 @@ class Jaqpot:
         Mazimum rows retrieved: 1000.
         """
 
-        dataRetrieved = data_api.get_dataset(self.base_url, self.api_key, dataset, self.log)
+        dataRetrieved = data_api.get_dataset(self.base_url, self.api_key, dataset, self.log, session=self.session)
 
         feats = ["" for i in range(len(dataRetrieved['features']))]
         
@@ -906,4 +962,4 @@ class Jaqpot:
             The model's domain of applicability.
 
         """
-        return doa_api.get_models_doa(self.base_url, self.api_key, model, self.log)
+        return doa_api.get_models_doa(self.base_url, self.api_key, model, self.log, session=self.session)
@@ -12,12 +12,36 @@ import pandas as pd
 
 import numpy as np
 import base64
+import io
 import torch.nn.functional as nnf
 import pickle
 import os
 import torch
 
 
+def create_inference_session(onnx_model, intra_op_num_threads: int = None, inter_op_num_threads: int = None):
+    """
+    Creates an ONNX Runtime session for an ONNX model.
+
+    Parameters
+    ----------
+    onnx_model: onnx.ModelProto
+        The converted model, e.g. the `inference_model` of a MolecularSKLearn fit.
+    intra_op_num_threads: int, optional (default None)
+        Threads used to parallelize a single operator. None lets ONNX Runtime decide.
+    inter_op_num_threads: int, optional (default None)
+        Threads used to run independent operators. None lets ONNX Runtime decide.
+    """
+    import onnxruntime as rt
+    options = rt.SessionOptions()
+    if intra_op_num_threads is not None:
+        options.intra_op_num_threads = intra_op_num_threads
+    if inter_op_num_threads is not None:
+        options.inter_op_num_threads = inter_op_num_threads
+    return rt.InferenceSession(onnx_model.SerializeToString(), sess_options=options,
+                               providers=['CPUExecutionProvider'])
+
+
 class Model(object):
     _model: Any
     _doa: DOA
@@ -225,12 +249,78 @@ class Model(object):
 
 
 class MolecularModel(Model):
+    _batch_size = 1024
+    _torch_module = None
+    _use_onnx = False
+    _amp = False
+    _onnx_session = None
+    _intra_op_num_threads = None
+    _inter_op_num_threads = None
+    _prediction_array = None
+    _probability_array = None
 
     def __call__(self, smiles, external=None):
         self._smiles = smiles
         self._external = external
         self.infer()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The deserialized model and the ONNX session are rebuilt on first use
+        state.pop('_torch_module', None)
+        state.pop('_onnx_session', None)
+        return state
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, value):
+        self._batch_size = value
+
+    @property
+    def use_onnx(self):
+        return self._use_onnx
+
+    @use_onnx.setter
+    def use_onnx(self, value):
+        self._use_onnx = value
+
+    @property
+    def amp(self):
+        return self._amp
+
+    @amp.setter
+    def amp(self, value):
+        self._amp = value
+
+    @property
+    def intra_op_num_threads(self):
+        return self._intra_op_num_threads
+
+    @intra_op_num_threads.setter
+    def intra_op_num_threads(self, value):
+        self._intra_op_num_threads = value
+        self._onnx_session = None
+
+    @property
+    def inter_op_num_threads(self):
+        return self._inter_op_num_threads
+
+    @inter_op_num_threads.setter
+    def inter_op_num_threads(self, value):
+        self._inter_op_num_threads = value
+        self._onnx_session = None
+
+    @property
+    def prediction_array(self):
+        return self._prediction_array
+
+    @property
+    def probability_array(self):
+        return self._probability_array
+
     def save(self):
         if self.model_title:
             with open(self.model_title + ".jmodel", 'wb') as f:
@@ -274,6 +364,7 @@ class MolecularModel(Model):
             else:
                 data = self._descriptors.featurize_dataframe(self._smiles)
 
+            descriptors = data
             if self.external:
                 ext = pd.DataFrame.from_dict(self.external)
                 data = pd.concat([data, ext], axis=1)
@@ -285,9 +376,10 @@ class MolecularModel(Model):
                 column = data.columns[0]
                 for g in data[column].to_list():
                     from torch_geometric.data import Data
+                    edge_attr = None if g.edge_features is None else torch.FloatTensor(g.edge_features)
                     dat = Data(x=torch.FloatTensor(g.node_features)
                                , edge_index=torch.LongTensor(g.edge_index)
-                               , edge_attr=g.edge_features
+                               , edge_attr=edge_attr
                                , num_nodes=g.num_nodes)
                     graph_data_list.append(dat)
                 self._prediction = []
@@ -308,7 +400,12 @@ class MolecularModel(Model):
                 data = np.array(data_list)
             if self.doa:
                 if self.doa.__name__ == 'SmilesLeverage':
-                    self.doa.predict(self._smiles)
+                    signature = getattr(self._descriptors, '_signature', None)
+                    if signature is not None and signature() == self.doa.featurizer._signature():
+                        # The model already computed the descriptors of the leverage
+                        self.doa.predict(self._smiles, descriptors=descriptors)
+                    else:
+                        self.doa.predict(self._smiles)
                 else:
                     self.doa.predict(data)
             try:
@@ -318,104 +415,11 @@ class MolecularModel(Model):
             except AttributeError as e:
                 pass
             if self.library == ['sklearn']:
-                preds = self.model.predict(data)
-                for p in preds:
-                    try:
-                        if self.preprocessing_y:
-                            for f in self.preprocessing_y:
-                                p = f.inverse_transform(p.reshape(1, -1))
-                    except AttributeError as e:
-                        pass
-                    self._prediction.append(p.tolist())
-                try:
-                    probs = self.model.predict_proba(data)
-                    self._probability = [prob.tolist() for prob in probs]
-
-                except AttributeError as e:
-                    pass
+                self._infer_sklearn(data)
             if self.library == ['torch_geometric', 'torch']:
-                try:
-                    self.model.eval()
-                except AttributeError as e:
-                    with open("./temp_model.pt", "wb") as f:
-                        f.write(self.model)
-                        f.close()
-                    self.model = torch.jit.load("./temp_model.pt")
-                    os.remove("./temp_model.pt")
-                    self.model.eval()
-                from torch_geometric.loader import DataLoader
-                data_loader = DataLoader(graph_data_list, batch_size=1)
-                for data in data_loader:
-                    x = data.x
-                    edge_index = data.edge_index
-                    try:
-                        edge_attributes = torch.Tensor(data.edge_attr[0])
-                    except TypeError:
-                        edge_attributes = None
-
-                    if edge_attributes is not None:
-                        pred = self.model(x, edge_index, edge_attributes, data.batch)
-                    else:
-                        pred = self.model(x, edge_index, data.batch)
-                    if self.modeling_task == "classification":
-                        for p in pred:
-                            prob = nnf.softmax(p, dim=0)
-                            self._probability.append(prob.detach().numpy().tolist())
-                            # self._probability.append(p.detach().numpy().tolist())
-                        pred = pred.argmax(dim=1)
-                        preds = pred.detach().numpy()
-                        for p in preds:
-                            try:
-                                if self.preprocessing_y:
-                                    for f in self.preprocessing_y:
-                                        p = f.inverse_transform(p)
-                            except AttributeError as e:
-                                pass
-                            self._prediction.append(p.tolist())
-                    else:
-                        preds = pred.detach().numpy()
-                        for p in preds:
-                            self._prediction.append(p.tolist())
+                self._infer_torch_geometric(graph_data_list)
             if self.library == ['torch']:
-                try:
-                    self.model.eval()
-                except AttributeError as e:
-                    with open("./temp_model.pt", "wb") as f:
-                        f.write(self.model)
-                        f.close()
-                    self.model = torch.jit.load("./temp_model.pt")
-                    os.remove("./temp_model.pt")
-                    self.model.eval()
-                from torch.utils.data import DataLoader
-                data_loader = DataLoader(data, batch_size=1)
-                for data in data_loader:
-
-                    pred = self.model(data.float())
-                    if self.modeling_task == "classification":
-                        for p in pred:
-                            prob = nnf.softmax(p, dim=0)
-                            self._probability.append(prob.detach().numpy().tolist())
-                            # self._probability.append(p.detach().numpy().tolist())
-                        pred = pred.argmax(dim=1)
-                        preds = pred.detach().numpy()
-                        for p in preds:
-                            try:
-                                if self.preprocessing_y:
-                                    for f in self.preprocessing_y:
-                                        p = f.inverse_transform(p)
-                            except AttributeError as e:
-                                pass
-                            self._prediction.append([p.tolist()])
-                    else:
-                        preds = pred.detach().numpy()
-                        for p in preds:
-                            try:
-                                if self.preprocessing_y:
-                                    for f in self.preprocessing_y:
-                                        p = f.inverse_transform(p)
-                            except AttributeError as e:
-                                pass
-                            self._prediction.append([p.tolist()])
+                self._infer_torch(data)
             # else:
             #     preds = self.model.predict(data)
             # for p in preds:
@@ -429,6 +433,115 @@ class MolecularModel(Model):
             pass
 
 
+    def _load_torch_model(self):
+        """
+        Deserializes the TorchScript bytes of the model once, in memory, and keeps the module
+        for the following calls.
+        """
+        if self._torch_module is None:
+            if isinstance(self.model, (bytes, bytearray)):
+                self._torch_module = torch.jit.load(io.BytesIO(self.model))
+            else:
+                self._torch_module = self.model
+            self._torch_module.eval()
+        return self._torch_module
+
+    def _load_onnx_session(self):
+        """
+        Creates the ONNX Runtime session of the inference model once and keeps it for the
+        following calls.
+        """
+        if self._onnx_session is None:
+            self._onnx_session = create_inference_session(self.inference_model
+                                                          , intra_op_num_threads=self.intra_op_num_threads
+                                                          , inter_op_num_threads=self.inter_op_num_threads)
+        return self._onnx_session
+
+    def _run_onnx(self, data):
+        sess = self._load_onnx_session()
+        input_name = sess.get_inputs()[0].name
+        data = np.ascontiguousarray(data, dtype=np.float32)
+        preds = []
+        probs = []
+        for start in range(0, data.shape[0], self.batch_size):
+            outputs = sess.run(None, {input_name: data[start:start + self.batch_size]})
+            preds.append(np.asarray(outputs[0]))
+            if len(outputs) > 1:
+                proba = outputs[1]
+                if isinstance(proba, list):
+                    # Classifiers converted with zipmap return one {label: probability} per row
+                    proba = np.array([list(row.values()) for row in proba])
+                probs.append(np.asarray(proba))
+        return np.concatenate(preds), np.concatenate(probs) if probs else None
+
+    def _inverse_transform_y(self, preds):
+        try:
+            if self.preprocessing_y:
+                for f in self.preprocessing_y:
+                    preds = f.inverse_transform(preds)
+        except AttributeError as e:
+            pass
+        return preds
+
+    def _set_outputs(self, preds, probs=None):
+        self._prediction_array = preds
+        self._probability_array = probs
+        self._prediction = preds.tolist()
+        self._probability = [] if probs is None else probs.tolist()
+
+    def _infer_sklearn(self, data):
+        if self.use_onnx and getattr(self, 'inference_model', None) is not None:
+            preds, probs = self._run_onnx(data)
+        else:
+            preds = np.asarray(self.model.predict(data))
+            try:
+                probs = np.asarray(self.model.predict_proba(data))
+            except AttributeError as e:
+                probs = None
+        if getattr(self, '_preprocessors_y', None):
+            # Each prediction is inverse transformed as a (1, n_targets) row
+            preds = self._inverse_transform_y(preds.reshape(preds.shape[0], -1))
+            preds = np.asarray(preds)[:, np.newaxis, :]
+        self._set_outputs(preds, probs)
+
+    def _infer_torch(self, data):
+        model = self._load_torch_model()
+        data = np.asarray(data, dtype=np.float32)
+        outputs = []
+        # Models trained with mixed precision also run their inference in bfloat16
+        with torch.inference_mode(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.amp):
+            for start in range(0, data.shape[0], self.batch_size):
+                batch = torch.from_numpy(data[start:start + self.batch_size])
+                outputs.append(model(batch).float())
+        out = torch.cat(outputs) if outputs else torch.zeros((0, 1))
+        if self.modeling_task == "classification":
+            probs = nnf.softmax(out, dim=1).numpy()
+            preds = self._inverse_transform_y(out.argmax(dim=1).numpy())
+            self._set_outputs(np.asarray(preds)[:, np.newaxis], probs)
+        else:
+            preds = self._inverse_transform_y(out.numpy())
+            self._set_outputs(np.asarray(preds)[:, np.newaxis])
+
+    def _infer_torch_geometric(self, graph_data_list):
+        from torch_geometric.loader import DataLoader
+        model = self._load_torch_model()
+        outputs = []
+        with torch.inference_mode():
+            for data in DataLoader(graph_data_list, batch_size=self.batch_size):
+                if data.edge_attr is not None:
+                    pred = model(data.x, data.edge_index, data.edge_attr, data.batch)
+                else:
+                    pred = model(data.x, data.edge_index, data.batch)
+                outputs.append(pred)
+        out = torch.cat(outputs) if outputs else torch.zeros((0, 1))
+        if self.modeling_task == "classification":
+            probs = nnf.softmax(out, dim=1).numpy()
+            preds = self._inverse_transform_y(out.argmax(dim=1).numpy())
+            self._set_outputs(np.asarray(preds), probs)
+        else:
+            self._set_outputs(out.numpy())
+
+
 class MaterialModel(Model):
 
     def __call__(self, compositions: Iterable[str] = None, structures: Union[Iterable[Structure], Iterable[Dict]] = None, external=None):
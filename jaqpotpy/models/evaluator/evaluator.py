@@ -1,4 +1,5 @@
-from typing import Dict, Callable, Any, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Callable, Any, Iterable, Optional
 from jaqpotpy.datasets.molecular_datasets import SmilesDataset
 
 
@@ -22,9 +23,20 @@ class Evaluator:
 
 
 class GenerativeEvaluator:
+    """
+    Multiplies the registered scoring functions into the reward of a batch of generated molecules.
+
+    The molecules are wrapped in a MoleculeBatch once per reward, so the scoring functions of
+    `jaqpotpy.models.generative.molecular_metrics` share their SMILES, Morgan fingerprints and
+    per molecule scores. The dataset is kept as a ReferenceSet, with a hashed set for the
+    novelty checks and the reference fingerprints of the diversity scores. With
+    `register_workers`, the per molecule scores are computed in a process pool.
+    """
     functions: Dict[str, Callable] = {}
     eval_functions: Dict[str, Callable] = {}
     dataset: Iterable[str]
+    n_jobs: int = 1
+    pool: Optional[ProcessPoolExecutor] = None
 
     def __init__(self):
         pass
@@ -39,13 +51,26 @@ class GenerativeEvaluator:
 
     @classmethod
     def register_dataset(cls, dataset: Iterable[str]):
-        cls.dataset = dataset
-        # dataset = dataset
+        from jaqpotpy.models.generative.molecular_metrics import reference_set
+        cls.dataset = reference_set(dataset)
+
+    @classmethod
+    def register_workers(cls, n_jobs: int):
+        """Computes the per molecule scores in a pool of `n_jobs` processes, in this process if 1"""
+        if cls.pool is not None:
+            cls.pool.shutdown()
+        cls.n_jobs = n_jobs
+        cls.pool = ProcessPoolExecutor(n_jobs) if n_jobs > 1 else None
 
     def __getitem__(self):
         return self
 
+    def molecule_batch(self, mols):
+        from jaqpotpy.models.generative.molecular_metrics import MoleculeBatch
+        return MoleculeBatch(mols, pool=self.pool, n_jobs=self.n_jobs)
+
     def get_reward(self, mols):
+        mols = self.molecule_batch(mols)
         rr = 1.
         for key in self.functions.keys():
             try:
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from rdkit import Chem
+from jaqpotpy.models.evaluator import GenerativeEvaluator
+import jaqpotpy.models.generative.molecular_metrics as molecular_metrics
+from jaqpotpy.models.generative.molecular_metrics import MoleculeBatch, ScoreTable, ReferenceSet, diversity_scores \
+    , natural_products_score, novel_scores, synthetic_accessibility_score_scores \
+    , quantitative_estimation_druglikeness_scores, compute_SAS
+
+
+class TestRewards(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.data = ["CCOc1cccc(NC(=O)NCc2ccc(N3CCSCC3)cc2)c1", "O=C(Cc1cccc(F)c1F)Nc1cccc(Br)n1",
+                     "CCN1CCC(=NNC(=O)c2ccccc2)CC1", "c1ccc2nc(NCCCc3nc4ccccc4[nH]3)cnc2c1",
+                     "O=C(NCc1cccs1)C1(c2cccc(Cl)c2)CCC1"]
+        self.generated = ["CCN1CCC(=NNC(=O)c2ccccc2)CC1", "CC(=O)c1ccc(S(=O)(=O)N2CCCC[C@H]2C)cc1",
+                          "O=C(NCc1nccc2ccccc12)c1ccc[nH]c1=O", "CCCC(=O)N[C@@H]1CCC[NH+](Cc2ncccc2C)C1"]
+        self.mols = [Chem.MolFromSmiles(smiles) for smiles in self.generated] + [None]
+
+    def test_batch_shares_scores(self):
+        batch = MoleculeBatch(self.mols)
+        sas = synthetic_accessibility_score_scores(batch)
+        counts = batch.scores('morgan')
+        natural_products_score(batch)
+        assert batch.scores('morgan') is counts
+        assert sas[-1] == 0
+        assert np.allclose(sas[:-1], [compute_SAS(mol) for mol in self.mols[:-1]])
+        assert batch.smiles[-1] is None
+
+    def test_reference_set(self):
+        reference = ReferenceSet(self.data, n_fingerprints=3)
+        assert self.data[2] in reference
+        assert self.generated[1] not in reference
+        assert list(novel_scores(self.mols, reference)) == [False, True, True, True, False]
+        assert reference.fingerprints is reference.fingerprints
+        assert len(reference.fingerprints) == 3
+        scores = diversity_scores(self.mols, reference)
+        assert scores.shape == (5,) and scores[-1] == 0
+
+    def test_reward_pool(self):
+        # The scoring functions are registered on the class, shared by all the evaluators
+        registered = GenerativeEvaluator.functions
+        GenerativeEvaluator.functions = {}
+        gen_eval = GenerativeEvaluator()
+        gen_eval.register_scoring_function("QED", quantitative_estimation_druglikeness_scores)
+        gen_eval.register_scoring_function("Synthetic Accessibility", synthetic_accessibility_score_scores)
+        gen_eval.register_scoring_function("Novel", novel_scores)
+        gen_eval.register_dataset(self.data)
+        assert isinstance(gen_eval.dataset, ReferenceSet)
+        rewards = gen_eval.get_reward(self.mols * 4)
+        try:
+            gen_eval.register_workers(2)
+            assert np.allclose(gen_eval.get_reward(self.mols * 4), rewards)
+        finally:
+            gen_eval.register_workers(1)
+            GenerativeEvaluator.functions = registered
+        assert rewards.shape == (20, 1)
+
+    def test_score_table(self):
+        table = ScoreTable.from_dict({7: 0.5, 3: -1.0, 11: 2.0})
+        assert list(table.keys) == [3, 7, 11]
+        assert list(table.lookup([11, 3, 5, 12], -4)) == [2.0, -1.0, -4, -4]
+        assert table.get(7) == 0.5 and table.get(1, 0) == 0
+        with tempfile.TemporaryDirectory() as directory:
+            table.save(os.path.join(directory, 'table'))
+            mapped = ScoreTable.load(os.path.join(directory, 'table'))
+            assert isinstance(mapped.keys, np.memmap)
+            assert list(mapped.lookup([11, 3, 5], 0)) == [2.0, -1.0, 0]
+
+    def test_compact_models(self):
+        sas = synthetic_accessibility_score_scores(self.mols)
+        nps = natural_products_score(self.mols)
+        assert isinstance(molecular_metrics.SA_model, dict)
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                molecular_metrics.use_compact_models(directory)
+                assert isinstance(molecular_metrics.score_model('SA'), ScoreTable)
+                assert np.allclose(synthetic_accessibility_score_scores(self.mols), sas)
+                assert np.allclose(natural_products_score(self.mols), nps)
+            finally:
+                del os.environ[molecular_metrics.SCORE_MODELS_ENV]
+                molecular_metrics._score_models.clear()
@@ -1,4 +1,5 @@
 import datetime
+import logging
 import os
 import time
 
@@ -91,6 +92,9 @@ class GanSolver(object):
 
         self.BOND_DIM = self.dataset.featurizer.BOND_DIM
         self.MAX_ATOMS = self.dataset.featurizer.MAX_ATOMS
+        self.real_mols = None
+        self.real_smiles = None
+        self.real_rewards = None
         self.build_env()
 
     def build_env(self):
@@ -151,21 +155,41 @@ class GanSolver(object):
         self.d_optim.zero_grad()
         self.v_optim.zero_grad()
 
+    def build_reals(self, chunk_size: int = 1024):
+        """
+        Decodes the real molecules of the dataset once, into the `real_mols`, `real_smiles`
+        and `real_rewards` tables indexed like the dataset, so that the training steps look
+        the real batches up instead of decoding and scoring them every epoch.
+
+        The rewards are computed on all the real molecules at once, so scoring functions that
+        score the whole batch (e.g. uniqueness) score them against the whole dataset.
+        """
+        mols = []
+        for start in range(0, len(self.dataset), chunk_size):
+            graphs = [self.dataset[idx][2] for idx in range(start, min(start + chunk_size, len(self.dataset)))]
+            node_features = np.stack([graph[0].numpy() for graph in graphs])
+            adjacency = np.stack([graph[1].numpy() for graph in graphs])
+            mols.extend(self.dataset.featurizer.defeaturize_batch(adjacency, node_features
+                                                                  , sanitize=False, cleanup=False))
+        self.real_mols = mols
+        self.real_smiles = [Chem.MolToSmiles(m) if m is not None else None for m in mols]
+        self.real_rewards = self.evaluator.get_reward(mols)
+
+    def decode(self, edges_hat, nodes_hat):
+        """
+        Decodes a batch of generated graphs into molecules, None for the graphs that do not
+        decode. The argmax and one hot steps run on the whole batch at once.
+        """
+        adjacency = F.one_hot(torch.argmax(edges_hat, dim=3), num_classes=self.BOND_DIM).permute(0, 3, 1, 2)
+        nodes = F.one_hot(torch.argmax(nodes_hat, dim=2), num_classes=self.MAX_ATOMS)
+        return self.dataset.featurizer.defeaturize_batch(adjacency.cpu().numpy(), nodes.cpu().numpy())
+
     def fit(self):
         the_step = self.num_steps
+        if self.real_rewards is None:
+            self.build_reals()
         for epoch_i in range(self.epochs):
             for a_step, i in enumerate(self.data_loader):
-                nod_fs = torch.split(i[2][0], 1)
-                adc_mat = torch.split(i[2][1], 1)
-                mols = []
-                mol_strings = []
-                for ind, n in enumerate(nod_fs):
-                    g2 = GraphMatrix(torch.squeeze(adc_mat[ind]).cpu().detach().numpy(),
-                                     torch.squeeze(n).cpu().detach().numpy())
-                    m = self.dataset.featurizer._defeaturize(g2, sanitize=False, cleanup=False)
-                    mol_strings.append(Chem.MolToSmiles(m))
-                    mols.append(m)
-
                 if epoch_i < 0:
                     cur_la = 0
                 else:
@@ -218,33 +242,15 @@ class GanSolver(object):
                 value_logit_real, _ = self.value_network(a_tensor, None, x_tensor, torch.sigmoid)
                 value_logit_fake, _ = self.value_network(edges_hat, None, nodes_hat, torch.sigmoid)
 
-                mols_hat = []
-
-                nod_fs = torch.split(nodes_hat, 1)
-                adc_mat = torch.split(edges_hat, 1)
-                for ind, n in enumerate(nod_fs):
-
-                    adjacency = torch.argmax(adc_mat[ind], dim=3)
-                    adjacency = torch.nn.functional.one_hot(adjacency, num_classes=self.BOND_DIM)
-                    adjacency = torch.squeeze(adjacency)
-                    adjacency = torch.permute(adjacency, (2, 0, 1))
-
-                    nodes = torch.argmax(n, dim=2)
-                    nodes = torch.nn.functional.one_hot(nodes, num_classes=self.MAX_ATOMS)
-
-                    g2 = GraphMatrix(adjacency.detach().numpy(),
-                                     torch.squeeze(nodes).cpu().detach().numpy())
-
-                    t = self.dataset.featurizer.defeaturize(g2)
-                    if t.size == 0:
-                        mols_hat.append(None)
-                    else:
-                        if t[0] is not None:
-                            print(Chem.MolToSmiles(t[0]))
-                        mols_hat.append(t[0])
+                with torch.no_grad():
+                    mols_hat = self.decode(edges_hat, nodes_hat)
+                if self.logger.isEnabledFor(logging.DEBUG):
+                    for mol in mols_hat:
+                        if mol is not None:
+                            self.logger.debug(Chem.MolToSmiles(mol))
 
                 # Real Reward
-                reward_r = torch.from_numpy(self.evaluator.get_reward(mols)).to(self.device)
+                reward_r = torch.from_numpy(self.real_rewards[i[1].numpy()]).to(self.device)
                 # Fake Reward
                 reward_f = torch.from_numpy(self.evaluator.get_reward(mols_hat)).to(self.device)
 
@@ -279,21 +285,13 @@ class GanSolver(object):
                 # train_step_V = torch.from_numpy(np.full(1, train_step_V))
                 # train_step_V.requires_grad = True
 
-                self.logger.info("Reward from reals for epoch "
-                      + str(epoch_i) + " step " + str(cur_step - self.num_steps * epoch_i)
-                      + ": " + str(np.mean(reward_r.cpu().detach().numpy())))
-                self.logger.info("Reward from fakes for epoch "
-                      + str(epoch_i) + " step " + str(cur_step - self.num_steps * epoch_i)
-                      + ": " + str(np.mean(reward_f.cpu().detach().numpy())))
-                self.logger.info("Generator loss for epoch "
-                                 + str(epoch_i) + " step " + str(cur_step - self.num_steps * epoch_i)
-                                 + ": " + str(loss_G.cpu().detach().numpy()))
-                self.logger.info("Discriminator loss for epoch "
-                                 + str(epoch_i) + " step " + str(cur_step - self.num_steps * epoch_i)
-                                 + ": " + str(loss_V.cpu().detach().numpy()))
-                self.logger.info("Value loss for epoch "
-                                 + str(epoch_i) + " step " + str(cur_step - self.num_steps * epoch_i)
-                                 + ": " + str(loss_RL.cpu().detach().numpy()))
+                if self.logger.isEnabledFor(logging.INFO):
+                    step = str(epoch_i) + " step " + str(cur_step - self.num_steps * epoch_i)
+                    self.logger.info("Reward from reals for epoch " + step + ": " + str(reward_r.mean().item()))
+                    self.logger.info("Reward from fakes for epoch " + step + ": " + str(reward_f.mean().item()))
+                    self.logger.info("Generator loss for epoch " + step + ": " + str(loss_G.item()))
+                    self.logger.info("Discriminator loss for epoch " + step + ": " + str(loss_V.item()))
+                    self.logger.info("Value loss for epoch " + step + ": " + str(loss_RL.item()))
 
                 self.reset_grad()
 
@@ -424,6 +422,7 @@ class GanSolver(object):
         et = time.time() - self.start_time
         et = str(datetime.timedelta(seconds=et))[:-7]
         log = "Elapsed [{}], Iteration [{}/{}]:".format(et, epoch_i + 1, self.epochs)
+        mols = self.evaluator.molecule_batch(mols)
         for key in self.evaluator.eval_functions.keys():
             function_name = key
             f = self.evaluator.eval_functions.get(key)
@@ -441,6 +440,7 @@ class GanSolver(object):
         save_mol_img(mols, mol_f_name)
 
     def reward(self, mols):
+        mols = self.evaluator.molecule_batch(mols)
         rr = 1.
         for m in ('logp,sas,qed,unique' if self.metric == 'all' else self.metric).split(','):
 
@@ -6,8 +6,12 @@ from rdkit.Chem import AllChem
 from rdkit.Chem import Draw
 import pickle
 import gzip
+import os
+import tempfile
 import numpy as np
 import math
+from concurrent.futures import Executor
+from itertools import repeat
 
 import pkg_resources
 from typing import Iterable, Any
@@ -15,8 +19,113 @@ from typing import Iterable, Any
 NP_file = pkg_resources.resource_filename('jaqpotpy.models.generative.data', 'NP_score.pkl.gz')
 SA_file = pkg_resources.resource_filename('jaqpotpy.models.generative.data', 'SA_score.pkl.gz')
 
-NP_model = pickle.load(gzip.open(NP_file))
-SA_model = {i[j]: float(i[0]) for i in pickle.load(gzip.open(SA_file)) for j in range(1, len(i))}
+# A directory of memory mapped ScoreTables to load the score models from, see `use_compact_models`
+SCORE_MODELS_ENV = 'JAQPOTPY_SCORE_MODELS'
+
+
+class ScoreTable(object):
+    """
+    A fragment score model as sorted int64 fragment keys and float32 scores, looked up with
+    `np.searchsorted`. It takes a fraction of the memory of the dict the pickle loads into and,
+    saved as .npy files, it is memory mapped, so all the processes that score molecules share
+    the same pages.
+    """
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray):
+        self.keys = keys
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, model: dict):
+        keys = np.fromiter(model.keys(), dtype=np.int64, count=len(model))
+        values = np.fromiter(model.values(), dtype=np.float32, count=len(model))
+        order = np.argsort(keys)
+        return cls(keys[order], values[order])
+
+    @classmethod
+    def load(cls, path: str, mmap_mode='r'):
+        return cls(np.load(path + '.keys.npy', mmap_mode=mmap_mode), np.load(path + '.values.npy', mmap_mode=mmap_mode))
+
+    def save(self, path: str):
+        # Written under temporary names and renamed, so processes building the same table do not clash
+        for suffix, array in (('.keys.npy', self.keys), ('.values.npy', self.values)):
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp, path + suffix)
+
+    def lookup(self, keys, default) -> np.ndarray:
+        """The scores of the `keys`, `default` for the keys that are not in the table"""
+        keys = np.asarray(keys, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[idx] == keys, self.values[idx], default)
+
+    def get(self, key, default=None):
+        idx = np.searchsorted(self.keys, key)
+        if idx < len(self.keys) and self.keys[idx] == key:
+            return float(self.values[idx])
+        return default
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def _load_NP_model():
+    return pickle.load(gzip.open(NP_file))
+
+
+def _load_SA_model():
+    return {i[j]: float(i[0]) for i in pickle.load(gzip.open(SA_file)) for j in range(1, len(i))}
+
+
+_LOADERS = {'NP': _load_NP_model, 'SA': _load_SA_model}
+_score_models = {}
+
+
+def score_model(name: str):
+    """
+    The 'NP' or 'SA' fragment score model, unpickled on first use rather than on import.
+    It is a dict, or a memory mapped ScoreTable if the `JAQPOTPY_SCORE_MODELS` environment
+    variable names a directory of them.
+    """
+    model = _score_models.get(name)
+    if model is None:
+        directory = os.environ.get(SCORE_MODELS_ENV)
+        if directory:
+            path = os.path.join(directory, name + '_score')
+            if not os.path.exists(path + '.values.npy'):
+                os.makedirs(directory, exist_ok=True)
+                ScoreTable.from_dict(_LOADERS[name]()).save(path)
+            model = ScoreTable.load(path)
+        else:
+            model = _LOADERS[name]()
+        _score_models[name] = model
+    return model
+
+
+def use_compact_models(directory: str = None):
+    """
+    Switches the NP and SA score models to ScoreTables memory mapped from `directory`, and
+    builds them there from the pickles the first time. The directory is exported in
+    `JAQPOTPY_SCORE_MODELS`, so worker processes started afterwards map the same files instead
+    of unpickling the models again.
+
+    The scores are stored as float32, so the SA and NP scores can differ from the ones of the
+    pickled models in the seventh significant digit.
+    """
+    if directory is None:
+        directory = os.path.join(tempfile.gettempdir(), 'jaqpotpy_score_models')
+    os.environ[SCORE_MODELS_ENV] = directory
+    _score_models.clear()
+    for name in _LOADERS:
+        score_model(name)
+
+
+def __getattr__(name):
+    # NP_model and SA_model used to be loaded on import
+    if name in ('NP_model', 'SA_model'):
+        return score_model(name[:2])
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 
 def validate_molecule(mol):
@@ -28,17 +137,9 @@ def validate_molecule(mol):
 
 
 def novel_score(mols: Iterable[Any], smiles: Iterable[str]):
-    valid_mols = []
-    valid_smiles = []
-    for mol in mols:
-        smiles_v = validate_molecule(mol)
-        if smiles_v:
-            valid_smiles.append(smiles_v)
-            valid_mols.append(Chem.MolFromSmiles(smiles_v))
-        else:
-            valid_mols.append(None)
-            valid_smiles.append(None)
-    ar = np.full((1, len(valid_mols)), True, dtype=bool)
+    valid_smiles = [smiles_v if smiles_v else None for smiles_v in molecule_batch(mols).smiles]
+    smiles = reference_set(smiles)
+    ar = np.full((1, len(valid_smiles)), True, dtype=bool)
     for index, v_smile in enumerate(valid_smiles):
         if v_smile not in smiles:
             ar[0][index] = v_smile
@@ -80,18 +181,28 @@ def valids(mols):
     return valids
 
 
-def compute_SAS(mol):
+def morgan_counts(mol):
+    """The counts of the radius 2 Morgan fingerprint of a molecule, shared by the SA and NP scores"""
+    return Chem.rdMolDescriptors.GetMorganFingerprint(mol, 2).GetNonzeroElements()
+
+
+def compute_SAS(mol, fps=None):
     if mol is None:
         return 0
-    fp = Chem.rdMolDescriptors.GetMorganFingerprint(mol, 2)
-    fps = fp.GetNonzeroElements()
+    if fps is None:
+        fps = morgan_counts(mol)
     score1 = 0.
     nf = 0
-    # for bitId, v in fps.items():
-    for bitId, v in fps.items():
-        nf += v
-        sfp = bitId
-        score1 += SA_model.get(sfp, -4) * v
+    SA_model = score_model('SA')
+    if isinstance(SA_model, ScoreTable):
+        counts = np.fromiter(fps.values(), dtype=np.int64, count=len(fps))
+        nf = int(counts.sum())
+        score1 = float(np.dot(SA_model.lookup(list(fps.keys()), -4), counts))
+    else:
+        for bitId, v in fps.items():
+            nf += v
+            sfp = bitId
+            score1 += SA_model.get(sfp, -4) * v
     try:
         score1 /= nf
     except ZeroDivisionError as e:
@@ -153,26 +264,31 @@ def _remap(x, x_min, x_max):
     return (x - x_min) / (x_max - x_min)
 
 
+def compute_NP(mol, fps=None):
+    if fps is None:
+        fps = morgan_counts(mol)
+    NP_model = score_model('NP')
+    if isinstance(NP_model, ScoreTable):
+        score = float(NP_model.lookup(list(fps.keys()), 0).sum()) / float(mol.GetNumAtoms())
+    else:
+        score = sum(NP_model.get(bit, 0) for bit in fps) / float(mol.GetNumAtoms())
+    # preventing score explosion for exotic molecules
+    if score > 4:
+        return 4 + math.log10(score - 4 + 1)
+    if score < -4:
+        return -4 - math.log10(-4 - score + 1)
+    return score
+
+
 def synthetic_accessibility_score_scores(mols, norm=False):
-    scores = [compute_SAS(mol) if mol is not None else None for mol in mols]
+    scores = molecule_batch(mols).scores('sas')
     scores = np.array(list(map(lambda x: 0 if x is None else x, scores)))
     scores = np.clip(_remap(scores, 5, 1.5), 0.0, 1.0) if norm else scores
     return scores
 
 
 def natural_products_score(mols, norm=False):
-    # calculating the score
-    scores = [sum(NP_model.get(bit, 0)
-                  for bit in Chem.rdMolDescriptors.GetMorganFingerprint(mol,
-                                                                        2).GetNonzeroElements()) / float(
-        mol.GetNumAtoms()) if mol is not None else None
-              for mol in mols]
-
-    # preventing score explosion for exotic molecules
-    scores = list(map(lambda score: score if score is None else (
-        4 + math.log10(score - 4 + 1) if score > 4 else (
-            -4 - math.log10(-4 - score + 1) if score < -4 else score)), scores))
-
+    scores = molecule_batch(mols).scores('np')
     scores = np.array(list(map(lambda x: -4 if x is None else x, scores)))
     scores = np.clip(_remap(scores, -3, 1), 0.0, 1.0) if norm else scores
 
@@ -187,32 +303,34 @@ def _avoid_sanitization_error(op):
 
 
 def quantitative_estimation_druglikeness_scores(mols, norm=True):
-    return np.array(list(map(lambda x: 0 if x is None else x, [
-        _avoid_sanitization_error(lambda: QED.qed(mol)) if mol is not None else None for mol in
-        mols])))
+    return np.array(list(map(lambda x: 0 if x is None else x, molecule_batch(mols).scores('qed'))))
 
 
 def water_octanol_partition_coefficient_scores(mols, norm=False):
-    scores = [_avoid_sanitization_error(lambda: Crippen.MolLogP(mol)) if mol is not None else None
-              for mol in mols]
+    scores = molecule_batch(mols).scores('logp')
     scores = np.array(list(map(lambda x: -3 if x is None else x, scores)))
     scores = np.clip(_remap(scores, -2.12178879609, 6.0429063424), 0.0, 1.0) if norm else scores
     return scores
 
 
-def _compute_diversity(mol, fps):
-    ref_fps = Chem.rdMolDescriptors.GetMorganFingerprintAsBitVect(mol, 4, nBits=2048)
-    dist = DataStructs.BulkTanimotoSimilarity(ref_fps, fps, returnDistance=True)
+def morgan_bits(mol):
+    """The radius 4, 2048 bits Morgan fingerprint of a molecule, compared by the diversity scores"""
+    return Chem.rdMolDescriptors.GetMorganFingerprintAsBitVect(mol, 4, nBits=2048)
+
+
+def _compute_diversity(mol, fps, mol_fps=None):
+    if mol_fps is None:
+        mol_fps = morgan_bits(mol)
+    dist = DataStructs.BulkTanimotoSimilarity(mol_fps, fps, returnDistance=True)
     score = np.mean(dist)
     return score
 
 
 def diversity_scores(mols, data):
-    rand_mols = np.random.choice(data, 100)
-    fps = [Chem.rdMolDescriptors.GetMorganFingerprintAsBitVect(mol, 4, nBits=2048) for mol in rand_mols]
-
-    scores = np.array(
-        list(map(lambda x: _compute_diversity(x, fps) if x is not None else 0, mols)))
+    mols = molecule_batch(mols)
+    fps = reference_set(data).fingerprints
+    scores = np.array([_compute_diversity(mol, fps, mol_fps) if mol is not None else 0
+                       for mol, mol_fps in zip(mols, mols.scores('morgan_bits'))])
     scores = np.clip(_remap(scores, 0.9, 0.945), 0.0, 1.0)
     return scores
 
@@ -238,13 +356,8 @@ def _constant_bump(x, x_low, x_high, decay=0.025):
 
 
 def novel_scores(mols, data):
-    smiles = []
-    for mol in mols:
-        try:
-            sm = Chem.MolToSmiles(mol)
-            smiles.append(sm)
-        except Exception as e:
-            smiles.append(None)
+    smiles = molecule_batch(mols).smiles
+    data = reference_set(data)
     novel_l = []
     for smile in smiles:
         if smile not in data and smile is not None:
@@ -256,11 +369,12 @@ def novel_scores(mols, data):
 
 
 def drugcandidate_scores(mols, data):
+    mols = molecule_batch(mols)
+    novel = novel_scores(mols, data)
     scores = (_constant_bump(
         water_octanol_partition_coefficient_scores(mols, norm=True), 0.210, 0.945)
               + synthetic_accessibility_score_scores(mols, norm=True)
-              + novel_scores(
-                mols, data) + (1 - novel_scores(mols, data)) * 0.3) / 4
+              + novel + (1 - novel) * 0.3) / 4
 
     return scores
 
@@ -278,6 +392,146 @@ def valid_scores(mols):
     return score
 
 
+def _qed(mol, counts):
+    return _avoid_sanitization_error(lambda: QED.qed(mol))
+
+
+def _logp(mol, counts):
+    return _avoid_sanitization_error(lambda: Crippen.MolLogP(mol))
+
+
+# The per molecule scores of a MoleculeBatch. Each one is given the molecule and its Morgan counts.
+_SCORERS = {
+    'morgan': lambda mol, counts: counts,
+    'morgan_bits': lambda mol, counts: morgan_bits(mol),
+    'sas': compute_SAS,
+    'np': compute_NP,
+    'qed': _qed,
+    'logp': _logp,
+}
+
+_NEEDS_COUNTS = ('morgan', 'sas', 'np')
+
+
+def _score_molecules(names, mols, counts=None):
+    """
+    The `names` scores of the molecules, None for the molecules that are None. The Morgan
+    counts are computed once per molecule, unless they are given.
+    """
+    scores = {name: [] for name in names}
+    needs_counts = any(name in _NEEDS_COUNTS for name in names)
+    for i, mol in enumerate(mols):
+        if mol is None:
+            for name in names:
+                scores[name].append(None)
+            continue
+        mol_counts = None
+        if needs_counts:
+            mol_counts = counts[i] if counts is not None else morgan_counts(mol)
+        for name in names:
+            scores[name].append(_SCORERS[name](mol, mol_counts))
+    return scores
+
+
+class MoleculeBatch(list):
+    """
+    A batch of generated molecules whose SMILES, fingerprints and per molecule scores are
+    computed once and shared by all the scoring functions it is given to.
+
+    It is a list of the molecules, so scoring functions that do not know about it score it
+    as before. The functions of this module look up the canonical `smiles` and the cached
+    `scores` of the batch instead of recomputing them.
+
+    Parameters
+    ----------
+    mols : Iterable
+        The rdkit molecules, None for the molecules that could not be decoded
+    pool : concurrent.futures.Executor
+        A process pool the per molecule scores are computed in, in `n_jobs` * 4 chunks.
+        The scores are computed in this process if None.
+    n_jobs : int
+        The workers of the pool
+    """
+
+    def __init__(self, mols: Iterable[Any], pool: Executor = None, n_jobs: int = 1):
+        super().__init__(mols)
+        self.pool = pool
+        self.n_jobs = n_jobs
+        self.smiles = [validate_molecule(mol) for mol in self]
+        self._scores = {}
+
+    def scores(self, *names):
+        """
+        The per molecule `names` scores, one of 'morgan', 'morgan_bits', 'sas', 'np', 'qed'
+        and 'logp', with None for the molecules that are None. A list is returned for a
+        single name and a tuple of lists for several.
+        """
+        missing = [name for name in names if name not in self._scores]
+        if missing:
+            if 'morgan' not in self._scores and any(name in _NEEDS_COUNTS for name in missing):
+                missing.append('morgan')
+            counts = self._scores.get('morgan')
+            if self.pool is None or len(self) < 2 * self.n_jobs:
+                self._scores.update(_score_molecules(missing, self, counts))
+            else:
+                step = math.ceil(len(self) / (4 * self.n_jobs))
+                chunks = [self[i:i + step] for i in range(0, len(self), step)]
+                count_chunks = [None if counts is None else counts[i:i + step] for i in range(0, len(self), step)]
+                for name in missing:
+                    self._scores[name] = []
+                for chunk_scores in self.pool.map(_score_molecules, repeat(missing), chunks, count_chunks):
+                    for name in missing:
+                        self._scores[name].extend(chunk_scores[name])
+        if len(names) == 1:
+            return self._scores[names[0]]
+        return tuple(self._scores[name] for name in names)
+
+
+def molecule_batch(mols) -> MoleculeBatch:
+    """The molecules as a MoleculeBatch, the same object if they already are one"""
+    return mols if isinstance(mols, MoleculeBatch) else MoleculeBatch(mols)
+
+
+class ReferenceSet(list):
+    """
+    The SMILES (or molecules) of the dataset generated molecules are compared with.
+
+    Membership is checked against a hashed set of the entries, so novelty costs O(1) per
+    molecule instead of a scan of the dataset. The Morgan
+    fingerprints of a random sample of `n_fingerprints` entries are computed once, when the
+    diversity scores first need them, and kept for the following batches.
+
+    Parameters
+    ----------
+    data : Iterable
+        SMILES strings or rdkit molecules
+    n_fingerprints : int
+        The size of the sample the diversity scores are computed against
+    """
+
+    def __init__(self, data: Iterable[Any], n_fingerprints: int = 100):
+        super().__init__(data)
+        self.n_fingerprints = n_fingerprints
+        self._fingerprints = None
+        self._set = set(self)
+
+    def __contains__(self, item):
+        return item in self._set
+
+    @property
+    def fingerprints(self):
+        if self._fingerprints is None:
+            sample = [self[i] for i in np.random.choice(len(self), self.n_fingerprints)]
+            mols = [Chem.MolFromSmiles(entry) if isinstance(entry, str) else entry for entry in sample]
+            self._fingerprints = [morgan_bits(mol) for mol in mols if mol is not None]
+        return self._fingerprints
+
+
+def reference_set(data) -> ReferenceSet:
+    """The data as a ReferenceSet, the same object if it already is one"""
+    return data if isinstance(data, ReferenceSet) else ReferenceSet(data)
+
+
 class MolecularMetrics(object):
 
     @staticmethod
@@ -318,12 +572,14 @@ class MolecularMetrics(object):
 
     @staticmethod
     def novel_scores(mols, smiles):
-        return np.array(
-            list(map(lambda x: MolecularMetrics.valid_lambda(x) and Chem.MolToSmiles(x) not in smiles, mols)))
+        smiles = reference_set(smiles)
+        return np.array([bool(s) and s not in smiles for s in molecule_batch(mols).smiles])
 
     @staticmethod
     def novel_filter(mols, smiles):
-        return list(filter(lambda x: MolecularMetrics.valid_lambda(x) and Chem.MolToSmiles(x) not in smiles, mols))
+        smiles = reference_set(smiles)
+        mols = molecule_batch(mols)
+        return [mol for mol, s in zip(mols, mols.smiles) if s and s not in smiles]
 
     @staticmethod
     def novel_total_score(mols, data):
@@ -343,19 +599,7 @@ class MolecularMetrics(object):
 
     @staticmethod
     def natural_product_scores(mols, norm=False):
-
-        # calculating the score
-        scores = [sum(NP_model.get(bit, 0)
-                      for bit in Chem.rdMolDescriptors.GetMorganFingerprint(mol,
-                                                                            2).GetNonzeroElements()) / float(
-            mol.GetNumAtoms()) if mol is not None else None
-                  for mol in mols]
-
-        # preventing score explosion for exotic molecules
-        scores = list(map(lambda score: score if score is None else (
-            4 + math.log10(score - 4 + 1) if score > 4 else (
-                -4 - math.log10(-4 - score + 1) if score < -4 else score)), scores))
-
+        scores = molecule_batch(mols).scores('np')
         scores = np.array(list(map(lambda x: -4 if x is None else x, scores)))
         scores = np.clip(MolecularMetrics.remap(scores, -3, 1), 0.0, 1.0) if norm else scores
 
@@ -363,33 +607,23 @@ class MolecularMetrics(object):
 
     @staticmethod
     def quantitative_estimation_druglikeness_scores(mols, norm=False):
-        return np.array(list(map(lambda x: 0 if x is None else x, [
-            MolecularMetrics._avoid_sanitization_error(lambda: QED.qed(mol)) if mol is not None else None for mol in
-            mols])))
+        return np.array(list(map(lambda x: 0 if x is None else x, molecule_batch(mols).scores('qed'))))
 
     @staticmethod
     def water_octanol_partition_coefficient_scores(mols, norm=False):
-        scores = [MolecularMetrics._avoid_sanitization_error(lambda: Crippen.MolLogP(mol)) if mol is not None else None
-                  for mol in mols]
+        scores = molecule_batch(mols).scores('logp')
         scores = np.array(list(map(lambda x: -3 if x is None else x, scores)))
         scores = np.clip(MolecularMetrics.remap(scores, -2.12178879609, 6.0429063424), 0.0, 1.0) if norm else scores
 
         return scores
 
-    # @staticmethod
-    # def diversity_scores(mols, data):
-    #     rand_mols = np.random.choice(data, 100)
-    #     fps = [Chem.rdMolDescriptors.GetMorganFingerprintAsBitVect(mol, 4, nBits=2048) for mol in rand_mols]
-    #
-    #     scores = np.array(
-    #         list(map(lambda x: MolecularMetrics.__compute_diversity(x, fps) if x is not None else 0, mols)))
-    #     scores = np.clip(MolecularMetrics.remap(scores, 0.9, 0.945), 0.0, 1.0)
-    #
-    #     return scores
+    @staticmethod
+    def diversity_scores(mols, data):
+        return diversity_scores(mols, data)
 
     @staticmethod
     def synthetic_accessibility_score_scores(mols, norm=False):
-        scores = [MolecularMetrics._compute_SAS(mol) if mol is not None else None for mol in mols]
+        scores = molecule_batch(mols).scores('sas')
         scores = np.array(list(map(lambda x: 10 if x is None else x, scores)))
         scores = np.clip(MolecularMetrics.remap(scores, 5, 1.5), 0.0, 1.0) if norm else scores
 
@@ -404,14 +638,14 @@ class MolecularMetrics(object):
 
     @staticmethod
     def drugcandidate_scores(mols, data):
-
+        mols = molecule_batch(mols)
+        novel = MolecularMetrics.novel_scores(mols, data)
         scores = (MolecularMetrics.constant_bump(
             MolecularMetrics.water_octanol_partition_coefficient_scores(mols, norm=True), 0.210,
             0.945)
                   # + MolecularMetrics.synthetic_accessibility_score_scores(mols,
                   #                                                          norm=True)
-                  + MolecularMetrics.novel_scores(
-                    mols, data) + (1 - MolecularMetrics.novel_scores(mols, data)) * 0.3) / 4
+                  + novel + (1 - novel) * 0.3) / 4
 
         return scores
 
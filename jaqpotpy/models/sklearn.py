@@ -1,4 +1,4 @@
-from jaqpotpy.models.base_classes import Model
+from jaqpotpy.models.base_classes import Model, create_inference_session
 from jaqpotpy.doa.doa import DOA
 from typing import Any, Union, Dict, Optional
 from jaqpotpy.datasets import MolecularDataset
@@ -27,6 +27,7 @@ class MolecularSKLearn(Model):
         self.preprocess: Preprocesses = preprocess
         self.trained_model = None
         self._initial_types = None
+        self._session = None
 
     def __call__(self, smiles):
         self
@@ -92,6 +93,7 @@ class MolecularSKLearn(Model):
         model.external_feats = self.dataset.external
         model.inference_model = self.__convert_to_onnx__(X.shape[1])
         self.inference_model = model.inference_model
+        self._session = None
         if self.evaluator:
             self.__eval__()
         return model
@@ -105,15 +107,20 @@ class MolecularSKLearn(Model):
                               verbose=0)
         return res
 
+    def __session__(self):
+        if self._session is None:
+            self._session = create_inference_session(self.inference_model)
+        return self._session
+
     def __predict__(self, X):
         pre_keys = self.preprocess.fitted_classes.keys()
         for pre_key in pre_keys:
             pre_function = self.preprocess.fitted_classes.get(pre_key)
             X = pre_function.transform(X)
         data = self.dataset.featurizer.featurize(X)
-        sess = rt.InferenceSession(self.model.inference_model.SerializeToString())
+        sess = self.__session__()
         input_name = sess.get_inputs()[0].name
-        pred_onx = sess.run(None, {input_name: data.astype(np.float32)})
+        pred_onx = sess.run(None, {input_name: np.asarray(data, dtype=np.float32)})
         return pred_onx[0].flatten()
 
     def __eval__(self):
@@ -127,10 +134,9 @@ class MolecularSKLearn(Model):
             for pre_key in pre_keys:
                 pre_function = self.preprocess.fitted_classes.get(pre_key)
                 X = pre_function.transform(X)
-        sess = rt.InferenceSession(self.inference_model.SerializeToString())
+        sess = self.__session__()
         input_name = sess.get_inputs()[0].name
-        X = np.array(X.astype(float).copy())
-        preds = sess.run(None, {input_name: X.astype(np.float32)})
+        preds = sess.run(None, {input_name: np.asarray(X, dtype=np.float32)})
         preds = preds[0].flatten()
         # preds = self.trained_model.predict(X)
         preds_t = []
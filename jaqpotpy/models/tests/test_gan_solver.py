@@ -0,0 +1,88 @@
+import unittest
+import numpy as np
+import torch
+from rdkit import Chem
+from torch.utils.data import DataLoader
+from jaqpotpy.cfg import config
+from jaqpotpy.datasets.molecular_datasets import SmilesDataset
+from jaqpotpy.descriptors.molecular import MolGanFeaturizer, GraphMatrix
+from jaqpotpy.models.evaluator import GenerativeEvaluator
+from jaqpotpy.models.generative.gan import GanSolver
+from jaqpotpy.models.generative.models import GanMoleculeGenerator, MoleculeDiscriminator
+from jaqpotpy.models.generative.molecular_metrics import quantitative_estimation_druglikeness_scores, valid_scores
+
+
+def smiles_of(mols):
+    return [Chem.MolToSmiles(mol) if mol is not None else None for mol in mols]
+
+
+class TestGanSolver(unittest.TestCase):
+
+    smiles = ['CCO', 'CC(=O)O', 'c1ccccc1', 'CCN', 'OCC(O)CO', 'CC(C)Cl', 'C1CCOC1', 'CC#N'
+              , 'NCC(=O)O', 'Cc1ccccc1', 'CCCCO', 'O=CC=O']
+
+    def setUp(self):
+        torch.manual_seed(0)
+        np.random.seed(0)
+        config.verbose = False
+        featurizer = MolGanFeaturizer(max_atom_count=9)
+        self.dataset = SmilesDataset(smiles=self.smiles, task="generation", featurizer=featurizer)
+        self.dataset.create()
+        # The scoring functions are registered on the class, shared by all the evaluators
+        self.registered = GenerativeEvaluator.functions
+        GenerativeEvaluator.functions = {}
+        evaluator = GenerativeEvaluator()
+        evaluator.register_scoring_function("Valid", valid_scores)
+        evaluator.register_scoring_function("QED", quantitative_estimation_druglikeness_scores)
+        evaluator.register_dataset(self.smiles)
+        atoms = featurizer.MAX_ATOMS
+        generator = GanMoleculeGenerator([32, 64], 8, 9, featurizer.BOND_DIM, atoms, 0.5)
+        discriminator = MoleculeDiscriminator([[32, 16], 32, [32, 16]], atoms, featurizer.BOND_DIM - 1, 0.5)
+        self.solver = GanSolver(generator=generator, discriminator=discriminator, dataset=self.dataset
+                                , evaluator=evaluator, g_lr=0.001, d_lr=0.001, batch_size=4, epochs=2)
+
+    def tearDown(self):
+        GenerativeEvaluator.functions = self.registered
+        config.verbose = True
+
+    def test_decode(self):
+        featurizer = self.dataset.featurizer
+        a_tensor = torch.stack([self.dataset[idx][2][1] for idx in range(len(self.smiles))]).permute(0, 2, 3, 1)
+        x_tensor = torch.stack([self.dataset[idx][2][0] for idx in range(len(self.smiles))])
+        # The real graphs, then noisy copies of them that decode to other molecules or fail to
+        edges_hat = torch.cat([a_tensor] + [torch.softmax(3 * a_tensor + torch.randn(a_tensor.shape), -1)
+                                            for _ in range(2)])
+        nodes_hat = torch.cat([x_tensor] + [torch.softmax(3 * x_tensor + torch.randn(x_tensor.shape), -1)
+                                            for _ in range(2)])
+
+        # One graph at a time, as GanSolver.fit did before decoding batches
+        expected = []
+        for edges, nodes in zip(torch.split(edges_hat, 1), torch.split(nodes_hat, 1)):
+            adjacency = torch.nn.functional.one_hot(torch.argmax(edges, dim=3), num_classes=featurizer.BOND_DIM)
+            adjacency = torch.permute(torch.squeeze(adjacency), (2, 0, 1))
+            nodes = torch.nn.functional.one_hot(torch.argmax(nodes, dim=2), num_classes=featurizer.MAX_ATOMS)
+            t = featurizer.defeaturize(GraphMatrix(adjacency.numpy(), torch.squeeze(nodes).numpy()))
+            expected.append(None if t.size == 0 else t[0])
+
+        decoded = self.solver.decode(edges_hat, nodes_hat)
+        assert len(decoded) == 3 * len(self.smiles)
+        assert smiles_of(decoded) == smiles_of(expected)
+        assert smiles_of(decoded[:len(self.smiles)]) == [Chem.MolToSmiles(Chem.MolFromSmiles(s)) for s in self.smiles]
+        assert None in decoded
+
+    def test_real_rewards(self):
+        self.solver.build_reals()
+        assert self.solver.real_rewards.shape == (len(self.smiles), 1)
+        featurizer = self.dataset.featurizer
+        for _, idx, (nodes, adjacency) in DataLoader(self.dataset, batch_size=5, shuffle=True):
+            mols = [featurizer._defeaturize(GraphMatrix(a.numpy(), n.numpy()), sanitize=False, cleanup=False)
+                    for a, n in zip(adjacency, nodes)]
+            assert [self.solver.real_smiles[k] for k in idx.numpy()] == smiles_of(mols)
+            assert np.allclose(self.solver.real_rewards[idx.numpy()], self.solver.evaluator.get_reward(mols))
+
+    def test_fit(self):
+        self.solver.fit()
+        assert self.solver.real_rewards is not None
+        z = self.solver.sample_z(3)
+        edges_logits, nodes_logits = self.solver.generator(z)
+        assert edges_logits.shape == (3, 9, 9, self.dataset.featurizer.BOND_DIM)
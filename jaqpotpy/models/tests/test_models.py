@@ -1,6 +1,7 @@
 """
 Tests for Jaqpotpy Models.
 """
+import os
 import unittest
 from jaqpotpy.datasets import MolecularTabularDataset, TorchGraphDataset, SmilesDataset
 from jaqpotpy.descriptors.molecular import MordredDescriptors\
@@ -382,7 +383,37 @@ class TestModels(unittest.TestCase):
             molMod(smile)
             print(molMod.prediction)
 
+    def test_topf_class_batched_inference(self):
+        feat = TopologicalFingerprint()
+        dataset = SmilesDataset(smiles=self.mols, y=self.ys, featurizer=feat, task='classification')
+        dataset.create()
 
+        val = Evaluator()
+        val.dataset = dataset
+        val.register_scoring_function('Accuracy', accuracy_score)
+
+        model_cnn = FFFingerprint()
+        optimizer = torch.optim.Adam(model_cnn.parameters(), lr=0.001, weight_decay=5e-4)
+        criterion = torch.nn.CrossEntropyLoss()
+        model = MolecularTorch(dataset=dataset
+                           , model_nn=model_cnn, eval=val
+                           , train_batch=10, test_batch=10
+                           , epochs=2, optimizer=optimizer, criterion=criterion).fit()
+        model.eval()
+        molMod = model.create_molecular_model()
+        molMod(self.mols)
+        predictions = molMod.prediction
+        probabilities = molMod.probability_array
+
+        molMod.batch_size = 4
+        molMod(self.mols)
+        assert molMod.prediction == predictions
+        assert molMod.prediction_array.shape == (len(self.mols), 1)
+        assert np.allclose(molMod.probability_array, probabilities)
+
+        import pickle
+        state = pickle.loads(pickle.dumps(molMod))
+        assert state._torch_module is None
 
     def test_cnn_class(self):
         feat = SmilesToImage(img_size=60)
@@ -417,6 +448,29 @@ class TestModels(unittest.TestCase):
             molMod(smile)
             print(molMod.prediction)
 
+    def test_torch_amp_lstm(self):
+        feat = TopologicalFingerprint()
+        dataset = SmilesDataset(smiles=self.mols, y=self.ys, featurizer=feat, task='classification')
+        dataset.create()
+        val = Evaluator()
+        val.dataset = dataset
+        val.register_scoring_function('Accuracy', accuracy_score)
+        model_lstm = LSTM_J(2048, 32, 2)
+        optimizer = torch.optim.Adam(model_lstm.parameters(), lr=0.001, weight_decay=5e-4)
+        criterion = torch.nn.CrossEntropyLoss()
+        model = MolecularTorch(dataset=dataset
+                           , model_nn=model_lstm, eval=val
+                           , train_batch=10, test_batch=10
+                           , epochs=3, optimizer=optimizer, criterion=criterion, amp=True).fit()
+        assert model_lstm.hidden_cell[0].dtype == torch.float32
+        assert not model_lstm.hidden_cell[0].requires_grad
+        molMod = model.create_molecular_model()
+        os.remove(model.path)
+        assert molMod.amp
+        molMod(self.mols)
+        assert molMod.prediction_array.shape == (len(self.mols), 1)
+        assert molMod.probability_array.dtype == np.float32
+
     def test_torch_models(self):
         dataset = TorchGraphDataset(smiles=self.mols, y=self.ys, task='classification')
         dataset.create()
@@ -440,6 +494,76 @@ class TestModels(unittest.TestCase):
             model.prediction
 
 
+    def test_torch_models_early_stopping(self):
+        dataset = TorchGraphDataset(smiles=self.mols, y=self.ys, task='classification')
+        dataset.create()
+        val = Evaluator()
+        val.dataset = dataset
+        val.register_scoring_function('Accuracy', accuracy_score)
+        model = GCN_J(30, 3, 40, 2)
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.01, weight_decay=5e-4)
+        criterion = torch.nn.CrossEntropyLoss()
+        m = MolecularTorchGeometric(dataset=dataset
+                                    , model_nn=model, eval=val
+                                    , train_batch=4, test_batch=4
+                                    , epochs=100, optimizer=optimizer, criterion=criterion
+                                    , patience=3, train_eval='running').fit()
+        assert m.best_state['epoch'] < 99
+        assert os.path.exists(m.path)
+        checkpoint = torch.load(m.path)
+        assert checkpoint['epoch'] == m.best_state['epoch']
+        out, pred, score = m.test(m.test_loader)
+        assert len(pred) == len(self.mols)
+        m.eval()
+        os.remove(m.path)
+
+    def test_torch_models_data_loader_params(self):
+        dataset = TorchGraphDataset(smiles=self.mols, y=self.ys, task='classification')
+        dataset.create()
+        val = Evaluator()
+        val.dataset = dataset
+        model = GCN_J(30, 3, 40, 2)
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.01, weight_decay=5e-4)
+        criterion = torch.nn.CrossEntropyLoss()
+        params = {'num_workers': 2, 'persistent_workers': True, 'prefetch_factor': 2
+                  , 'shuffle': True, 'drop_last': True}
+        orders = []
+        for _ in range(2):
+            m = MolecularTorchGeometric(dataset=dataset
+                                        , model_nn=model, eval=val
+                                        , train_batch=4, test_batch=4
+                                        , epochs=3, optimizer=optimizer, criterion=criterion
+                                        , dataLoaderParams=params).fit()
+            orders.append([data.y.tolist() for data in m.train_loader])
+            os.remove(m.path)
+        # The last incomplete batch is only dropped from the train loader
+        assert len(orders[0]) == len(self.mols) // 4
+        assert len(list(m.test_loader)) == -(-len(self.mols) // 4)
+        # Shuffling is seeded with the global seed
+        assert orders[0] == orders[1]
+
+    def test_torch_models_regression_loss(self):
+        import tempfile
+        dataset = TorchGraphDataset(smiles=self.mols, y=self.ys_regr, task='regression')
+        dataset.create()
+        val = Evaluator()
+        val.dataset = dataset
+        model = GCN_REGR()
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.01, weight_decay=5e-4)
+        with tempfile.TemporaryDirectory() as model_dir:
+            m = MolecularTorchGeometric(dataset=dataset
+                                        , model_nn=model, eval=val
+                                        , train_batch=4, test_batch=4, model_dir=model_dir + '/'
+                                        , epochs=3, optimizer=optimizer, criterion=torch.nn.MSELoss()
+                                        , train_eval='running').fit()
+        out, loss = m.test(m.test_loader)
+        ys = torch.tensor(self.ys_regr, dtype=out.dtype).view(-1, 1)
+        assert out.shape == ys.shape
+        assert torch.allclose(loss, F.mse_loss(out, ys))
+        out, loss = m.__score__(*m._running)
+        assert out.shape == m._running[1].shape
+        assert torch.allclose(loss, F.mse_loss(out, m._running[1]))
+
     # def test_load_from_jaqpot(self):
     #     jaqpot = Jaqpot("http://localhost:8080/jaqpot/services/")
     #     model = MolecularModel().load_from_jaqpot(jaqpot=jaqpot, id="XQ1JsTDwCXs4uxZqeUJi")
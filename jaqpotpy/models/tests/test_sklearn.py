@@ -7,7 +7,7 @@ import warnings
 from jaqpotpy.descriptors.molecular import TopologicalFingerprint, RDKitDescriptors, MACCSKeysFingerprint
 from jaqpotpy.datasets import SmilesDataset, MolecularTabularDataset
 from jaqpotpy.models import MolecularSKLearn
-from jaqpotpy.doa.doa import Leverage
+from jaqpotpy.doa.doa import Leverage, SmilesLeverage
 from sklearn.svm import SVC, SVR
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.linear_model import LinearRegression
@@ -61,6 +61,23 @@ class TestModels(unittest.TestCase):
         , 1.0002, 1.008, 1.1234, 0.25567, 0.5647, 0.99887, 1.9897, 1.989, 2.314, 0.112, 0.113, 0.54, 1.123, 1.0001
     ]
 
+    def test_smiles_leverage_reuses_descriptors(self):
+        from unittest import mock
+        smiles = ['COc1ccc2c(N)nn(C(=O)Cc3cccc(Cl)c3)c2c1', 'CN(C)c1ccc(N(Cc2ccsc2)C(=O)Cc2cncc3ccccc23)cc1']
+        leverages = []
+        for featurizer in [RDKitDescriptors(use_fragment=False, ipc_avg=False), RDKitDescriptors()]:
+            dataset = SmilesDataset(smiles=self.mols, y=self.ys_regr, task='regression', featurizer=featurizer)
+            model = MolecularSKLearn(dataset=dataset, doa=SmilesLeverage(), model=LinearRegression(), eval=None).fit()
+            # fit stores RDKitDescriptors by name, keep the configured featurizer instead
+            model.descriptors = featurizer
+            with mock.patch.object(SmilesLeverage, 'predict', autospec=True, side_effect=SmilesLeverage.predict) as predict:
+                model(smiles)
+            # Only the featurizer configured like the leverage's one hands its descriptors over
+            reused = predict.call_args.kwargs.get('descriptors') is not None
+            assert reused == (featurizer._signature() == model.doa.featurizer._signature())
+            leverages.append(list(model.doa.doa_new))
+        assert np.allclose(leverages[0], leverages[1])
+
     def test_RF(self):
         featurizer = MACCSKeysFingerprint()
         dataset = SmilesDataset(smiles=self.mols, y=self.ys, task='classification', featurizer=featurizer)
@@ -104,6 +121,38 @@ class TestModels(unittest.TestCase):
         molecularModel_t1('COc1ccc2c(N)nn(C(=O)Cc3cccc(Cl)c3)c2c1')
         print(molecularModel_t1.probability)
 
+    def test_onnx_inference_classification(self):
+        featurizer = TopologicalFingerprint()
+        dataset = SmilesDataset(smiles=self.mols, y=self.ys, task='classification', featurizer=featurizer)
+        model = RandomForestClassifier(n_estimators=5, random_state=42)
+        molecular_model = MolecularSKLearn(dataset=dataset, doa=None, model=model, eval=None).fit()
+        molecular_model(self.mols)
+        predictions = molecular_model.prediction
+        probabilities = molecular_model.probability_array
+
+        molecular_model.use_onnx = True
+        molecular_model.intra_op_num_threads = 1
+        molecular_model.batch_size = 5
+        molecular_model(self.mols)
+        sess = molecular_model._onnx_session
+        molecular_model(self.mols)
+        assert molecular_model._onnx_session is sess
+        assert molecular_model.prediction == predictions
+        assert np.allclose(molecular_model.probability_array, probabilities, atol=1e-5)
+
+    def test_onnx_inference_regression(self):
+        featurizer = TopologicalFingerprint()
+        dataset = SmilesDataset(smiles=self.mols, y=self.ys_regr, task='regression', featurizer=featurizer)
+        model = LinearRegression()
+        molecular_model = MolecularSKLearn(dataset=dataset, doa=None, model=model, eval=None).fit()
+        molecular_model(self.mols)
+        predictions = molecular_model.prediction_array
+
+        molecular_model.use_onnx = True
+        molecular_model(self.mols)
+        assert len(molecular_model.prediction) == len(self.mols)
+        assert np.allclose(molecular_model.prediction_array.ravel(), predictions.ravel(), atol=1e-3)
+
 
     # # This test runs in local due to import of data and not in mem data.
     # def test_SVM(self):
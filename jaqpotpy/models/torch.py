@@ -12,17 +12,37 @@ from jaqpotpy.models import MolecularModel, MaterialModel
 import numpy as np
 from jaqpotpy.cfg import config
 import os
+import logging
 import jaqpotpy
+from jaqpotpy.utils.pytorch_utils import data_loader_params
+
+logger = logging.getLogger(__name__)
 
 
 class MolecularTorch(Model):
+    """
+    Trains a torch model on a MolecularDataset and keeps the checkpoint that scores best on
+    the evaluator dataset.
+
+    Parameters
+    ----------
+    amp: bool, optional (default False)
+        Runs the forward passes under bfloat16 autocast. The loss is computed in float32 and,
+        bfloat16 having the range of float32, no gradient scaling is needed. The exported
+        MolecularModel runs its inference under the same autocast.
+    compile_model: bool, optional (default False)
+        Compiles `model_nn` with `torch.compile` (inductor backend). The first batches are
+        slower while the graphs are compiled. If compiling fails, e.g. without a C++ compiler,
+        the model runs eagerly. The exported MolecularModel holds the frozen TorchScript model.
+    """
 
     def __init__(self, dataset: MolecularDataset, model_nn: torch.nn.Module
                  , doa: DOA = None
                  , eval: Evaluator = None, preprocess: Preprocesses = None
                  , dataLoaderParams: Any = None, epochs: int = None
                  , criterion: torch.nn.Module = None, optimizer: Any = None
-                 , train_batch: int = 50, test_batch: int = 50, log_steps: int = 1, model_dir: str = "./", device: str = 'cpu', test_metric=(None, 'minimize')):
+                 , train_batch: int = 50, test_batch: int = 50, log_steps: int = 1, model_dir: str = "./", device: str = 'cpu', test_metric=(None, 'minimize')
+                 , amp: bool = False, compile_model: bool = False):
         # super(InMemMolModel, self).__init__(dataset=dataset, doa=doa, model=model)
         self.dataset: MolecularDataset = dataset
         self.model_nn = model_nn
@@ -33,8 +53,7 @@ class MolecularTorch(Model):
         self.preprocess: Preprocesses = preprocess
         self.train_batch = train_batch
         self.test_batch = test_batch
-        self.trainDataLoaderParams = {'batch_size': self.train_batch, 'shuffle': False, 'num_workers': 0}
-        self.testDataLoaderParams = {'batch_size': self.test_batch, 'shuffle': False, 'num_workers': 0}
+        self.dataLoaderParams = dataLoaderParams
         self.epochs = epochs
         self.criterion = criterion
         self.trained_model = None
@@ -47,6 +66,11 @@ class MolecularTorch(Model):
         self.path = None
         self.model_dir = model_dir
         self.device = torch.device(device)
+        self.trainDataLoaderParams = data_loader_params(self.train_batch, dataLoaderParams, train=True, device=self.device)
+        self.testDataLoaderParams = data_loader_params(self.test_batch, dataLoaderParams, train=False, device=self.device)
+        self.amp = amp
+        self.compile_model = compile_model
+        self.compiled_model = None
         self.__default__ = False
         if test_metric[0] is None and dataset.task == 'classification':
             self.__default__ = True
@@ -80,10 +104,12 @@ class MolecularTorch(Model):
         # device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.model_fitted = MolecularModel()
         self.model_nn.to(self.device)
+        if self.compile_model:
+            self.compiled_model = self.__compile__(self.model_nn)
         # self.train_loader = DataLoader(dataset=self.dataset.df, **self.trainDataLoaderParams)
         # self.test_loader = DataLoader(dataset=self.evaluator.dataset.df, **self.testDataLoaderParams)
-        self.train_loader = DataLoader(dataset=self.dataset, **self.trainDataLoaderParams)
-        self.test_loader = DataLoader(dataset=self.evaluator.dataset, **self.testDataLoaderParams)
+        self.train_loader = self.__data_loader__(self.dataset, self.trainDataLoaderParams)
+        self.test_loader = self.__data_loader__(self.evaluator.dataset, self.testDataLoaderParams)
         temp_loss = None
         for epoch in range(1, self.epochs):
             self.train()
@@ -109,9 +135,9 @@ class MolecularTorch(Model):
                 if epoch % self.log_steps == 0:
                     print(f'Epoch: {epoch:03d}, Train Score: {train_loss[2]}, Test Score: {test_loss[2]}')
             else:
-                los = test_loss[1].item()
-                if self.__save_choice__(temp_loss, train_loss[2], los):
-                    temp_loss = [train_loss[1], los]
+                los = float(test_loss[1])
+                if self.__save_choice__(temp_loss, float(train_loss[1]), los):
+                    temp_loss = [float(train_loss[1]), los]
                     temp_path = self.path
                     self.path = self.model_dir + "molecular_model_ep_" + str(epoch) + "_er_" + str(los) + ".pt"
                     torch.save({
@@ -128,6 +154,40 @@ class MolecularTorch(Model):
                     print(f'Epoch: {epoch:03d}, Train Score: {train_loss[1]}, Test Score: {test_loss[1]}')
         return self
 
+    def __data_loader__(self, dataset, params):
+        if getattr(dataset, 'tensor_storage', False):
+            # Whole minibatches are sliced from the dataset arrays at once
+            params = dict(params)
+            sampler = dataset.batch_sampler(params.pop('batch_size'), shuffle=params.pop('shuffle')
+                                            , drop_last=params.pop('drop_last'), generator=params['generator'])
+            return DataLoader(dataset=dataset, sampler=sampler, batch_size=None, **params)
+        return DataLoader(dataset=dataset, **params)
+
+    def __compile__(self, model):
+        if not hasattr(torch, 'compile'):
+            logger.warning("torch %s can not compile models, training in eager mode", torch.__version__)
+            return None
+        try:
+            return torch.compile(model, backend='inductor')
+        except Exception as e:
+            logger.warning("Compiling the model failed, training in eager mode: %s", e)
+            return None
+
+    def __forward__(self, data):
+        input = data[0].to(self.device)
+        y = data[1].to(self.device)
+        with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=self.amp):
+            if self.compiled_model is not None:
+                try:
+                    out = self.compiled_model(input.float())
+                except Exception as e:
+                    # The graphs are compiled lazily, so the backend fails on the first call
+                    logger.warning("Running the compiled model failed, training in eager mode: %s", e)
+                    self.compiled_model = None
+            if self.compiled_model is None:
+                out = self.model_nn(input.float())
+        return out.float(), y
+
     def __save_choice__(self, temp_loss, train_loss, test_loss):
         if self.test_metric[1] == 'minimize':
             if temp_loss is None:
@@ -158,9 +218,7 @@ class MolecularTorch(Model):
     def train(self):
         self.model_nn.train()
         for data in self.train_loader:
-            input = data[0].to(self.device)
-            y = data[1].to(self.device)
-            out = self.model_nn(input.float())
+            out, y = self.__forward__(data)
             if self.dataset.task == 'classification':
                 truth = torch.squeeze(y.long())
                 loss = self.criterion(out, truth)
@@ -169,10 +227,11 @@ class MolecularTorch(Model):
                 loss = self.criterion(out, y.float())
             # loss = self.criterion(out, data[1].float())
             # print(loss)
-            loss.backward(retain_graph=True)
+            loss.backward()
             self.optimizer_local.step()
-            self.optimizer_local.zero_grad()
+            self.optimizer_local.zero_grad(set_to_none=True)
 
+    @torch.no_grad()
     def test(self, dataloader):
         if self.__default__:
             return self.__default_test__(dataloader)
@@ -183,41 +242,33 @@ class MolecularTorch(Model):
             preds = np.array([])
             if self.dataset.task == 'classification':
                 for data in dataloader:
-                    input = data[0].to(self.device)
-                    y = data[1].to(self.device)
-                    out = self.model_nn(input.float())
+                    out, y = self.__forward__(data)
                     y = torch.squeeze(y.long())
-                    preds = np.append(preds, out.argmax(dim=1).cpu().detach().numpy())
-                    truth = np.append(truth, y)
+                    preds = np.append(preds, out.argmax(dim=1).cpu().numpy())
+                    truth = np.append(truth, y.cpu().numpy())
                 return out, out.argmax(dim=1).cpu().numpy(), test_function(truth, preds)
             else:
-                self.model_nn.eval()
                 for data in dataloader:
-                    input = data[0].to(self.device)
-                    y = data[0].to(self.device)
-                    out = self.model_nn(input)
-                    preds = np.append(preds, out.cpu().detach().numpy())
+                    out, y = self.__forward__(data)
+                    preds = np.append(preds, out.cpu().numpy())
+                    truth = np.append(truth, y.cpu().numpy())
                 return out, test_function(truth, preds)
 
+    @torch.no_grad()
     def __default_test__(self, dataloader):
         self.model_nn.eval()
         if self.dataset.task == 'classification':
             correct = 0
             for data in dataloader:
-                input = data[0].to(self.device)
-                y = data[1].to(self.device)
-                out = self.model_nn(input.float())
+                out, y = self.__forward__(data)
                 pred = out.argmax(dim=1)
                 truth = torch.squeeze(y.long())
                 correct += int((pred == truth).sum())
                 loss = self.criterion(out, truth)
             return out, pred.cpu().numpy(), correct / len(dataloader.dataset)
         else:
-            self.model_nn.eval()
             for data in dataloader:
-                input = data[0].to(self.device)
-                y = data[0].to(self.device)
-                out = self.model_nn(input)
+                out, y = self.__forward__(data)
                 loss = self.criterion(out, y.float())
             return out, loss
 
@@ -232,9 +283,8 @@ class MolecularTorch(Model):
             truth = np.array([])
             preds = np.array([])
             for data in self.test_loader:
-                input = data[0].to(self.device)
-                y = data[1].to(self.device)
-                out = self.best_model(input.float())
+                with torch.no_grad():
+                    out, y = self.__forward__(data)
                 pred = out.argmax(dim=1)
                 correct += int((pred == y.float()).sum())
                 truth = np.append(truth, y.cpu().float().numpy())
@@ -256,7 +306,11 @@ class MolecularTorch(Model):
         else:
             model.descriptors = self.dataset.featurizer
         model.doa = self.doa
+        model.amp = self.amp
         model_s = torch.jit.script(self.best_model)
+        if self.compile_model:
+            # Compiled graphs can not be serialized, the TorchScript model is frozen instead
+            model_s = torch.jit.freeze(model_s.eval())
         model_save = torch.jit.save(model_s, "local_temp.pt")
         with open("./local_temp.pt", "rb") as f:
             model.model = f.read()
@@ -292,8 +346,7 @@ class MaterialTorch(Model):
         self.preprocess: Preprocesses = preprocess
         self.train_batch = train_batch
         self.test_batch = test_batch
-        self.trainDataLoaderParams = {'batch_size': self.train_batch, 'shuffle': False, 'num_workers': 0}
-        self.testDataLoaderParams = {'batch_size': self.test_batch, 'shuffle': False, 'num_workers': 0}
+        self.dataLoaderParams = dataLoaderParams
         self.epochs = epochs
         self.criterion = criterion
         self.trained_model = None
@@ -305,6 +358,8 @@ class MaterialTorch(Model):
         self.best_model = None
         self.path = None
         self.device = torch.device(device)
+        self.trainDataLoaderParams = data_loader_params(self.train_batch, dataLoaderParams, train=True, device=self.device)
+        self.testDataLoaderParams = data_loader_params(self.test_batch, dataLoaderParams, train=False, device=self.device)
 
         # torch.multiprocessing.freeze_support()
 
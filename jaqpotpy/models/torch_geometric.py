@@ -1,6 +1,6 @@
 from jaqpotpy.models.base_classes import Model
 from jaqpotpy.doa.doa import DOA
-from typing import Any
+from typing import Any, Union
 from jaqpotpy.datasets import TorchGraphDataset
 from jaqpotpy.models import Evaluator, Preprocesses
 try:
@@ -10,11 +10,14 @@ except ModuleNotFoundError:
     DataLoader = None
     pass
 import torch
+from torch.utils.data import DataLoader as TorchDataLoader, BatchSampler, Subset
 from jaqpotpy.models import MolecularModel
 import numpy as np
 from jaqpotpy.cfg import config
+import copy
 import os
 import jaqpotpy
+from jaqpotpy.utils.pytorch_utils import data_loader_params
 
 
 # class MolecularTorchGeometric(Model):
@@ -188,13 +191,32 @@ import jaqpotpy
 
 
 class MolecularTorchGeometric(Model):
+    """
+    Trainer of torch geometric models on a TorchGraphDataset.
+
+    Every `log_steps` epochs the model is scored on the train and the evaluator datasets,
+    under `torch.inference_mode` and with the metric computed over all the batches. The
+    weights with the best test score are kept in memory and written once, at the end of
+    `fit`, as a checkpoint in `model_dir`.
+
+    Parameters
+    ----------
+    patience: int, default None
+        Stops the training after `patience` evaluations without improvement of the
+        test score. By default all the epochs are run.
+    train_eval: str or int, default 'full'
+        How the train score is computed. 'full' scores the whole train set, an int `n`
+        a fixed random sample of `n` train graphs and 'running' the outputs of the
+        training pass itself, without running the model again.
+    """
 
     def __init__(self, dataset: TorchGraphDataset, model_nn: torch.nn.Module
                  , doa: DOA = None
                  , eval: Evaluator = None, preprocess: Preprocesses = None
                  , dataLoaderParams: Any = None, epochs: int = None
                  , criterion: torch.nn.Module = None, optimizer: Any = None
-                 , train_batch: int = 50, test_batch: int = 50, log_steps: int = 1, model_dir: str = "./", device: str = 'cpu', test_metric=(None, 'minimize')):
+                 , train_batch: int = 50, test_batch: int = 50, log_steps: int = 1, model_dir: str = "./", device: str = 'cpu', test_metric=(None, 'minimize')
+                 , patience: int = None, train_eval: Union[str, int] = 'full'):
         # super(InMemMolModel, self).__init__(dataset=dataset, doa=doa, model=model)
         self.dataset: TorchGraphDataset = dataset
         self.model_nn = model_nn
@@ -205,8 +227,7 @@ class MolecularTorchGeometric(Model):
         self.preprocess: Preprocesses = preprocess
         self.train_batch = train_batch
         self.test_batch = test_batch
-        self.trainDataLoaderParams = {'batch_size': self.train_batch, 'shuffle': False, 'num_workers': 0}
-        self.testDataLoaderParams = {'batch_size': self.test_batch, 'shuffle': False, 'num_workers': 0}
+        self.dataLoaderParams = dataLoaderParams
         self.epochs = epochs
         self.criterion = criterion
         self.trained_model = None
@@ -214,11 +235,20 @@ class MolecularTorchGeometric(Model):
         self.optimizer_local = optimizer
         self.train_loader = None
         self.test_loader = None
+        self.train_eval_loader = None
         self.log_steps = log_steps
         self.best_model = model_nn
+        self.best_state = None
         self.path = None
         self.model_dir = model_dir
         self.device = torch.device(device)
+        self.trainDataLoaderParams = data_loader_params(self.train_batch, dataLoaderParams, train=True, device=self.device)
+        self.testDataLoaderParams = data_loader_params(self.test_batch, dataLoaderParams, train=False, device=self.device)
+        self.patience = patience
+        if train_eval not in ('full', 'running') and not isinstance(train_eval, int):
+            raise ValueError("train_eval should be 'full', 'running' or the number of train graphs to score")
+        self.train_eval = train_eval
+        self._running = None
         self.__default__ = False
         if test_metric[0] is None and dataset.task == 'classification':
             self.__default__ = True
@@ -234,7 +264,6 @@ class MolecularTorchGeometric(Model):
         self
 
     def fit(self):
-        steps = self.epochs * 0.1
         if self.doa:
             if self.doa.__name__ == 'SmilesLeverage':
                 self.doa_m = self.doa.fit(self.dataset.smiles)
@@ -251,54 +280,73 @@ class MolecularTorchGeometric(Model):
                 self.evaluator.dataset.create()
         self.model_fitted = MolecularModel()
         self.model_nn.to(self.device)
-        # self.train_loader = DataLoader(dataset=self.dataset.df, **self.trainDataLoaderParams)
-        # self.test_loader = DataLoader(dataset=self.evaluator.dataset.df, **self.testDataLoaderParams)
-        self.train_loader = DataLoader(dataset=self.dataset, **self.trainDataLoaderParams)
-        self.test_loader = DataLoader(dataset=self.evaluator.dataset, **self.testDataLoaderParams)
+        self.train_loader = self.__data_loader__(self.dataset, self.trainDataLoaderParams)
+        self.test_loader = self.__data_loader__(self.evaluator.dataset, self.testDataLoaderParams)
+        self.train_eval_loader = self.__train_eval_loader__()
+        self.best_state = None
         temp_loss = None
+        waited = 0
         for epoch in range(1, self.epochs):
             self.train()
-            train_loss = self.test(self.train_loader)
+            if epoch % self.log_steps != 0:
+                continue
+            if self.train_eval == 'running':
+                train_loss = self.__score__(*self._running)
+            else:
+                train_loss = self.test(self.train_eval_loader)
             test_loss = self.test(self.test_loader)
-            if epoch % self.log_steps == 0:
-                if self.dataset.task == "classification":
-                    los = test_loss[2]
-                    if self.__save_choice__(temp_loss, train_loss[2], los):
-                        temp_loss = [train_loss[2], los]
-                        temp_path = self.path
-                        self.path = self.model_dir + "molecular_model_ep_" + str(epoch) + "_er_" + str(los) + ".pt"
-                        torch.save({
-                            'epoch': epoch,
-                            'model_state_dict': self.model_nn.state_dict(),
-                            'optimizer_state_dict': self.optimizer_local.state_dict(),
-                            'loss': los,
-                        }, self.path)
-                        try:
-                            os.remove(temp_path)
-                        except TypeError as e:
-                            continue
-                    print(f'Epoch: {epoch:03d}, Train Score: {train_loss[2]}, Test Score: {test_loss[2]}')
-                else:
-                    los = test_loss[1]
-                    if self.__save_choice__(temp_loss, train_loss[1], los):
-                        temp_loss = [train_loss[1], los]
-                        temp_path = self.path
-                        # print(temp_loss.item())
-                        # print(str(temp_loss))
-                        self.path = self.model_dir + "molecular_model_ep_" + str(epoch) + "_er_" + str(los.item()) + ".pt"
-                        torch.save({
-                            'epoch': epoch,
-                            'model_state_dict': self.model_nn.state_dict(),
-                            'optimizer_state_dict': self.optimizer_local.state_dict(),
-                            'loss': los,
-                        }, self.path)
-                        try:
-                            os.remove(temp_path)
-                        except TypeError as e:
-                            continue
-                    print(f'Epoch: {epoch:03d}, Train Score: {train_loss[1]}, Test Score: {test_loss[1]}')
+            # The score is the accuracy / metric for classification and the loss / metric for regression
+            train_score, test_score = float(train_loss[-1]), float(test_loss[-1])
+            if self.__save_choice__(temp_loss, train_score, test_score):
+                # A tie of the test score, broken by the train score, does not reset the patience
+                waited = waited + 1 if temp_loss is not None and temp_loss[1] == test_score else 0
+                temp_loss = [train_score, test_score]
+                self.best_state = {
+                    'epoch': epoch,
+                    'model_state_dict': copy.deepcopy(self.model_nn.state_dict()),
+                    'optimizer_state_dict': copy.deepcopy(self.optimizer_local.state_dict()),
+                    'loss': test_score,
+                }
+            else:
+                waited += 1
+            print(f'Epoch: {epoch:03d}, Train Score: {train_score}, Test Score: {test_score}')
+            if self.patience is not None and waited >= self.patience:
+                print(f'Early stopping at epoch {epoch:03d}, the test score did not improve for {waited} evaluations')
+                break
+        self.__save_best__()
         return self
 
+    def __data_loader__(self, dataset, params, indices=None):
+        if getattr(dataset, 'streaming', False) and indices is None:
+            # The graphs are featurized by background processes while training
+            prefetch = None
+            if params['num_workers'] > 0 and params.get('prefetch_factor') is not None:
+                prefetch = params['num_workers'] * params['prefetch_factor']
+            return dataset.stream(params['batch_size'], shuffle=params['shuffle'], drop_last=params['drop_last']
+                                  , num_workers=params['num_workers'], prefetch=prefetch, generator=params['generator'])
+        if getattr(dataset, 'packed', None) is not None:
+            # Whole batches are cut from the packed graphs instead of collating Data objects
+            params = dict(params)
+            batch_size, shuffle, drop_last = params.pop('batch_size'), params.pop('shuffle'), params.pop('drop_last')
+            if indices is None:
+                sampler = dataset.batch_sampler(batch_size, shuffle=shuffle, drop_last=drop_last
+                                                , generator=params['generator'])
+            else:
+                sampler = BatchSampler(indices, batch_size, drop_last)
+            return TorchDataLoader(dataset=dataset, sampler=sampler, batch_size=None, **params)
+        if indices is not None:
+            dataset = Subset(dataset, indices)
+        return DataLoader(dataset=dataset, **params)
+
+    def __train_eval_loader__(self):
+        if self.train_eval == 'full':
+            return self.train_loader
+        if self.train_eval == 'running':
+            return None
+        # The same sample of the train set is scored on every evaluation
+        generator = torch.Generator().manual_seed(config.global_seed)
+        indices = torch.randperm(len(self.dataset), generator=generator)[:self.train_eval].tolist()
+        return self.__data_loader__(self.dataset, self.testDataLoaderParams, indices)
 
     def __save_choice__(self, temp_loss, train_loss, test_loss):
         if self.test_metric[1] == 'minimize':
@@ -326,135 +374,94 @@ class MolecularTorchGeometric(Model):
             else:
                 return False
 
+    def __save_best__(self):
+        if self.best_state is None:
+            return
+        temp_path = self.path
+        self.path = self.model_dir + "molecular_model_ep_" + str(self.best_state['epoch']) \
+            + "_er_" + str(self.best_state['loss']) + ".pt"
+        torch.save(self.best_state, self.path)
+        if temp_path is not None and temp_path != self.path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    def __load_best__(self):
+        checkpoint = self.best_state if self.best_state is not None else torch.load(self.path)
+        self.best_model.load_state_dict(checkpoint['model_state_dict'])
+        # The optimizer may keep references to the loaded tensors and update them in place
+        self.optimizer_local.load_state_dict(copy.deepcopy(checkpoint['optimizer_state_dict']))
+
+    def __forward__(self, model, data):
+        x = data.x.to(self.device)
+        edge_index = data.edge_index.to(self.device)
+        batch = data.batch.to(self.device)
+        y = data.y.to(self.device)
+        edge_attributes = getattr(data, 'edge_attr', None)
+        if edge_attributes is not None:
+            out = model(x, edge_index, edge_attributes.to(self.device), batch)
+        else:
+            out = model(x, edge_index, batch)
+        if self.dataset.task == 'regression' and y.numel() == out.numel():
+            # (N,) targets against (N, 1) outputs would broadcast to N x N in the criterion
+            y = y.view_as(out)
+        return out, y
+
+    def __score__(self, out, y):
+        if self.dataset.task == 'classification':
+            pred = out.argmax(dim=1)
+            if self.__default__:
+                score = int((pred == y).sum()) / len(y)
+            else:
+                score = self.test_metric[0](np.asarray(y.cpu().numpy(), dtype=float).ravel()
+                                            , np.asarray(pred.cpu().numpy(), dtype=float))
+            return out, pred.cpu().numpy(), score
+        if self.__default__:
+            return out, self.criterion(out, y)
+        return out, self.test_metric[0](np.asarray(y.cpu().numpy(), dtype=float).ravel()
+                                        , np.asarray(out.cpu().numpy(), dtype=float).ravel())
+
     def train(self):
         self.model_nn.train()
+        running = self.train_eval == 'running'
+        outs, ys = [], []
         for data in self.train_loader:
-            x = data.x.to(self.device)
-            edge_index = data.edge_index.to(self.device)
-            try:
-                edge_attributes = data.edge_attr.to(self.device)
-            except AttributeError:
-                edge_attributes = None
-            batch = data.batch.to(self.device)
-            y = data.y.to(self.device)
-            if edge_attributes is not None:
-
-                out = self.model_nn(x, edge_index, edge_attributes, batch)
-            else:
-                out = self.model_nn(x, edge_index, batch)
+            out, y = self.__forward__(self.model_nn, data)
             loss = self.criterion(out, y)
             loss.backward()
             self.optimizer_local.step()
             self.optimizer_local.zero_grad()
+            if running:
+                outs.append(out.detach())
+                ys.append(y)
+        if running:
+            self._running = (torch.cat(outs), torch.cat(ys))
 
     def test(self, dataloader):
-        if self.__default__:
-            return self.__default_test__(dataloader)
-        else:
-            self.model_nn.eval()
-            test_function = self.test_metric[0]
-            truth = np.array([])
-            preds = np.array([])
-            for data in dataloader:
-                x = data.x.to(self.device)
-                edge_index = data.edge_index.to(self.device)
-                try:
-                    edge_attributes = data.edge_attr.to(self.device)
-                except AttributeError:
-                    edge_attributes = None
-                batch = data.batch.to(self.device)
-
-                y = data.y.to(self.device)
-
-                if edge_attributes is not None:
-                    out = self.model_nn(x, edge_index, edge_attributes, batch)
-                else:
-                    out = self.model_nn(x, edge_index, batch)
-
-                truth = np.append(truth, y.cpu().numpy())
-
-                if self.dataset.task == "regression":
-                    preds = np.append(preds, out.cpu().detach().numpy())
-                    return out, test_function(truth, preds)
-                else:
-                    preds = np.append(preds, out.argmax(dim=1).cpu().detach().numpy())
-                    return out, out.argmax(dim=1).cpu().numpy(), test_function(truth, preds)
-
-
-    def __default_test__(self, dataloader):
+        """Scores the model on all the batches of the dataloader."""
         self.model_nn.eval()
-        if self.dataset.task == 'classification':
-            correct = 0
-            for data in dataloader:
-                x = data.x.to(self.device)
-                edge_index = data.edge_index.to(self.device)
-                try:
-                    edge_attributes = data.edge_attr.to(self.device)
-                except AttributeError:
-                    edge_attributes = None
-                batch = data.batch.to(self.device)
-
-                y = data.y.to(self.device)
-
-                if edge_attributes is not None:
-                    out = self.model_nn(x, edge_index, edge_attributes, batch)
-                else:
-                    out = self.model_nn(x, edge_index, batch)
-                pred = out.argmax(dim=1)
-                correct += int((pred == y).sum())
-            return out, pred.cpu().numpy(), correct / len(dataloader.dataset)
-        else:
-            self.model_nn.eval()
+        outs, ys = [], []
+        with torch.inference_mode():
             for data in dataloader:
-                x = data.x.to(self.device)
-                edge_index = data.edge_index.to(self.device)
-                edge_attributes = None
-                if data.edge_attr is not None:
-                    edge_attributes = data.edge_attr.to(self.device)
-                batch = data.batch.to(self.device)
-
-                y = data.y.to(self.device)
-
-                if edge_attributes is not None:
-                    out = self.model_nn(x, edge_index, edge_attributes, batch)
-                else:
-                    out = self.model_nn(x, edge_index, batch)
-                loss = self.criterion(out, y)
-            return out, loss
+                out, y = self.__forward__(self.model_nn, data)
+                outs.append(out)
+                ys.append(y)
+            return self.__score__(torch.cat(outs), torch.cat(ys))
 
     def eval(self):
-        checkpoint = torch.load(self.path)
-        self.best_model.load_state_dict(checkpoint['model_state_dict'])
-        self.optimizer_local.load_state_dict(checkpoint['optimizer_state_dict'])
+        self.__load_best__()
         self.best_model.eval()
         self.best_model.to(self.device)
         if self.evaluator.functions:
             eval_keys = self.evaluator.functions.keys()
-            correct = 0
-            truth = np.array([])
-            preds = np.array([])
-            for data in self.test_loader:
-                x = data.x.to(self.device)
-                edge_index = data.edge_index.to(self.device)
-                edge_attributes = None
-                if data.edge_attr is not None:
-                    edge_attributes = data.edge_attr.to(self.device)
-                batch = data.batch.to(self.device)
-
-                y = data.y.to(self.device)
-
-                if edge_attributes is not None:
-                    out = self.best_model(x, edge_index, edge_attributes, batch)
-                else:
-                    out = self.best_model(x, edge_index, data.batch)
-                if self.dataset.task == "regression":
-                    pred = out
-                else:
-                    pred = out.argmax(dim=1)
-                correct += int((pred == y).sum())
-                truth = np.append(truth, y.cpu().numpy())
-                preds = np.append(preds, pred.cpu().detach().numpy())
-            # return out, pred.numpy(), correct / len(dataloader.dataset)
+            outs, ys = [], []
+            with torch.inference_mode():
+                for data in self.test_loader:
+                    out, y = self.__forward__(self.best_model, data)
+                    outs.append(out)
+                    ys.append(y)
+            out = torch.cat(outs)
+            pred = out if self.dataset.task == "regression" else out.argmax(dim=1)
+            truth = np.asarray(torch.cat(ys).cpu().numpy(), dtype=float).ravel()
+            preds = np.asarray(pred.cpu().numpy(), dtype=float).ravel()
             for eval_key in eval_keys:
                 eval_function = self.evaluator.functions.get(eval_key)
                 print(eval_key + ": " + str(eval_function(truth, preds)))
@@ -462,9 +469,7 @@ class MolecularTorchGeometric(Model):
             print("No eval functions passed")
 
     def create_molecular_model(self):
-        checkpoint = torch.load(self.path)
-        self.best_model.load_state_dict(checkpoint['model_state_dict'])
-        self.optimizer_local.load_state_dict(checkpoint['optimizer_state_dict'])
+        self.__load_best__()
         model = MolecularModel()
         model.descriptors = self.dataset.featurizer
         model.doa = self.doa
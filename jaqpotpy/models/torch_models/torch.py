@@ -69,7 +69,11 @@ class LSTM_V1(torch.nn.Module):
         else:
             x = self.act(x)
             x = F.dropout(x, p=self.dropout, training=self.training)
-        lstm_out, self.hidden_cell = self.lstm(x.view(len(x) ,1, -1), self.hidden_cell)
+        lstm_out, hidden_cell = self.lstm(x.view(len(x) ,1, -1), self.hidden_cell)
+        # The state carried to the next batch is cut from this batch's graph, so that the
+        # next backward pass does not run into it
+        self.hidden_cell = (hidden_cell[0].detach().to(self.hidden_cell[0].dtype),
+                            hidden_cell[1].detach().to(self.hidden_cell[1].dtype))
         x = self.out(lstm_out.view(len(x), -1))
         return x
 
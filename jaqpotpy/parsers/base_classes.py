@@ -1,9 +1,12 @@
+import copy
 import inspect
 import logging
 import numpy as np
 import pandas as pd
 from typing import Any, Iterable, Union, List, Generator
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from jaqpotpy.entities.material_models import Atoms
 
 logger = logging.getLogger(__name__)
@@ -30,6 +33,27 @@ class Parser(object):
 
     self.files_ = []
 
+  def _files(self) -> List[str]:
+    """
+    The files that will be parsed, either the file of `path` or the files of the
+    folder `path` with one of the extensions of `file_ext`, in `os.listdir` order.
+    """
+    try:
+      if self.path.split('.')[-1].lower() not in self.file_ext:
+        try:
+          file = [self.path+'/'+item for item in os.listdir(self.path) if item.split('.')[-1].lower() in self.file_ext]
+        except:
+          raise ValueError('Invalid file type. Expected {} but found {} instead'.format(self.file_ext, self.path.split('.')[-1]))
+      else:
+        file = [self.path]
+    except:
+      try:
+        file = [self.path+'/'+item for item in os.listdir(self.path) if item.split('.')[-1].lower() in self.file_ext]
+      except:
+        raise ValueError("Invalid file type. Expected {} but didn't find any".format(self.file_ext))
+
+    return file
+
   def parse(self) -> Generator:
     """
     Parse files representing materials or molecules.
@@ -52,19 +76,7 @@ class Parser(object):
       A generator with the parsed objects of the files.
     """
 
-    try:
-      if self.path.split('.')[-1].lower() not in self.file_ext:
-        try:
-          file = [self.path+'/'+item for item in os.listdir(self.path) if item.split('.')[-1].lower() in self.file_ext]
-        except:
-          raise ValueError('Invalid file type. Expected {} but found {} instead'.format(self.file_ext, self.path.split('.')[-1]))
-      else:
-        file = [self.path]
-    except:
-      try:
-        file = [self.path+'/'+item for item in os.listdir(self.path) if item.split('.')[-1].lower() in self.file_ext]
-      except:
-        raise ValueError("Invalid file type. Expected {} but didn't find any".format(self.file_ext))
+    file = self._files()
 
     # Open the file and read it in as a list of rows
     for i, item in enumerate(file):
@@ -79,46 +91,110 @@ class Parser(object):
         logger.warning("Failed to parse file {}.".format(item), e)
 
 
-  def parse_dataframe(self) -> Union[List[pd.DataFrame], pd.DataFrame]:
+  def parse_dataframe(self, n_jobs: int = 1) -> Union[List[pd.DataFrame], pd.DataFrame]:
     """
     Parse files of materials or molecules in a pandas dataframe.
 
+    The dataframes of the parsed files are collected and concatenated once at the end.
+
     Parameters
     ----------
-    path: str
-      Either the path of a certain file or a path of a folder containing
-      files that will be parsed
-
-    file_ext: str | List[str]
-      The extention of the files that will be parsed.
-
-    log_every_n: int, default 1000
-      Logs featurization progress every `log_every_n` steps.
+    n_jobs: int, default 1
+      The number of processes that parse the files. With `n_jobs` > 1 (or -1 for
+      all the cpus) the files are parsed by a process pool, the rows keep the order
+      of the files.
 
     Returns
     -------
-    pd.DataFrame
-      A pandas dataframe of the files.
+    pd.DataFrame | List[pd.DataFrame]
+      A pandas dataframe of the files, or a list of dataframes for the parsers that
+      return more than one table (e.g. the atoms and the bonds of MolParser).
     """
 
-    files = self.parse()
+    return _concat_frames(list(self._iter_file_frames(n_jobs)))
 
-    df = pd.DataFrame()
-    df_list = []
-    for i, file in enumerate(files):
-      resp = self._parse_dataframe(file, self.files_[i])
-      try:
-        df = pd.concat([df, resp]).reset_index(drop=True)
-      except:
-        if len(df_list) == 0:
-          df_list = [pd.concat([df, item]).reset_index(drop=True) for item in resp]
-        else:
-          for j in range(len(df_list)):
-            df_list[j] = pd.concat([df_list[j], resp[j]]).reset_index(drop=True)
+  def iter_dataframes(self, chunk_rows: int = 100000, n_jobs: int = 1) -> Generator:
+    """
+    Parse files of materials or molecules in pandas dataframes of bounded size.
+
+    The dataframes of consecutive files are concatenated until they reach `chunk_rows`
+    rows, so only one chunk is kept in memory. A chunk never splits the rows of a
+    file, so it has at most `chunk_rows` rows plus the rows of its last file. The
+    chunks are indexed continuously, their concatenation is equal to the result of
+    `parse_dataframe`.
+
+    Parameters
+    ----------
+    chunk_rows: int, default 100000
+      The number of rows of the chunks. For parsers with more than one table the
+      rows of the first table (e.g. the atoms of MolParser) are counted.
+
+    n_jobs: int, default 1
+      The number of processes that parse the files, see `parse_dataframe`.
+
+    Returns
+    -------
+    generator
+      A generator of pandas dataframes, or of lists of dataframes for the parsers
+      that return more than one table.
+    """
 
-    if len(df_list)>0:
-      return df_list
-    return df
+    if chunk_rows < 1:
+      raise ValueError('chunk_rows should be positive, found {}'.format(chunk_rows))
+
+    frames = []
+    rows = 0
+    start = None
+    for resp in self._iter_file_frames(n_jobs):
+      frames.append(resp)
+      rows += len(resp[0]) if isinstance(resp, list) else len(resp)
+      if rows >= chunk_rows:
+        chunk = _concat_frames(frames, start)
+        start = _next_start(chunk)
+        frames = []
+        rows = 0
+        yield chunk
+
+    if frames:
+      yield _concat_frames(frames, start)
+
+  def _iter_file_frames(self, n_jobs: int = 1) -> Generator:
+    """
+    Yields the dataframes (or lists of dataframes) of the parsed objects, in the
+    order of the files. The files that fail to parse are skipped with a warning.
+    """
+    files = self._files()
+    if n_jobs == -1:
+      n_jobs = os.cpu_count() or 1
+
+    if n_jobs <= 1 or len(files) <= 1:
+      for item in files:
+        _, frames = _parse_files(self, [item])
+        yield from frames
+      return
+
+    # The workers get a copy without the names of the files parsed so far, and send
+    # back the names of the files they parsed
+    worker = copy.copy(self)
+    worker.files_ = []
+    chunk_size = max(1, min(64, len(files) // (4 * n_jobs)))
+    executor = ProcessPoolExecutor(n_jobs)
+    try:
+      # At most 2 * n_jobs chunks are submitted ahead of the one that is consumed
+      pending = deque()
+      for start in range(0, len(files), chunk_size):
+        pending.append(executor.submit(_parse_files, worker, files[start:start + chunk_size]))
+        if len(pending) > 2 * n_jobs:
+          yield from self._collect(pending.popleft())
+      while pending:
+        yield from self._collect(pending.popleft())
+    finally:
+      executor.shutdown(cancel_futures=True)
+
+  def _collect(self, future) -> list:
+    files, frames = future.result()
+    self.files_.extend(files)
+    return frames
 
   def __call__(self, path: str, file_ext: Union[str, List[str]], **kwargs):
     """Calculate features for datapoints.
@@ -227,6 +303,53 @@ class Parser(object):
     return xyzs
 
 
+def _parse_files(parser: Parser, files: List[str]):
+  """
+  Parses `files` into the dataframes of their objects. Returns the names of the parsed
+  objects, which are appended to `parser.files_`, and their dataframes.
+  """
+  start = len(parser.files_)
+  frames = []
+  for item in files:
+    try:
+      obj = parser._parse(item)
+    except Exception as e:
+      logger.warning("Failed to parse file {}: {}".format(item, e))
+      continue
+    objs = obj if isinstance(obj, list) else [obj]
+    for j in range(len(objs)):
+      # Files without records (e.g. a mol file without $$$$) don't add their name
+      if len(parser.files_) < start + len(frames) + 1:
+        parser.files_.append(item)
+      frames.append(parser._parse_dataframe(objs[j], parser.files_[start + len(frames)]))
+  return parser.files_[start:], frames
+
+
+def _concat_frames(frames: list, start: int = None) -> Union[List[pd.DataFrame], pd.DataFrame]:
+  """
+  Concatenates the dataframes of the parsed objects, or the tables of the lists of
+  dataframes, with a range index from `start` (or from 0 for every table).
+  """
+  if frames and isinstance(frames[0], list):
+    starts = start if start is not None else [0] * len(frames[0])
+    return [_concat(list(tables), begin) for tables, begin in zip(zip(*frames), starts)]
+  return _concat(frames, start or 0)
+
+
+def _concat(frames: List[pd.DataFrame], start: int) -> pd.DataFrame:
+  if not frames:
+    return pd.DataFrame()
+  df = pd.concat(frames, ignore_index=True)
+  df.index = pd.RangeIndex(start, start + len(df))
+  return df
+
+
+def _next_start(chunk):
+  if isinstance(chunk, list):
+    return [df.index.stop for df in chunk]
+  return chunk.index.stop
+
+
 def get_print_threshold() -> int:
   """Return the printing threshold for datasets.
   The print threshold is the number of elements from ids/tasks to
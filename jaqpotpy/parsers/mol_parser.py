@@ -208,8 +208,8 @@ class MolParser(Parser):
         -------
         List[pd.DataFrame()]
         """
-        atoms = pd.DataFrame()
-        bonds = pd.DataFrame()
+        atoms = []
+        bonds = []
 
         for i in range(len(file.con_table.atoms.elements)):
             d = {}
@@ -218,12 +218,11 @@ class MolParser(Parser):
             d['x'] = file.con_table.atoms.coordinates[i][0]
             d['y'] = file.con_table.atoms.coordinates[i][1]
             d['z'] = file.con_table.atoms.coordinates[i][2]
-
-            atoms = pd.concat([atoms, pd.DataFrame(d, index=[0])]).reset_index(drop=True)
+            atoms.append(d)
 
         for bond in file.con_table.bonds:
             d = bond.dict()
             d['file'] = filename
-            bonds = pd.concat([bonds, pd.DataFrame(d, index=[0])]).reset_index(drop=True)
+            bonds.append(d)
 
-        return [atoms, bonds]
+        return [pd.DataFrame(atoms), pd.DataFrame(bonds)]
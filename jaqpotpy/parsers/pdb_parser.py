@@ -163,15 +163,14 @@ class PdbParser(Parser):
         pd.DataFrame()
         """
 
-        df = pd.DataFrame()
+        rows = []
         for i in range(len(file.atoms.extraInfo)):
-            d = file.atoms.extraInfo[i]
+            d = dict(file.atoms.extraInfo[i])
             d['file'] = filename
             d['element'] = file.atoms.elements[i]
             d['x'] = file.atoms.coordinates[i][0]
             d['y'] = file.atoms.coordinates[i][1]
             d['z'] = file.atoms.coordinates[i][2]
+            rows.append(d)
 
-            df = pd.concat([df, pd.DataFrame(d, index=[0])]).reset_index(drop=True)
-
-        return df
+        return pd.DataFrame(rows)
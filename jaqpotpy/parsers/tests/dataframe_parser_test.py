@@ -0,0 +1,75 @@
+"""
+Tests for the dataframes of Jaqpotpy Parsers.
+"""
+import os
+import tempfile
+import unittest
+import pandas as pd
+from jaqpotpy.parsers import MolParser, PdbParser, XyzParser
+
+test_data = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                         'docking', 'test')
+
+
+class TestParserDataframes(unittest.TestCase):
+    """
+    Test parse_dataframe and iter_dataframes.
+    """
+
+    def setUp(self):
+        """
+        Set up a folder of xyz files.
+        """
+        self.folder = tempfile.TemporaryDirectory()
+        for k in range(12):
+            with open(os.path.join(self.folder.name, 'mol%d.xyz' % k), 'w') as f:
+                f.write('%d\nmolecule %d\n' % (k + 1, k))
+                for i in range(k + 1):
+                    f.write('C %d.0 %d.5 -1.0\n' % (k, i))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_xyz_folder(self):
+        parser = XyzParser(self.folder.name, 'xyz')
+        df = parser.parse_dataframe()
+        assert list(df.columns) == ['file', 'element', 'x', 'y', 'z']
+        assert len(df) == sum(range(1, 13))
+        assert list(df.index) == list(range(len(df)))
+        assert len(parser.files_) == 12
+        # The rows follow the order of the files
+        assert list(df['file'].drop_duplicates()) == parser.files_
+
+    def test_iter_dataframes(self):
+        df = XyzParser(self.folder.name, 'xyz').parse_dataframe()
+        chunks = list(XyzParser(self.folder.name, 'xyz').iter_dataframes(chunk_rows=20))
+        assert len(chunks) > 1
+        for chunk in chunks[:-1]:
+            # The rows of a file are never split between chunks
+            assert 20 <= len(chunk) < 20 + 12
+            assert not chunks[-1]['file'].isin(chunk['file']).any()
+        pd.testing.assert_frame_equal(pd.concat(chunks), df)
+
+    def test_process_pool(self):
+        parser = XyzParser(self.folder.name, 'xyz')
+        df = parser.parse_dataframe(n_jobs=2)
+        pd.testing.assert_frame_equal(df, XyzParser(self.folder.name, 'xyz').parse_dataframe())
+        assert list(df['file'].drop_duplicates()) == parser.files_
+
+    def test_sdf_tables(self):
+        parser = MolParser(test_data, 'sdf')
+        atoms, bonds = parser.parse_dataframe()
+        chunks = list(MolParser(test_data, 'sdf').iter_dataframes(chunk_rows=1, n_jobs=2))
+        assert len(chunks) == len(parser.files_)
+        pd.testing.assert_frame_equal(pd.concat([chunk[0] for chunk in chunks]), atoms)
+        pd.testing.assert_frame_equal(pd.concat([chunk[1] for chunk in chunks]), bonds)
+        assert 'bond_type' in bonds.columns
+
+    def test_pdb(self):
+        df = PdbParser(os.path.join(test_data, '1a9m_pocket.pdb'), 'pdb').parse_dataframe()
+        assert {'file', 'element', 'x', 'y', 'z'} <= set(df.columns)
+        assert len(df) > 0
+
+    def test_empty(self):
+        assert XyzParser(self.folder.name, 'pdb').parse_dataframe().empty
+        assert list(XyzParser(self.folder.name, 'pdb').iter_dataframes()) == []
@@ -123,7 +123,7 @@ class XyzParser(Parser):
         pd.DataFrame()
         """
 
-        df = pd.DataFrame()
+        rows = []
         for i in range(len(file.atoms.elements)):
             d = {}
             d['file'] = filename
@@ -131,7 +131,6 @@ class XyzParser(Parser):
             d['x'] = file.atoms.coordinates[i][0]
             d['y'] = file.atoms.coordinates[i][1]
             d['z'] = file.atoms.coordinates[i][2]
+            rows.append(d)
 
-            df = pd.concat([df, pd.DataFrame(d, index=[0])]).reset_index(drop=True)
-
-        return df
+        return pd.DataFrame(rows)
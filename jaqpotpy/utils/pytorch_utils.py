@@ -82,3 +82,40 @@ def to_torch_graph_data_array(mol_g):
                     , num_nodes=g.num_nodes)
         datas.append(dato)
     return datas
+
+
+# DataLoader options that only apply when the data is loaded by worker processes
+_WORKER_PARAMS = ('persistent_workers', 'prefetch_factor', 'timeout', 'worker_init_fn', 'multiprocessing_context')
+
+
+def data_loader_params(batch_size: int, params: dict = None, train: bool = True, device=None) -> dict:
+    """
+    Returns the keyword arguments of a torch DataLoader from the `dataLoaderParams` of a trainer.
+
+    `params` may hold any DataLoader argument, e.g. `num_workers`, `persistent_workers`,
+    `prefetch_factor`, `pin_memory`, `shuffle` and `drop_last`. The batch size is the one of
+    the trainer. `shuffle` and `drop_last` only apply to the train loader, the test loader
+    always sees every sample in order. Shuffling and the worker seeds are driven by a
+    generator seeded with `config.global_seed`, unless a `generator` is passed. The worker
+    only options are dropped when the data is loaded in the main process, and the memory
+    is pinned by default when training on a GPU.
+    """
+    import torch
+    from jaqpotpy.cfg import config
+    params = dict(params or {})
+    params.pop('batch_size', None)
+    shuffle = params.pop('shuffle', False)
+    drop_last = params.pop('drop_last', False)
+    loader_params = {'batch_size': batch_size
+        , 'shuffle': bool(shuffle) if train else False
+        , 'drop_last': bool(drop_last) if train else False
+        , 'num_workers': params.pop('num_workers', 0)
+        , 'pin_memory': params.pop('pin_memory', device is not None and torch.device(device).type == 'cuda')
+        , 'generator': params.pop('generator', None)}
+    if loader_params['generator'] is None:
+        loader_params['generator'] = torch.Generator().manual_seed(config.global_seed)
+    if loader_params['num_workers'] == 0:
+        for key in _WORKER_PARAMS:
+            params.pop(key, None)
+    loader_params.update(params)
+    return loader_params